@@ -1,65 +1,39 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import pandas as pd
+from recsys.cache import CachedEngine
+from recsys.knowledge import KnowledgeEngine
 
 # Load the dataset
-data = pd.read_csv("BangaloreZomatoData.csv")
-
-# Preprocess the data (convert columns to appropriate types)
-data['AverageCost'] = pd.to_numeric(data['AverageCost'], errors='coerce').fillna(0)
-data['isVegOnly'] = data['isVegOnly'].astype(int)
-data['isIndoorSeating'] = data['isIndoorSeating'].astype(int)
-data['isTakeaway'] = data['isTakeaway'].astype(int)
-data['IsHomeDelivery'] = data['IsHomeDelivery'].astype(int)
+engine = CachedEngine(KnowledgeEngine())
 
 # Function to recommend restaurants based on user preferences
 def recommend_restaurants():
-    budget = budget_entry.get()
-    cuisine = cuisine_entry.get().strip()
-    veg_only = veg_option.get()
-    service_mode = service_mode_selection.get()
-
-    if not budget.isdigit() or int(budget) <= 0:
-        messagebox.showerror("Input Error", "Please enter a valid budget.")
-        return
-    if not cuisine:
-        messagebox.showerror("Input Error", "Please enter a preferred cuisine.")
-        return
-    if service_mode not in ["Delivery", "Takeaway", "Indoor Seating"]:
-        messagebox.showerror("Input Error", "Please select a valid service mode.")
+    try:
+        recommendations = engine.results({
+            "budget": budget_entry.get(),
+            "cuisine": cuisine_entry.get(),
+            "veg_only": veg_option.get(),
+            "service_mode": service_mode_selection.get(),
+        })
+    except ValueError as e:
+        messagebox.showerror("Input Error", str(e))
         return
 
-    budget = int(budget)
-    veg_only = 1 if veg_only == "Yes" else 0
-
-    # Filter data based on user inputs
-    filtered_data = data[data['AverageCost'] <= budget]
-    filtered_data = filtered_data[filtered_data['Cuisines'].str.contains(cuisine, case=False, na=False)]
-    filtered_data = filtered_data[filtered_data['isVegOnly'] == veg_only]
-
-    if service_mode == "Delivery":
-        filtered_data = filtered_data[filtered_data['IsHomeDelivery'] == 1]
-    elif service_mode == "Takeaway":
-        filtered_data = filtered_data[filtered_data['isTakeaway'] == 1]
-    elif service_mode == "Indoor Seating":
-        filtered_data = filtered_data[filtered_data['isIndoorSeating'] == 1]
-
     # Display recommendations
-    if filtered_data.empty:
+    if not recommendations:
         result_label.config(text="No recommendations found based on your preferences.")
         return
 
-    result_text = "Recommended Restaurants:\n"
-    for _, row in filtered_data.head(5).iterrows():
-        result_text += (
-            f"Restaurant: {row['Name']}\n"
-            f"Cuisines: {row['Cuisines']}\n"
-            f"Known For: {row['KnownFor']}\n"
-            f"Cost for Two: {row['AverageCost']} INR\n"
-            f"Service Mode: {service_mode}\n\n"
-        )
+    result_text = "Recommended Restaurants:\n" + "\n\n".join(
+        f"Restaurant: {rec.name}\n"
+        f"Cuisines: {rec.details['Cuisines']}\n"
+        f"Known For: {rec.details['KnownFor']}\n"
+        f"Cost for Two: {rec.details['AverageCost']} INR\n"
+        f"Service Mode: {rec.details['ServiceMode']}"
+        for rec in recommendations
+    )
 
-    result_label.config(text=result_text.strip())
+    result_label.config(text=result_text)
 
 # Tkinter UI Setup
 root = tk.Tk()
@@ -1,99 +1,37 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from recsys.cache import CachedEngine
+from recsys.content import PreferenceEngine
 
 # Load the data
-data = pd.read_csv("BangaloreZomatoData.csv")
-
-def filter_data(data, budget, mode):
-    # Filter data within budget
-    filtered_data = data[data['AverageCost'] <= budget]
-
-    # Remove rows where the relevant column contains "-"
-    if mode == "Delivery":
-        filtered_data = filtered_data[filtered_data['Delivery Ratings'] != "-"]
-        filtered_data = filtered_data.dropna(subset=['Delivery Ratings'])
-    else:
-        filtered_data = filtered_data[filtered_data['Dinner Ratings'] != "-"]
-        filtered_data = filtered_data.dropna(subset=['Dinner Ratings'])
-
-    return filtered_data
+engine = CachedEngine(PreferenceEngine())
 
 # Function to recommend restaurants
 def recommend_restaurants():
-    preferences = preferences_entry.get()
-    budget = budget_entry.get()
     mode = mode_selection.get()
-    location = location_entry.get().lower()  # Get user input for location
-
-    if not preferences or not budget.isdigit() or int(budget) <= 0:
-        messagebox.showerror("Input Error", "Please enter valid preferences and budget.")
-        return
-    if mode not in ["Delivery", "Dinner"]:
-        messagebox.showerror("Input Error", "Please select a valid mode of service.")
+    try:
+        recommendations = engine.results({
+            "preferences": preferences_entry.get(),
+            "budget": budget_entry.get(),
+            "mode": mode,
+            "location": location_entry.get(),
+        }).project(['Area', 'Cuisines', 'PopularDishes', 'AverageCost', 'Rating'])
+    except ValueError as e:
+        messagebox.showerror("Input Error", str(e))
         return
 
-    if not location:
-        messagebox.showerror("Input Error", "Please enter a location.")
-        return
-    
-    budget = int(budget)
-
-    # Filter data
-    filtered_data = filter_data(data, budget, mode)
-
-    # Add a content column for similarity calculation
-    filtered_data['Content'] = (
-        filtered_data['Cuisines'] + ' ' + filtered_data['PopularDishes'].fillna('')
-    )
-    
-    vectorizer = CountVectorizer(stop_words='english')
-    content_matrix = vectorizer.fit_transform(filtered_data['Content'])
-
-    # Calculate content similarity scores
-    user_vector = vectorizer.transform([preferences])
-    similarity_scores = cosine_similarity(user_vector, content_matrix).flatten()
-
-    # Add content similarity scores to the data
-    filtered_data['ContentSimilarity'] = similarity_scores
-
-    # Calculate location similarity using cosine similarity on the "Area" column
-    area_vectorizer = CountVectorizer(stop_words='english')
-    area_matrix = area_vectorizer.fit_transform(filtered_data['Area'].fillna(''))
-    location_vector = area_vectorizer.transform([location])
-    location_similarity_scores = cosine_similarity(location_vector, area_matrix).flatten()
-
-    # Add location similarity scores to the data
-    filtered_data['LocationSimilarity'] = location_similarity_scores
-
-    # Select the rating column based on the mode of service
-    if mode == "Delivery":
-        rating_column = "Delivery Ratings"        
-    else:
-        rating_column = "Dinner Ratings"
-
-    # Sort by content similarity and then by location similarity and the selected rating
-    top_matches = (
-        filtered_data.sort_values(by=['LocationSimilarity','ContentSimilarity',  rating_column], 
-                                  ascending=False)
-        .head(5)
-    )
-
     # Display results
-    results = ""
-    for _, row in top_matches.iterrows():
-        results += (
-            f"Restaurant: {row['Name']}\n"
-            f"Area: {row['Area']}\n"
-            f"Cuisines: {row['Cuisines']}\n"
-            f"Popular Dishes: {row['PopularDishes']}\n"
-            f"Cost for Two: {row['AverageCost']} INR\n"
-            f"{mode} Rating: {row[rating_column]}\n\n"
-        )
+    results = "\n\n".join(
+        f"Restaurant: {rec.name}\n"
+        f"Area: {rec.details['Area']}\n"
+        f"Cuisines: {rec.details['Cuisines']}\n"
+        f"Popular Dishes: {rec.details['PopularDishes']}\n"
+        f"Cost for Two: {rec.details['AverageCost']} INR\n"
+        f"{mode} Rating: {rec.details['Rating']}"
+        for rec in recommendations
+    )
 
-    result_label.config(text=results.strip())
+    result_label.config(text=results)
 
 # Tkinter UI Setup
 root = tk.Tk()
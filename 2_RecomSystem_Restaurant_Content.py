@@ -1,89 +1,40 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from recsys.cache import CachedEngine
+from recsys.content import SimilarRestaurantEngine
 
-# Load the dataset
-data = pd.read_csv("BangaloreZomatoData.csv")
-
-# Preprocess the data
-def preprocess_data(data):
-    data['Content'] = (
-        data['Cuisines'].fillna('') + " " +
-        data['PopularDishes'].fillna('') + " " +
-        data['KnownFor'].fillna('')
-    )
-    return data
-
-data = preprocess_data(data)
-
-# Build the TF-IDF matrix
-vectorizer = TfidfVectorizer(stop_words='english')
-content_matrix = vectorizer.fit_transform(data['Content'])
+# Load the dataset and the TF-IDF matrix (fitted once by `python -m recsys.build`)
+engine = CachedEngine(SimilarRestaurantEngine())
 
 # Function to recommend restaurants
 def recommend_restaurants():
-    restaurant_name = preferences_entry.get().strip()
-    budget = budget_entry.get()
     mode = mode_selection.get()
-
-    if not restaurant_name:
-        messagebox.showerror("Input Error", "Please enter a restaurant name or preferences.")
-        return
-    if not budget.isdigit() or int(budget) <= 0:
-        messagebox.showerror("Input Error", "Please enter a valid budget.")
+    try:
+        recommendations = engine.results({
+            "restaurant_name": preferences_entry.get(),
+            "budget": budget_entry.get(),
+            "mode": mode,
+        })
+    except ValueError as e:
+        messagebox.showerror("Input Error", str(e))
         return
-    if mode not in ["Delivery", "Dinner"]:
-        messagebox.showerror("Input Error", "Please select a valid mode of service.")
-        return
-
-    budget = int(budget)
-
-    # Check if the restaurant exists in the dataset
-    if restaurant_name not in data['Name'].values:
-        messagebox.showerror("Input Error", f"'{restaurant_name}' not found in the dataset.")
-        return
-
-    # Filter data within budget
-    filtered_data = data[data['AverageCost'] <= budget]
-    if mode == "Delivery":
-        filtered_data = filtered_data[filtered_data['Delivery Ratings'] != "-"]
-    else:
-        filtered_data = filtered_data[filtered_data['Dinner Ratings'] != "-"]
-
-    # Get the vector of the input restaurant
-    input_index = data[data['Name'] == restaurant_name].index[0]
-    input_vector = content_matrix[input_index]
-
-    # Calculate similarity scores
-    similarity_scores = cosine_similarity(input_vector, content_matrix).flatten()
-    filtered_data['Similarity'] = similarity_scores[filtered_data.index]
-
-    # Sort by similarity and ratings
-    rating_column = "Delivery Ratings" if mode == "Delivery" else "Dinner Ratings"
-    filtered_data = filtered_data.sort_values(
-        by=['Similarity', rating_column, 'AverageCost'],
-        ascending=[False, False, True]
-    ).head(5)
 
     # Display recommendations
-    if filtered_data.empty:
+    if not recommendations:
         result_label.config(text="No recommendations found.")
         return
 
-    result_text = "Top 5 Similar Restaurants:\n"
-    for _, row in filtered_data.iterrows():
-        result_text += (
-            f"Restaurant: {row['Name']}\n"
-            f"Cuisines: {row['Cuisines']}\n"
-            f"Popular Dishes: {row['PopularDishes']}\n"
-            f"Known For: {row['KnownFor']}\n"
-            f"Cost for Two: {row['AverageCost']} INR\n"
-            f"{mode} Rating: {row[rating_column]}\n\n"
-        )
+    result_text = "Top 5 Similar Restaurants:\n" + "\n\n".join(
+        f"Restaurant: {rec.name}\n"
+        f"Cuisines: {rec.details['Cuisines']}\n"
+        f"Popular Dishes: {rec.details['PopularDishes']}\n"
+        f"Known For: {rec.details['KnownFor']}\n"
+        f"Cost for Two: {rec.details['AverageCost']} INR\n"
+        f"{mode} Rating: {rec.details['Rating']}"
+        for rec in recommendations
+    )
 
-    result_label.config(text=result_text.strip())
+    result_label.config(text=result_text)
 
 # Tkinter UI Setup
 root = tk.Tk()
@@ -12,39 +12,13 @@ Created on Sun Jan  5 18:47:08 2025
 @author: anjuv
 """
 
-import pandas as pd
-from sklearn.decomposition import TruncatedSVD
-import numpy as np
 import tkinter as tk
 from tkinter import ttk, messagebox
+from recsys.cache import CachedEngine
+from recsys.matrix import MatrixEngine
 
-# Load data
-usersorder_df = pd.read_excel(r"USER AND RESTRAUNT.xlsx")  # Contains columns: user_id, rest_id, cost, rating, location
-restaurants_df = pd.read_csv(r"BangaloreZomatoData_with_rest_id.csv")
-
-# Function to get previous ratings by a user
-def get_previous_ratings(user_id):
-    user_ratings = usersorder_df[usersorder_df['user_id'] == user_id]
-    return user_ratings.sort_values(by='rating', ascending=False)
-
-# Merge the two dataframes on 'rest_id'
-merged_df = pd.merge(usersorder_df, restaurants_df, on='rest_id')
-user_rest_matrix = merged_df.pivot_table(index='user_id', columns='rest_id', values='rating', fill_value=0)
-
-# Apply Singular Value Decomposition (SVD) to decompose the matrix
-svd = TruncatedSVD(n_components=20, random_state=42)
-matrix_svd = svd.fit_transform(user_rest_matrix)
-matrix_svd_reconstructed = np.dot(matrix_svd, svd.components_)
-
-# Function to recommend top N restaurants for a specific user
-def recommend_restaurants(user_id, num_recommendations=5):
-    if user_id not in user_rest_matrix.index:
-        raise ValueError(f"User ID {user_id} not found.")
-    user_idx = user_rest_matrix.index.get_loc(user_id)
-    predicted_ratings = matrix_svd_reconstructed[user_idx]
-    recommended_idx = np.argsort(predicted_ratings)[::-1][:num_recommendations]
-    recommended_restaurants = restaurants_df.iloc[recommended_idx]
-    return recommended_restaurants[['Name', 'Cuisines', 'AverageCost']]
+# Load data and the SVD decomposition (fitted once by `python -m recsys.build`)
+engine = CachedEngine(MatrixEngine())
 
 # GUI App
 def fetch_data():
@@ -55,22 +29,22 @@ def fetch_data():
 
     try:
         # Display previous ratings
-        prev_ratings = get_previous_ratings(user_id)
+        prev_ratings = engine.previous_ratings(user_id)
         prev_ratings_text.set("")
         if prev_ratings.empty:
             prev_ratings_text.set("No previous ratings found.")
         else:
             prev_text = "\n".join(
-                f"{row['Name']} | Rating: {row['rating']} | Price: {row['cost']} | Cuisines: {row['Cuisines']}"
-                for _, row in prev_ratings.iterrows()
+                f"{name} | Rating: {rating} | Price: {cost} | Cuisines: {cuisines}"
+                for name, rating, cost, cuisines in prev_ratings[['Name', 'rating', 'cost', 'Cuisines']].itertuples(index=False)
             )
             prev_ratings_text.set(prev_text)
 
         # Display recommendations
-        recommendations = recommend_restaurants(user_id)
+        recommendations = engine.recommend({"user_id": user_id})
         rec_table.delete(*rec_table.get_children())
-        for _, row in recommendations.iterrows():
-            rec_table.insert("", tk.END, values=(row['Name'], row['Cuisines'], row['AverageCost']))
+        for rec in recommendations:
+            rec_table.insert("", tk.END, values=(rec.name, rec.details['Cuisines'], rec.details['AverageCost']))
     except ValueError as e:
         messagebox.showerror("Error", str(e))
     except Exception as e:
@@ -1,70 +1,12 @@
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from surprise import Dataset, Reader, SVD
-from surprise.model_selection import train_test_split as surprise_split
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
+from recsys.cache import CachedEngine
+from recsys.fusion import FusionEngine
 
-# Step 1: Load Datasets
-restaurant_data = pd.read_csv("BangaloreZomatoData_with_rest_id.csv")
-user_data = pd.read_csv("UserOrdersData.csv")
-
-# Preprocess Restaurant Data
-restaurant_data['Cuisines'] = restaurant_data['Cuisines'].fillna('Unknown')
-restaurant_data['KnownFor'] = restaurant_data['KnownFor'].fillna('Unknown')
-
-# Combine relevant features for content-based filtering
-restaurant_data['CombinedFeatures'] = restaurant_data['Cuisines'] + " " + restaurant_data['KnownFor']
-
-# Vectorize features
-vectorizer = TfidfVectorizer(stop_words='english')
-feature_matrix = vectorizer.fit_transform(restaurant_data['CombinedFeatures'])
-
-# Compute similarity matrix
-similarity_matrix = cosine_similarity(feature_matrix)
-
-# Function to shortlist restaurants
-def get_similar_restaurants(rest_id, top_n=10):
-    idx = restaurant_data[restaurant_data['rest_id'] == rest_id].index[0]
-    similar_indices = similarity_matrix[idx].argsort()[::-1][1:top_n + 1]
-    return restaurant_data.iloc[similar_indices]['rest_id'].tolist()
-
-# Collaborative Filtering using Surprise
-reader = Reader(rating_scale=(1, 5))
-interaction_data = Dataset.load_from_df(user_data[['user_id', 'rest_id', 'rating']], reader)
-trainset, testset = surprise_split(interaction_data, test_size=0.2, random_state=42)
-
-# Train SVD model
-svd_model = SVD()
-svd_model.fit(trainset)
-
-# Function to rank restaurants for a user
-def rank_restaurants(user_id, shortlisted_restaurants):
-    predictions = [svd_model.predict(user_id, rest_id) for rest_id in shortlisted_restaurants]
-    ranked = sorted(predictions, key=lambda x: x.est, reverse=True)
-    return [pred.iid for pred in ranked]
-
-# Function to recommend restaurants
-def recommend_restaurants(user_id, rest_id, top_n=5):
-    shortlisted = get_similar_restaurants(rest_id, top_n)
-    ranked = rank_restaurants(user_id, shortlisted)
-
-    # Get restaurant details
-    results = []
-    for rest_id_rec in ranked:
-        restaurant_info = restaurant_data[restaurant_data['rest_id'] == rest_id_rec]
-        if not restaurant_info.empty:
-            restaurant_name = restaurant_info['Name'].iloc[0]
-            price = restaurant_info['AverageCost'].iloc[0]
-            cuisines = restaurant_info['Cuisines'].iloc[0]
-            results.append({'rest_id': rest_id_rec, 'RestaurantName': restaurant_name, 'price': price, 'cuisines': cuisines })
-        else:
-            results.append({'rest_id': rest_id_rec, 'RestaurantName': 'Not found', 'price': 'Not found', 'cuisines': 'Not found'})
-
-    # Convert to DataFrame
-    return pd.DataFrame(results)
+# Step 1: Load datasets, content neighbours and SVD factors; candidates from
+# both are fused into one ranking
+engine = CachedEngine(FusionEngine())
 
 # Tkinter App
 def show_past_orders():
@@ -77,16 +19,14 @@ def show_past_orders():
             return
 
         # Display past orders for the user
-        past_orders = user_data[user_data['user_id'] == user_id]
-        if not past_orders.empty:
-            past_orders_text = f"Past orders for user {user_id}:\n"
-            for index, row in past_orders.iterrows():
-                restaurant_info = restaurant_data[restaurant_data['rest_id'] == row['rest_id']]
-                if not restaurant_info.empty:
-                    cuisine = restaurant_info['Cuisines'].iloc[0]
-                    past_orders_text += f"- Restaurant ID: {row['rest_id']}, Cuisine: {cuisine}\n"
-                else:
-                    past_orders_text += f"- Restaurant ID: {row['rest_id']}, Cuisine information not found.\n"
+        past_orders = engine.past_orders(user_id)
+        if past_orders:
+            past_orders_text = f"Past orders for user {user_id}:\n" + "".join(
+                f"- Restaurant ID: {rest_id}, Cuisine: {cuisine}\n"
+                if cuisine is not None
+                else f"- Restaurant ID: {rest_id}, Cuisine information not found.\n"
+                for rest_id, cuisine in past_orders
+            )
             past_orders_label.config(text=past_orders_text)
         else:
             past_orders_label.config(text=f"No past orders found for user {user_id}")
@@ -99,16 +39,16 @@ def show_recommendations():
         user_id = user_id_entry.get()
         rest_id = rest_id_entry.get()
 
-        # Validate input
-        if not user_id or not rest_id:
-            messagebox.showerror("Input Error", "Please enter both User ID and Restaurant ID")
+        # Validate input; without a Restaurant ID the user's past orders stand in for it
+        if not user_id:
+            messagebox.showerror("Input Error", "Please enter User ID")
             return
 
-        recommendations_df = recommend_restaurants(user_id, rest_id)
-        
+        recommendations = engine.recommend({"user_id": user_id, "rest_id": rest_id})
+
         # Display recommendations in the Treeview
-        for row in recommendations_df.itertuples():
-            tree.insert("", "end", values=(row.RestaurantName, row.price, row.cuisines))
+        for rec in recommendations:
+            tree.insert("", "end", values=(rec.name, rec.details['price'], rec.details['cuisines']))
     except Exception as e:
         messagebox.showerror("Error", str(e))
 
@@ -0,0 +1,6 @@
+"""Shared building blocks for the restaurant recommendation scripts."""
+
+from .engine import ENGINES, Engine, Recommendation, load_engine
+from .neighbours import build_neighbour_index
+
+__all__ = ["ENGINES", "Engine", "Recommendation", "build_neighbour_index", "load_engine"]
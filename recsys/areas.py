@@ -0,0 +1,221 @@
+"""Area shards of the restaurant catalogue and the graph of neighbouring areas.
+
+Each restaurant's ``Area`` (e.g. "Aloft Hotel, Whitefield, Bangalore") is
+normalised to a locality key ("whitefield"): the last comma-separated part
+that is not the city name, lowercased. Restaurants with the same key form a
+shard. Catalogue rows are stored grouped by shard, so a shard is a slice of
+one memory-mapped array and only the shards a query touches are paged in.
+
+The data has no coordinates, so neighbouring areas come from two signals:
+
+* names and address mentions: area B's name is part of area A's
+  ("koramangala" in "koramangala 5th block"), or restaurants in A have
+  addresses naming B
+* co-orders: users who order from both A and B, beyond the number expected
+  from how many users each area has on its own; areas with few users are
+  shrunk towards zero by ``CO_ORDER_PRIOR``
+
+Each shard keeps its ``NEIGHBOUR_AREAS`` strongest neighbours. A location
+filter keeps the restaurants of the matched shards and of the areas within
+a hop of them.
+"""
+
+import re
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from . import artifacts
+from .catalogue import IdIndex, catalogue_for
+from .data import ORDERS_PATH, RESTAURANTS_PATH, load_orders
+from .ranking import top_k
+
+MODEL_VERSION = 1
+NEIGHBOUR_AREAS = 8
+CO_ORDER_PRIOR = 50  # pseudo-users added to each area when normalising co-orders
+CITY_NAMES = {"bangalore", "bengaluru"}
+
+
+def normalise_area(text):
+    """Locality key of an area or location string ("" if it names only the city)."""
+    parts = [" ".join(part.lower().split()) for part in str(text).split(",")]
+    parts = [part for part in parts if part and part not in CITY_NAMES and part != "nan"]
+    return parts[-1] if parts else ""
+
+
+def area_tokens(text):
+    return set(re.findall(r"\w+", text.lower())) - CITY_NAMES
+
+
+def address_mentions(keys, row_shard, addresses):
+    """Shards x shards counts of restaurants in shard i whose address names shard j."""
+    names = sorted((key for key in keys if len(key) >= 3), key=len, reverse=True)
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(name) for name in names) + r")\b")
+    shard_of = {key: i for i, key in enumerate(keys)}
+    pairs = Counter()
+    for shard, address in zip(row_shard, addresses):
+        for mentioned in {shard_of[name] for name in pattern.findall(str(address).lower())}:
+            if mentioned != shard:
+                pairs[(shard, mentioned)] += 1
+    rows, cols = zip(*pairs) if pairs else ((), ())
+    return sparse.csr_matrix((list(pairs.values()), (rows, cols)), shape=(len(keys), len(keys)), dtype=np.float64)
+
+
+def build_area_index(restaurants, orders, k=NEIGHBOUR_AREAS):
+    catalogue = catalogue_for(restaurants)
+    row_keys = [normalise_area(area) for area in catalogue['Area']]
+    keys = sorted(set(row_keys))
+    shard_of = {key: i for i, key in enumerate(keys)}
+    row_shard = np.array([shard_of[key] for key in row_keys], dtype=np.int32)
+    by_shard = np.argsort(row_shard, kind='stable').astype(np.int32)
+    offsets = np.searchsorted(row_shard[by_shard], np.arange(len(keys) + 1)).astype(np.int64)
+    sizes = np.diff(offsets)
+
+    # Address mentions, as a share of both areas' restaurants
+    mentions = address_mentions(keys, row_shard, catalogue['Full_Address'])
+    mentions = (mentions + mentions.T).toarray() / (sizes[:, None] + sizes[None, :])
+    # An area named inside another's name is next to it, however few restaurants mention it
+    padded = [f" {key} " for key in keys]
+    for i, key in enumerate(padded):
+        for j, other in enumerate(padded):
+            if i != j and (key in other or other in key):
+                mentions[i, j] = 1.0
+
+    # Co-orders: users shared by two areas in excess of chance, normalised like a cosine
+    order_rows = catalogue.rows(orders['rest_id'].to_numpy())
+    known = order_rows >= 0
+    users = IdIndex(sorted(set(orders['user_id'])))
+    user_areas = sparse.csr_matrix(
+        (np.ones(known.sum()), (users.lookup(orders['user_id'].to_numpy()[known]), row_shard[order_rows[known]])),
+        shape=(len(users), len(keys)),
+    )
+    user_areas.data[:] = 1  # each user counts once per area
+    co_orders = (user_areas.T @ user_areas).toarray()
+    area_users = np.diag(co_orders).copy()
+    expected = np.outer(area_users, area_users) / max(len(users), 1)
+    smoothed = area_users + CO_ORDER_PRIOR
+    co_orders = np.maximum(co_orders - expected, 0) / np.sqrt(np.outer(smoothed, smoothed))
+
+    weights = mentions + co_orders
+    np.fill_diagonal(weights, 0)
+    k = min(k, max(len(keys) - 1, 0))
+    neighbour_ids = np.full((len(keys), k), -1, dtype=np.int32)
+    neighbour_weights = np.zeros((len(keys), k), dtype=np.float32)
+    for shard in range(len(keys)):
+        best = top_k(weights[shard], k)
+        best = best[weights[shard, best] > 0]
+        neighbour_ids[shard, :len(best)] = best
+        neighbour_weights[shard, :len(best)] = weights[shard, best]
+
+    return {
+        "arrays": {
+            "row_shard": row_shard,
+            "by_shard": by_shard,
+            "offsets": offsets,
+            "neighbour_ids": neighbour_ids,
+            "neighbour_weights": neighbour_weights,
+        },
+        "meta": {"keys": keys},
+    }
+
+
+def load_area_index(restaurants=None, orders=None, force=False):
+    def build():
+        data = restaurants if restaurants is not None else catalogue_for().frame
+        return build_area_index(data, orders if orders is not None else load_orders())
+    return AreaIndex(artifacts.build_or_load(
+        "areas", [artifacts.source(restaurants, RESTAURANTS_PATH), artifacts.source(orders, ORDERS_PATH)], build,
+        MODEL_VERSION, force,
+    ))
+
+
+class AreaIndex:
+    """Catalogue rows grouped by area shard, with the neighbouring-area graph."""
+
+    def __init__(self, model):
+        self.fingerprint = model.fingerprint
+        self.keys = IdIndex(model["keys"])
+        self.tokens = [area_tokens(key) for key in self.keys.ids]
+        self.row_shard = model["row_shard"]
+        self.by_shard = model["by_shard"]
+        self.offsets = model["offsets"]
+        self.neighbour_ids = model["neighbour_ids"]
+        self.neighbour_weights = model["neighbour_weights"]
+        self.n_rows = len(self.row_shard)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def match(self, location):
+        """Shards for a free-text location: the exact locality, else every area containing all its words."""
+        key = normalise_area(location)
+        shard = self.keys.get(key)
+        if shard >= 0:
+            return np.array([shard])
+        words = area_tokens(key)
+        if not words:
+            return np.zeros(0, dtype=np.int64)
+        return np.array([i for i, tokens in enumerate(self.tokens) if words <= tokens], dtype=np.int64)
+
+    def shard_rows(self, shard):
+        return self.by_shard[self.offsets[shard]:self.offsets[shard + 1]]
+
+    def rows(self, shards):
+        """Catalogue rows of ``shards``, in catalogue order."""
+        if len(shards) == 0:
+            return np.zeros(0, dtype=np.int32)
+        return np.sort(np.concatenate([self.shard_rows(shard) for shard in shards]))
+
+    def neighbours(self, shard):
+        ids = self.neighbour_ids[shard]
+        return ids[ids >= 0]
+
+    def rings(self, shards):
+        """Yield ``shards``, then their unseen neighbours, one hop at a time."""
+        ring = list(dict.fromkeys(int(shard) for shard in shards))
+        seen = set(ring)
+        while ring:
+            yield ring
+            ring = [int(n) for shard in ring for n in self.neighbours(shard) if int(n) not in seen]
+            ring = list(dict.fromkeys(ring))
+            seen.update(ring)
+
+    def nearby(self, shards, hops=1):
+        """``shards`` plus the areas within ``hops`` of them."""
+        found = []
+        for hop, ring in enumerate(self.rings(shards)):
+            if hop > hops:
+                break
+            found += ring
+        return np.array(found, dtype=np.int64)
+
+    def mask(self, shards):
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.rows(shards)] = True
+        return mask
+
+
+def usual_location(orders, user_id):
+    """The user's most frequent order location, or None (``orders`` is an OrderTable)."""
+    locations = orders['location'][orders.user_orders(user_id)]
+    locations = [location for location in locations if isinstance(location, str)]
+    return Counter(locations).most_common(1)[0][0] if locations else None
+
+
+def request_areas(areas, request, orders=None, user_id=None):
+    """Shards for ``request['location']``, or with ``nearby`` the user's usual location.
+
+    Returns None when the request names no location; raises ``ValueError``
+    for a location matching no area.
+    """
+    location = request.get("location")
+    location = location.strip() if isinstance(location, str) else location
+    if not location and request.get("nearby") and orders is not None:
+        location = usual_location(orders, user_id)
+    if not location:
+        return None
+    shards = areas.match(location)
+    if len(shards) == 0:
+        raise ValueError(f"Unknown location '{location}'.")
+    return shards
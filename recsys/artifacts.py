@@ -0,0 +1,212 @@
+"""Versioned, memory-mappable model artifacts.
+
+Each model is stored under ``<ARTIFACT_DIR>/<name>/<fingerprint>/`` where the
+fingerprint hashes the input data (the files, or DataFrames passed in their
+place) together with the artifact format and model versions. Dense arrays are
+plain ``.npy`` files, sparse CSR matrices are split into their
+``data``/``indices``/``indptr`` arrays, and small metadata (vocabularies,
+scalars) goes into ``manifest.json``. Everything numeric is
+loaded with ``mmap_mode="r"`` so a warm start only maps files into memory,
+and processes mapping the same model share one copy in the page cache.
+
+Every model publish also touches ``<ARTIFACT_DIR>/PUBLISHED``; long-running
+servers poll :func:`generation` to notice new models. Caches that are not
+models, such as the typed data columns, are saved with ``publish=False``.
+Inside :func:`in_memory`, models that are not on disk yet are built without
+being saved, for data such as a background retrain's order log that is
+replaced the next time round.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+ARTIFACT_DIR = os.environ.get("RECSYS_ARTIFACT_DIR", "artifacts")
+FORMAT_VERSION = 1
+PUBLISHED = "PUBLISHED"
+
+_local = threading.local()
+
+
+def source(data, path):
+    """The source to fingerprint: ``data`` if the caller passed a DataFrame, else the file ``path``."""
+    return data if data is not None else path
+
+
+def fingerprint(sources, version=0):
+    """Hash the contents of the ``sources`` plus the format/model version.
+
+    A source is a file path or a DataFrame; frames are hashed by their columns
+    and values, so a model built from in-memory data gets its own artifact.
+    """
+    digest = hashlib.sha256(f"format={FORMAT_VERSION};model={version}".encode())
+    for item in sources:
+        if isinstance(item, pd.DataFrame):
+            digest.update(json.dumps([str(column) for column in item.columns]).encode())
+            digest.update(pd.util.hash_pandas_object(item, index=False).to_numpy().tobytes())
+            continue
+        digest.update(os.path.basename(item).encode())
+        with open(item, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class Artifacts:
+    """Read-only bundle of arrays, sparse matrices and metadata for one model."""
+
+    def __init__(self, name, fingerprint, arrays, matrices, meta, created=None):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.arrays = arrays
+        self.matrices = matrices
+        self.meta = meta
+        self.created = created
+
+    def __getitem__(self, key):
+        for store in (self.arrays, self.matrices, self.meta):
+            if key in store:
+                return store[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.arrays or key in self.matrices or key in self.meta
+
+
+def artifact_path(name, fp):
+    return os.path.join(ARTIFACT_DIR, name, fp)
+
+
+def save_artifacts(name, fp, arrays=None, matrices=None, meta=None, publish=True):
+    """Write a model to disk atomically and return its directory.
+
+    ``publish=False`` leaves ``PUBLISHED`` alone, so servers do not reload.
+    """
+    arrays = arrays or {}
+    matrices = matrices or {}
+    target = artifact_path(name, fp)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{fp}-", dir=os.path.dirname(target))
+
+    for key, value in arrays.items():
+        np.save(os.path.join(staging, f"{key}.npy"), np.asarray(value))
+    shapes = {}
+    for key, matrix in matrices.items():
+        matrix = sparse.csr_matrix(matrix)
+        matrix.sort_indices()
+        for part in ("data", "indices", "indptr"):
+            np.save(os.path.join(staging, f"{key}.{part}.npy"), getattr(matrix, part))
+        shapes[key] = list(matrix.shape)
+
+    manifest = {
+        "name": name,
+        "fingerprint": fp,
+        "format_version": FORMAT_VERSION,
+        "created": time.time(),
+        "arrays": sorted(arrays),
+        "matrices": shapes,
+        "meta": meta or {},
+    }
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    # Publish by renaming the finished directory into place. A previous copy is
+    # renamed aside first and removed afterwards, so it is missing only between
+    # two renames; processes that mapped its files keep reading them.
+    retired = None
+    if os.path.isdir(target):
+        retired = tempfile.mkdtemp(prefix=f".{fp}-retired-", dir=os.path.dirname(target))
+        os.replace(target, retired)
+    os.replace(staging, target)
+    if retired is not None:
+        shutil.rmtree(retired, ignore_errors=True)
+    if publish:
+        with open(os.path.join(ARTIFACT_DIR, PUBLISHED), "w") as f:
+            f.write(f"{name}/{fp}\n")
+    return target
+
+
+def generation():
+    """Modification time in ns of the last publish (0 if nothing was published yet)."""
+    try:
+        return os.stat(os.path.join(ARTIFACT_DIR, PUBLISHED)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def load_artifacts(name, fp, mmap=True):
+    """Load a model written by :func:`save_artifacts`, or ``None`` if missing."""
+    path = artifact_path(name, fp)
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        return None
+
+    mode = "r" if mmap else None
+    arrays = {
+        key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode=mode)
+        for key in manifest["arrays"]
+    }
+    matrices = {}
+    for key, shape in manifest["matrices"].items():
+        parts = [
+            np.load(os.path.join(path, f"{key}.{part}.npy"), mmap_mode=mode)
+            for part in ("data", "indices", "indptr")
+        ]
+        matrices[key] = sparse.csr_matrix(tuple(parts), shape=tuple(shape), copy=False)
+    return Artifacts(name, fp, arrays, matrices, manifest["meta"], manifest.get("created"))
+
+
+@contextmanager
+def in_memory():
+    """Within the block, :func:`build_or_load` keeps the models it builds in this thread in memory.
+
+    Models already on disk are still loaded from there.
+    """
+    previous = getattr(_local, "in_memory", False)
+    _local.in_memory = True
+    try:
+        yield
+    finally:
+        _local.in_memory = previous
+
+
+def memory_artifacts(name, fp, arrays=None, matrices=None, meta=None):
+    """The :class:`Artifacts` that saving and loading the model would give, without touching disk."""
+    arrays = {key: np.asarray(value) for key, value in (arrays or {}).items()}
+    csr = {}
+    for key, matrix in (matrices or {}).items():
+        matrix = sparse.csr_matrix(matrix)
+        matrix.sort_indices()
+        csr[key] = matrix
+    return Artifacts(name, fp, arrays, csr, json.loads(json.dumps(meta or {})), time.time())
+
+
+def build_or_load(name, sources, build, version=0, force=False, publish=True):
+    """Return the artifacts for ``name``, rebuilding them when the sources changed.
+
+    ``build`` is called with no arguments and must return a dict with any of
+    the keys ``arrays``, ``matrices`` and ``meta``. ``publish`` is passed to
+    :func:`save_artifacts`.
+    """
+    fp = fingerprint(sources, version)
+    if not force:
+        cached = load_artifacts(name, fp)
+        if cached is not None:
+            return cached
+    if getattr(_local, "in_memory", False):
+        return memory_artifacts(name, fp, **build())
+    save_artifacts(name, fp, **build(), publish=publish)
+    return load_artifacts(name, fp)
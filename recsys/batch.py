@@ -0,0 +1,243 @@
+"""Precomputed per-user recommendation tables for the user-keyed engines.
+
+Usage::
+
+    python -m recsys.batch                        # matrix, collaborative and fusion, top 20
+    python -m recsys.batch matrix --top-n 50 --workers 8
+
+For every user in the model the job stores the top-N restaurants as two
+fixed-width ``users x N`` arrays: int32 item positions (the model's
+restaurant columns, or catalogue rows for fusion; -1 when a user has fewer
+than N) and float32 scores. Users are split into chunks across a process
+pool. The inputs (factor matrices, or the sparse ratings for collaborative
+filtering) are placed in shared memory once, so workers map them instead of
+receiving copies; fusion workers load the engine, whose models are
+memory-mapped artifacts.
+
+Tables are saved with :mod:`recsys.artifacts` under ``<engine>_table`` and
+keyed on the fingerprint of the model they were computed from. The engines
+load a matching table at startup and answer ``top_n <= N`` for users in it
+with a row lookup. Anything else falls back to online scoring: a larger
+``top_n``, users added after the batch run, a stale table, or an engine
+updated in place.
+
+The fusion engine (behind 4_RecomSystem_Hybrid.py) is tabled for
+user-only requests, where the user's past orders stand in for the seed
+restaurant: each row answers ``{"user_id": ..., "top_n": ...}`` at the
+engine's default pool, method and weights, and also stores the content
+similarity and predicted rating of every entry. Requests with a seed
+restaurant, to the hybrid engine or to fusion, are not tabled: their ranking
+depends on the seed's shortlist, and scoring that shortlist is one small
+dot product per request.
+"""
+
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import artifacts
+
+TABLE_VERSION = 1
+DEFAULT_TOP_N = 20
+TABLE_ENGINES = ("matrix", "collaborative", "fusion")
+# Per-entry values stored next to the scores
+TABLE_DETAILS = {"fusion": ("content", "predicted")}
+
+_shared = {}  # per-worker views of the shared inputs
+
+
+def table_fingerprint(model_fingerprint):
+    return hashlib.sha256(f"table={TABLE_VERSION};model={model_fingerprint}".encode()).hexdigest()[:16]
+
+
+class UserTable:
+    """Fixed-width top-N lists, one row per model user position."""
+
+    def __init__(self, model):
+        self.items = model["items"]
+        self.scores = model["scores"]
+        self.details = {key: model[key] for key in model.arrays if key not in ("items", "scores")}
+        self.width = self.items.shape[1]
+
+    def __len__(self):
+        return len(self.items)
+
+    def lookup(self, user, top_n):
+        """Return ``(items, scores)`` for ``user``, or None if the table cannot answer."""
+        if user >= len(self.items) or top_n > self.width:
+            return None
+        items = self.items[user, :top_n]
+        found = items >= 0
+        return items[found], self.scores[user, :top_n][found]
+
+    def detail(self, key, user, count):
+        """The stored ``key`` values of the first ``count`` entries of ``user``."""
+        return self.details[key][user, :count]
+
+
+def load_user_table(name, model_fingerprint):
+    """The table computed from the model with ``model_fingerprint``, or None."""
+    model = artifacts.load_artifacts(f"{name}_table", table_fingerprint(model_fingerprint))
+    return UserTable(model) if model is not None else None
+
+
+def _share(arrays):
+    """Copy ``arrays`` into shared memory; returns the blocks and their specs."""
+    blocks, specs = [], {}
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[key] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def _init_worker(kind, specs, top_n):
+    from scipy import sparse
+
+    blocks = {key: shared_memory.SharedMemory(name=name) for key, (name, _, _) in specs.items()}
+    arrays = {
+        key: np.ndarray(shape, np.dtype(dtype), buffer=blocks[key].buf)
+        for key, (_, shape, dtype) in specs.items()
+    }
+    _shared.update(arrays, blocks=blocks, kind=kind, top_n=top_n)
+    if kind == "fusion":
+        from .engine import load_engine
+
+        _shared["engine"] = load_engine(kind, use_table=False)
+    elif kind == "matrix":
+        from .mips import ExactMIPSIndex
+
+        _shared["index"] = ExactMIPSIndex(arrays["item_factors"])
+        _shared["rated"] = sparse.csr_matrix(
+            (arrays["rated_data"], arrays["rated_indices"], arrays["rated_indptr"]), shape=tuple(arrays["rated_shape"])
+        )
+    else:
+        _shared["interactions"] = sparse.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(arrays["shape"])
+        )
+
+
+def _score_chunk(start, stop):
+    top_n = _shared["top_n"]
+    if _shared["kind"] == "fusion":
+        # User-only requests at the engine defaults, ranked as FusionEngine.results_many does
+        engine = _shared["engine"]
+        queries = [
+            engine.prepare({"user_id": user_id, "top_n": top_n})[0]
+            for user_id in engine.svd_model.user_index.ids[start:stop]
+        ]
+        columns = {
+            "items": np.full((stop - start, top_n), -1, dtype=np.int32),
+            "scores": np.full((stop - start, top_n), -np.inf, dtype=np.float32),
+            "content": np.zeros((stop - start, top_n), dtype=np.float32),
+            "predicted": np.zeros((stop - start, top_n), dtype=np.float32),
+        }
+        for i, (rows, keys) in enumerate(engine.pipeline.run_many(queries, [top_n] * len(queries))):
+            for key, values in zip(("items", "scores", "content", "predicted"), [rows, *keys]):
+                columns[key][i, :len(rows)] = values
+        return start, columns
+
+    if _shared["kind"] == "matrix":
+        # Same search as MatrixEngine.top_columns, one block of users at a time
+        rated = _shared["rated"]
+        exclude = [rated.indices[rated.indptr[u]:rated.indptr[u + 1]] for u in range(start, stop)]
+        ids, scores = _shared["index"].search(_shared["user_factors"][start:stop], top_n, exclude=exclude)
+        return start, {"items": ids.astype(np.int32), "scores": scores.astype(np.float32)}
+
+    from .collaborative import rank_unrated, similar_users
+
+    interactions, norms = _shared["interactions"], _shared["norms"]
+    ids = np.full((stop - start, top_n), -1, dtype=np.int32)
+    scores = np.full((stop - start, top_n), -np.inf, dtype=np.float32)
+    for user in range(start, stop):
+        items, item_scores = rank_unrated(interactions, user, *similar_users(interactions, norms, user), top_n)
+        ids[user - start, :len(items)], scores[user - start, :len(items)] = items, item_scores
+    return start, {"items": ids, "scores": scores}
+
+
+def table_inputs(name, engine):
+    """Arrays the workers need for ``engine``, and the number of users."""
+    if name == "matrix":
+        rated = engine.rated
+        return {
+            "user_factors": engine.user_factors,
+            "item_factors": np.asarray(engine.item_factors),
+            "rated_data": rated.data,
+            "rated_indices": rated.indices,
+            "rated_indptr": rated.indptr,
+            "rated_shape": np.array(rated.shape),
+        }, len(engine.user_factors)
+    if name == "collaborative":
+        interactions = engine.interactions
+        return {
+            "data": interactions.data,
+            "indices": interactions.indices,
+            "indptr": interactions.indptr,
+            "shape": np.array(interactions.shape),
+            "norms": engine.norms,
+        }, interactions.shape[0]
+    if name == "fusion":
+        return {}, len(engine.svd_model.user_index)
+    raise ValueError(f"No user table for engine '{name}'. Choose from: {', '.join(TABLE_ENGINES)}")
+
+
+def build_user_table(name, top_n=DEFAULT_TOP_N, workers=None, chunk_size=128):
+    """Compute and save the top-``top_n`` table for engine ``name``; returns the table directory."""
+    from .engine import load_engine
+
+    engine = load_engine(name, use_table=False)
+    inputs, n_users = table_inputs(name, engine)
+    columns = {
+        "items": np.full((n_users, top_n), -1, dtype=np.int32),
+        "scores": np.full((n_users, top_n), -np.inf, dtype=np.float32),
+    }
+    for key in TABLE_DETAILS.get(name, ()):
+        columns[key] = np.zeros((n_users, top_n), dtype=np.float32)
+
+    blocks, specs = _share(inputs)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(name, specs, top_n)) as pool:
+            chunks = [(start, min(start + chunk_size, n_users)) for start in range(0, n_users, chunk_size)]
+            for start, chunk in pool.map(_score_chunk, *zip(*chunks)):
+                for key, values in chunk.items():
+                    columns[key][start:start + len(values)] = values
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    model_fingerprint = engine.model_fingerprint
+    return artifacts.save_artifacts(
+        f"{name}_table",
+        table_fingerprint(model_fingerprint),
+        arrays=columns,
+        meta={"engine": name, "top_n": top_n, "users": n_users, "model_fingerprint": model_fingerprint},
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute per-user top-N recommendation tables.")
+    parser.add_argument("engines", nargs="*", metavar="ENGINE", help=f"engines to table: {', '.join(TABLE_ENGINES)} (default: all)")
+    parser.add_argument("--top-n", type=int, default=DEFAULT_TOP_N, help="recommendations stored per user")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=128, help="users per task")
+    args = parser.parse_args(argv)
+    unknown = set(args.engines) - set(TABLE_ENGINES)
+    if unknown:
+        parser.error(f"unknown engine(s): {', '.join(sorted(unknown))}")
+
+    for name in args.engines or TABLE_ENGINES:
+        start = time.perf_counter()
+        path = build_user_table(name, args.top_n, args.workers, args.chunk_size)
+        print(f"{name}: top {args.top_n} table in {time.perf_counter() - start:.2f}s -> {path}")
+
+
+if __name__ == "__main__":
+    main()
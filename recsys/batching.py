@@ -0,0 +1,84 @@
+"""Micro-batching of concurrent requests for the batched engines.
+
+Scoring one request is a small sparse mat-vec or factor dot product, where
+Python and call overhead dominate. :class:`MicroBatcher` collects the
+requests that arrive within ``max_wait`` seconds of the first (or until
+``max_batch`` are waiting) and hands them to ``process`` in one call, which
+runs on an executor thread while the event loop keeps collecting the next
+batch. Engines with ``batched = True`` answer such a batch through
+``results_many`` with one sparse matrix x matrix product or one factor
+matmul for all of it.
+
+Usage (the HTTP server does this with ``--batch-window-ms``)::
+
+    batcher = MicroBatcher(engine.results_many, max_batch=64, max_wait=0.002)
+    cursor = await batcher.submit({"user_id": "U0350"})
+
+A batch never waits longer than ``max_wait`` for company, so an idle server
+adds at most that much latency.
+"""
+
+import asyncio
+
+from .metrics import METRICS
+
+
+class MicroBatcher:
+    """Gather items submitted concurrently into batches for ``process(items) -> results``.
+
+    ``process`` returns one result per item, in order; a result that is an
+    exception is raised to that item's caller only. ``name`` labels the
+    ``batch`` stage and the batch sizes in :mod:`recsys.metrics`.
+    """
+
+    def __init__(self, process, max_batch=64, max_wait=0.002, executor=None, name="batcher"):
+        if max_batch <= 0:
+            raise ValueError("max_batch must be positive.")
+        if max_wait < 0:
+            raise ValueError("max_wait must not be negative.")
+        self.process = process
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = executor
+        self.name = name
+        self.pending = []  # (item, future) waiting for the next batch
+        self.timer = None
+
+    async def submit(self, item):
+        """The result for ``item``, computed in a batch with the items submitted around it."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((item, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        """Start processing everything waiting, in batches of at most ``max_batch``."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        while self.pending:
+            batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            asyncio.get_running_loop().create_task(self.run(batch))
+
+    async def run(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.timed, [item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # the caller went away
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def timed(self, items):
+        with METRICS.stage(self.name, "batch") as timer:
+            timer.size(requests=len(items))
+            return self.process(items)
@@ -0,0 +1,236 @@
+"""Offline benchmark and evaluation of the recommendation engines.
+
+Usage::
+
+    python -m recsys.benchmark                                   # bundled data
+    python -m recsys.benchmark --restaurant-scale 10 --user-scale 10
+    python -m recsys.benchmark --engines matrix,collaborative --json results.json
+
+For every user with at least two orders, ``--test-fraction`` of their orders
+(at least one) are held out and the engines are built on the rest. Each engine
+then runs in its own subprocess, with its data and artifacts in the work
+directory, so build time and peak RSS are measured in isolation. For each
+engine it reports:
+
+* cold build time (no artifacts), warm load time and peak RSS
+* p50/p95/p99 single-request latency and requests/s sequentially and on a
+  thread pool
+* precision, recall and NDCG at ``k`` against the held-out orders
+
+The non-user engines get requests derived from each user's training history:
+their best-rated restaurant as the seed, its cuisines as the preferences,
+their most frequent order location, and twice their highest order cost as the
+budget.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .engine import ENGINES
+from .synthetic import scale_data, write_dataset
+
+EVAL_FILE = "evaluation.json"
+
+
+def split_orders(orders, test_fraction=0.2, seed=0):
+    """Hold out ``test_fraction`` of each user's orders (at least one, if they have two or more)."""
+    rng = np.random.default_rng(seed)
+    shuffled = orders.assign(_key=rng.random(len(orders))).sort_values(['user_id', '_key'])
+    position = shuffled.groupby('user_id').cumcount()
+    size = shuffled.groupby('user_id')['user_id'].transform('size')
+    n_test = np.where(size >= 2, np.maximum(1, np.round(size * test_fraction)), 0)
+    is_test = (position < n_test).to_numpy()
+    shuffled = shuffled.drop(columns='_key')
+    return shuffled[~is_test].sort_index(), shuffled[is_test].sort_index()
+
+
+def evaluation_cases(train, test, restaurants, max_users=200, seed=0):
+    """One case per held-out user: the relevant rest_ids plus the inputs for every engine."""
+    details = restaurants.set_index('rest_id')
+    users = sorted(set(test['user_id']) & set(train['user_id']))
+    if len(users) > max_users:
+        users = sorted(np.random.default_rng(seed).choice(users, max_users, replace=False).tolist())
+    train_by_user = train.groupby('user_id')
+    test_by_user = test.groupby('user_id')['rest_id'].apply(list)
+
+    cases = []
+    for user_id in users:
+        history = train_by_user.get_group(user_id)
+        seed_rest_id = history.sort_values('rating', ascending=False, kind='stable')['rest_id'].iloc[0]
+        seed_restaurant = details.loc[seed_rest_id]
+        cases.append({
+            "user_id": user_id,
+            "relevant": sorted(set(test_by_user[user_id])),
+            "seed_rest_id": seed_rest_id,
+            "seed_name": seed_restaurant['Name'],
+            "cuisines": seed_restaurant['Cuisines'],
+            "location": history['location'].mode().iloc[0].split(',')[0],
+            "budget": str(int(history['cost'].max() * 2)),
+        })
+    return cases
+
+
+def engine_request(engine, case, k):
+    if engine == "knowledge":
+        return {"budget": case["budget"], "cuisine": case["cuisines"].split(',')[0], "veg_only": "No",
+                "service_mode": "Delivery", "top_n": k}
+    if engine == "preferences":
+        return {"preferences": case["cuisines"], "budget": case["budget"], "mode": "Delivery",
+                "location": case["location"], "top_n": k}
+    if engine == "similar":
+        return {"restaurant_name": case["seed_name"], "budget": case["budget"], "mode": "Delivery", "top_n": k}
+    if engine in ("hybrid", "fusion"):
+        return {"user_id": case["user_id"], "rest_id": case["seed_rest_id"], "top_n": k}
+    return {"user_id": case["user_id"], "top_n": k}
+
+
+def ranking_metrics(ranked, relevant, k):
+    """Binary-relevance precision, recall and NDCG at ``k``."""
+    hits = [rest_id in relevant for rest_id in ranked[:k]]
+    dcg = sum(1 / np.log2(i + 2) for i, hit in enumerate(hits) if hit)
+    ideal = sum(1 / np.log2(i + 2) for i in range(min(k, len(relevant))))
+    return sum(hits) / k, sum(hits) / len(relevant), dcg / ideal if ideal else 0.0
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_engine(name, workdir, k, threads):
+    """Benchmark one engine in the current process (data paths come from the environment)."""
+    from .engine import load_engine
+
+    with open(os.path.join(workdir, EVAL_FILE)) as f:
+        cases = json.load(f)
+
+    start = time.perf_counter()
+    engine = load_engine(name)
+    build_s = time.perf_counter() - start
+    build_rss = peak_rss_mb()
+    start = time.perf_counter()
+    load_engine(name)
+    warm_load_s = time.perf_counter() - start
+
+    requests = [engine_request(name, case, k) for case in cases]
+    timings, metrics, errors = [], [], 0
+    for request, case in zip(requests, cases):
+        start = time.perf_counter()
+        try:
+            ranked = [r.rest_id for r in engine.recommend(request)]
+        except ValueError:
+            ranked, errors = [], errors + 1
+        timings.append(time.perf_counter() - start)
+        metrics.append(ranking_metrics(ranked, set(case["relevant"]), k))
+
+    def safe_recommend(request):
+        try:
+            engine.recommend(request)
+        except ValueError:
+            pass
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(safe_recommend, requests))
+    threaded_s = time.perf_counter() - start
+
+    timings = np.array(timings) * 1e3
+    precision, recall, ndcg = np.mean(metrics, axis=0) if metrics else (0.0, 0.0, 0.0)
+    return {
+        "engine": name,
+        "build_s": build_s,
+        "warm_load_s": warm_load_s,
+        "build_rss_mb": build_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "requests": len(requests),
+        "errors": errors,
+        "p50_ms": float(np.percentile(timings, 50)) if len(timings) else None,
+        "p95_ms": float(np.percentile(timings, 95)) if len(timings) else None,
+        "p99_ms": float(np.percentile(timings, 99)) if len(timings) else None,
+        "qps": len(requests) / (timings.sum() / 1e3) if timings.sum() else None,
+        "qps_threads": len(requests) / threaded_s if threaded_s else None,
+        f"precision@{k}": float(precision),
+        f"recall@{k}": float(recall),
+        f"ndcg@{k}": float(ndcg),
+    }
+
+
+def prepare(workdir, restaurant_scale, user_scale, test_fraction, max_users, seed):
+    """Write the (scaled) training data and evaluation cases; returns the env for the workers."""
+    from .data import load_orders, load_restaurants
+
+    restaurants, orders = scale_data(load_restaurants(), load_orders(), restaurant_scale, user_scale, seed)
+    train, test = split_orders(orders, test_fraction, seed)
+    env = write_dataset(workdir, restaurants, train)
+    with open(os.path.join(workdir, EVAL_FILE), "w") as f:
+        json.dump(evaluation_cases(train, test, restaurants, max_users, seed), f)
+    return env, len(restaurants), orders['user_id'].nunique(), len(train), len(test)
+
+
+def format_table(rows, k):
+    # (column, header, format spec) with every column right-aligned to its header
+    columns = [
+        ("build_s", "build s", ".2f"), ("warm_load_s", "load s", ".2f"), ("peak_rss_mb", "RSS MB", ".0f"),
+        ("p50_ms", "p50 ms", ".2f"), ("p95_ms", "p95 ms", ".2f"), ("p99_ms", "p99 ms", ".2f"),
+        ("qps", "req/s", ".0f"), ("qps_threads", "req/s MT", ".0f"), (f"precision@{k}", f"P@{k}", ".4f"),
+        (f"recall@{k}", f"R@{k}", ".4f"), (f"ndcg@{k}", f"NDCG@{k}", ".4f"), ("errors", "errors", "d"),
+    ]
+    widths = [max(len(header), 8) for _, header, _ in columns]
+    lines = [f"{'engine':<13}" + "".join(f" {header:>{w}}" for (_, header, _), w in zip(columns, widths))]
+    for row in rows:
+        cells = [format(row[key], spec) if row.get(key) is not None else "-" for key, _, spec in columns]
+        lines.append(f"{row['engine']:<13}" + "".join(f" {cell:>{w}}" for cell, w in zip(cells, widths)))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation engines.")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--restaurant-scale", type=int, default=1, help="replicate restaurants N times")
+    parser.add_argument("--user-scale", type=int, default=1, help="replicate users N times")
+    parser.add_argument("-k", type=int, default=5, help="cut-off for top-N lists and ranking metrics")
+    parser.add_argument("--users", type=int, default=200, help="held-out users to query")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--threads", type=int, default=4, help="threads for the throughput run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep data and artifacts here instead of a temporary directory")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_engine(args.worker, args.workdir, args.k, args.threads)))
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="recsys-bench-")
+    env, n_restaurants, n_users, n_train, n_test = prepare(
+        os.path.abspath(workdir), args.restaurant_scale, args.user_scale, args.test_fraction, args.users, args.seed
+    )
+    print(f"{n_restaurants} restaurants, {n_users} users, {n_train} training / {n_test} held-out orders in {workdir}")
+
+    rows = []
+    for name in args.engines.split(","):
+        command = [sys.executable, "-m", "recsys.benchmark", "--worker", name, "--workdir", env["RECSYS_DATA_DIR"],
+                   "-k", str(args.k), "--threads", str(args.threads)]
+        result = subprocess.run(command, env={**os.environ, **env}, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"{name}: failed\n{result.stderr}", file=sys.stderr)
+            continue
+        rows.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    print(format_table(rows, args.k))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"restaurants": n_restaurants, "users": n_users, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Offline build step for the model artifacts.
+
+Usage::
+
+    python -m recsys.build               # build whatever is missing or stale
+    python -m recsys.build --force svd   # retrain selected models
+    python -m recsys.build --precision int8   # also store compact copies (recsys.precision)
+"""
+
+import argparse
+import os
+import time
+
+from . import areas, collaborative, content, data, hybrid, knowledge, matrix, popularity, precision
+
+BUILDERS = {
+    "data": data.build_data_cache,
+    "areas": areas.load_area_index,
+    "knowledge": knowledge.load_knowledge_index,
+    "content": content.load_content_model,
+    "preferences": content.load_preference_model,
+    "hybrid_content": hybrid.load_content_model,
+    "svd": hybrid.load_svd_model,
+    "matrix": matrix.load_matrix_model,
+    "collaborative": collaborative.load_collaborative_model,
+    "popularity": popularity.load_popularity_index,
+}
+
+
+def build_models(names=None, force=False, log=print):
+    """Build or load the ``names`` models (default: all), rebuilding stale ones."""
+    for name in names or sorted(BUILDERS):
+        start = time.perf_counter()
+        BUILDERS[name](force=force)
+        log(f"{name}: ready in {time.perf_counter() - start:.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build recommendation model artifacts.")
+    parser.add_argument("models", nargs="*", metavar="MODEL", help=f"models to build: {', '.join(sorted(BUILDERS))} (default: all)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the artifacts are up to date")
+    parser.add_argument("--precision", choices=precision.PRECISIONS,
+                        help="precision of the stored models (default: RECSYS_PRECISION, else float64)")
+    args = parser.parse_args(argv)
+    unknown = set(args.models) - set(BUILDERS)
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(sorted(unknown))}")
+    if args.precision:
+        os.environ["RECSYS_PRECISION"] = args.precision
+
+    build_models(args.models, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Bounded result cache shared by the engines.
+
+Results are keyed on ``(engine name, engine.cache_key(request))``, so
+requests that differ only in whitespace, key order, a defaulted ``top_n`` or
+``"500"`` vs ``500`` share an entry. Each entry remembers the engine's
+``cache_version()``: once an engine is rebuilt from new artifacts or
+updated in place, its older entries are dropped instead of served.
+Entries also expire after ``ttl`` seconds, and the least recently used
+entry is evicted once ``max_entries`` is reached.
+
+Usage::
+
+    cache = ResultCache(max_entries=10000, ttl=300)
+    results = cache.recommend(engine, {"user_id": "U0350"})
+    cursor = cache.results(engine, {"user_id": "U0350"})   # lazy, for paging
+    cache.stats()   # hits, misses, evictions, expirations, invalidations, size
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Thread-safe LRU cache of ``recommend`` results with TTL and version checks.
+
+    Entries are :class:`recsys.results.ResultCursor` objects. They and the
+    records they build are shared between callers and must be treated as
+    read-only; a cached cursor keeps the records built for earlier pages.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300.0, clock=time.monotonic):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (expires, version, results)
+        self.versions = {}  # engine name -> latest version seen
+        self.lock = threading.Lock()
+        self.counts = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _observe_version(self, name, version):
+        # A new version of an engine invalidates all of its entries at once
+        if self.versions.get(name, version) != version:
+            stale = [key for key, entry in self.entries.items() if key[0] == name and entry[1] != version]
+            for key in stale:
+                del self.entries[key]
+            self.counts["invalidations"] += len(stale)
+        self.versions[name] = version
+
+    def get(self, key, version):
+        """Cached results for ``key`` at ``version``, or None."""
+        with self.lock:
+            self._observe_version(key[0], version)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counts["misses"] += 1
+                return None
+            expires, entry_version, results = entry
+            if expires is not None and expires <= self.clock():
+                del self.entries[key]
+                self.counts["expirations"] += 1
+                self.counts["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counts["hits"] += 1
+            return results
+
+    def put(self, key, version, results):
+        with self.lock:
+            if self.versions.get(key[0]) != version:
+                # The engine changed while these results were computed
+                return
+            expires = self.clock() + self.ttl if self.ttl else None
+            self.entries[key] = (expires, version, results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counts["evictions"] += 1
+
+    def results(self, engine, request):
+        """``engine.results(request)``, answered from the cache when possible."""
+        try:
+            key = (engine.name, engine.cache_key(request))
+        except ValueError:
+            # Invalid requests are not cached; let the engine raise its own error
+            return engine.results(request)
+        version = engine.cache_version()
+        results = self.get(key, version)
+        if results is None:
+            results = engine.results(request)
+            self.put(key, version, results)
+        return results
+
+    def results_many(self, engine, requests):
+        """``engine.results_many(requests)`` for the requests that are not cached, in one call."""
+        results, keys, missing = [None] * len(requests), [None] * len(requests), []
+        version = engine.cache_version()
+        for i, request in enumerate(requests):
+            try:
+                keys[i] = (engine.name, engine.cache_key(request))
+            except ValueError:
+                missing.append(i)
+                continue
+            results[i] = self.get(keys[i], version)
+            if results[i] is None:
+                missing.append(i)
+        computed = engine.results_many([requests[i] for i in missing]) if missing else []
+        for i, result in zip(missing, computed):
+            results[i] = result
+            if keys[i] is not None and not isinstance(result, ValueError):
+                self.put(keys[i], version, result)
+        return results
+
+    def recommend(self, engine, request):
+        """``engine.recommend(request)``, answered from the cache when possible."""
+        return list(self.results(engine, request))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.versions.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counts["hits"] + self.counts["misses"]
+            return {
+                **self.counts,
+                "size": len(self.entries),
+                "max_entries": self.max_entries,
+                "hit_rate": self.counts["hits"] / lookups if lookups else 0.0,
+            }
+
+
+class CachedEngine:
+    """Wrap an engine so ``recommend`` goes through a :class:`ResultCache`."""
+
+    def __init__(self, engine, cache=None):
+        self.engine = engine
+        self.cache = cache if cache is not None else ResultCache()
+
+    @property
+    def name(self):
+        return self.engine.name
+
+    def results(self, request):
+        return self.cache.results(self.engine, request)
+
+    def recommend(self, request):
+        return self.cache.recommend(self.engine, request)
+
+    def __getattr__(self, attribute):
+        # Everything else (previous_ratings, past_orders, ...) goes to the engine
+        return getattr(self.engine, attribute)
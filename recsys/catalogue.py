@@ -0,0 +1,176 @@
+"""Restaurant catalogue and order table shared by the engines.
+
+Users and restaurants are interned to dense int32 positions (:class:`IdIndex`)
+and the data is held as one array per column, so engines look results up by
+position instead of filtering a DataFrame per result row:
+
+* :class:`Catalogue`: one row per restaurant in file order, with O(1)
+  ``rest_id`` -> row and name -> first row lookups
+* :class:`OrderTable`: the order log with each order's user position and
+  catalogue row, grouped by user for O(1) access to a user's orders
+
+:func:`load_catalogue` returns one shared catalogue per version of the
+restaurants file, so every engine in a process reuses the same arrays.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import data
+from .ranking import sort_key
+
+_catalogues = {}
+_catalogue_lock = threading.Lock()
+
+
+class IdIndex:
+    """Dense int32 positions for string ids, in first-seen order."""
+
+    def __init__(self, ids=()):
+        self.ids = [str(id_) for id_ in ids]
+        self.positions = {id_: i for i, id_ in enumerate(self.ids)}
+        if len(self.positions) != len(self.ids):
+            raise ValueError("Duplicate ids")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id_):
+        return id_ in self.positions
+
+    def __getitem__(self, position):
+        return self.ids[position]
+
+    def get(self, id_, default=-1):
+        return self.positions.get(id_, default)
+
+    def lookup(self, ids):
+        """Positions of ``ids`` as an int32 array, -1 for unknown ids."""
+        return np.fromiter((self.positions.get(id_, -1) for id_ in ids), dtype=np.int32, count=len(ids))
+
+    def add(self, id_):
+        """Position of ``id_``, appending it if it is new."""
+        position = self.positions.get(id_)
+        if position is None:
+            position = self.positions[id_] = len(self.ids)
+            self.ids.append(id_)
+        return position
+
+    def copy(self):
+        index = IdIndex()
+        index.ids, index.positions = list(self.ids), dict(self.positions)
+        return index
+
+    def to_array(self):
+        return np.array(self.ids, dtype=str)
+
+
+class Catalogue:
+    """Restaurants as struct-of-arrays: ``catalogue['Name'][row]``."""
+
+    def __init__(self, restaurants, version=None):
+        self.frame = restaurants
+        self.version = version
+        self.ids = IdIndex(restaurants['rest_id'])
+        self.columns = {column: restaurants[column].to_numpy() for column in restaurants.columns}
+        # Ratings and other float columns as NaN-free sort keys, parsed once
+        self.rank_keys = {
+            column: sort_key(values) for column, values in self.columns.items() if values.dtype.kind == 'f'
+        }
+        self.first_row_by_name = {}
+        for row, name in enumerate(self.columns['Name']):
+            self.first_row_by_name.setdefault(name, row)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def rank_key(self, column):
+        """``column`` as a float sort key with missing values as ``ranking.MISSING``."""
+        return self.rank_keys[column]
+
+    def row(self, rest_id):
+        return self.ids.get(rest_id)
+
+    def rows(self, rest_ids):
+        return self.ids.lookup(rest_ids)
+
+    def find_name(self, name):
+        """Row of the first restaurant called ``name``, or -1."""
+        return self.first_row_by_name.get(name, -1)
+
+    def record(self, row, columns):
+        """``{column: value}`` for one row."""
+        return {column: self.columns[column][row] for column in columns}
+
+
+def load_catalogue():
+    """The shared catalogue of the restaurants file (rebuilt when the file changes)."""
+    columns = data.load_columns("restaurants", data.SOURCES["restaurants"])
+    with _catalogue_lock:
+        catalogue = _catalogues.get(columns.fingerprint)
+        if catalogue is None:
+            catalogue = Catalogue(data.to_frame("restaurants", columns), version=columns.fingerprint)
+            _catalogues[columns.fingerprint] = catalogue
+        return catalogue
+
+
+def catalogue_for(restaurants=None):
+    """A catalogue of ``restaurants``, or the shared one when None."""
+    return Catalogue(restaurants) if restaurants is not None else load_catalogue()
+
+
+class OrderTable:
+    """Orders as struct-of-arrays with interned users and catalogue rows.
+
+    ``user[i]`` is the position of order ``i``'s user in ``users`` (sorted
+    ids, matching the model builders) and ``item[i]`` its catalogue row, or
+    -1 for restaurants missing from the catalogue.
+    """
+
+    def __init__(self, orders, catalogue):
+        self.catalogue = catalogue
+        self.users = IdIndex(sorted(orders['user_id'].unique()))
+        self.frame = orders.reset_index(drop=True)
+        self._index()
+
+    def _index(self):
+        self.columns = {column: self.frame[column].to_numpy() for column in self.frame.columns}
+        self.user = self.users.lookup(self.columns['user_id'])
+        self.item = self.catalogue.rows(self.columns['rest_id'])
+        # Order positions grouped by user: by_user[offsets[u]:offsets[u + 1]]
+        self.by_user = np.argsort(self.user, kind='stable').astype(np.int32)
+        self.offsets = np.searchsorted(self.user[self.by_user], np.arange(len(self.users) + 1))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def append(self, orders):
+        """Return a new table with ``orders`` added (this one is left unchanged)."""
+        table = OrderTable.__new__(OrderTable)
+        table.catalogue = self.catalogue
+        table.users = self.users.copy()
+        for user_id in orders['user_id']:
+            table.users.add(user_id)
+        table.frame = pd.concat([self.frame, orders[self.frame.columns]], ignore_index=True)
+        table._index()
+        return table
+
+    def user_orders(self, user_id):
+        """Positions of the user's orders in log order (empty if the user is unknown)."""
+        user = self.users.get(user_id)
+        if user < 0:
+            return self.by_user[:0]
+        return self.by_user[self.offsets[user]:self.offsets[user + 1]]
+
+    def best_rated_orders(self, user_id):
+        """Positions of the user's orders, highest rating first (ties in log order)."""
+        rows = self.user_orders(user_id)
+        return rows[np.argsort(-self.columns['rating'][rows], kind='stable')]
@@ -0,0 +1,194 @@
+"""User-based collaborative filtering model used by 5_RecomSystem_Collaborative.py.
+
+Ratings are held in a CSR users x restaurants matrix with users and
+restaurants interned to integer positions. A request computes the target
+user's cosine similarity to the users who share at least one restaurant
+(one sparse mat-vec), so memory and time scale with the number of ratings
+rather than users squared. A top-K neighbours-per-user table is also
+precomputed for callers that prefer a fixed-cost lookup.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from . import artifacts
+from .areas import load_area_index, request_areas
+from .batch import load_user_table
+from .catalogue import IdIndex, OrderTable, catalogue_for
+from .data import ORDER_DETAILS_PATH, load_order_details
+from .engine import Engine, parse_top_n, require
+from .metrics import count, stage
+from .neighbours import build_neighbour_index
+from .popularity import load_popularity_index
+from .precision import load_at_precision, rows_of
+from .ranking import top_k
+from .results import ResultCursor
+
+MODEL_VERSION = 2
+NEIGHBOURS_PER_USER = 50
+
+
+def build_interactions(usersorder_df):
+    """Return ``(interactions, user_ids, rest_ids)`` with repeated ratings averaged."""
+    ratings = usersorder_df.groupby(['user_id', 'rest_id'])['rating'].mean()
+    user_codes, user_ids = pd.factorize(ratings.index.get_level_values('user_id'), sort=True)
+    item_codes, rest_ids = pd.factorize(ratings.index.get_level_values('rest_id'), sort=True)
+    interactions = sparse.csr_matrix(
+        (ratings.to_numpy(dtype=np.float32), (user_codes, item_codes)),
+        shape=(len(user_ids), len(rest_ids)),
+    )
+    return interactions, np.asarray(user_ids, dtype=str), np.asarray(rest_ids, dtype=str)
+
+
+def build_collaborative_model(usersorder_df, k=NEIGHBOURS_PER_USER):
+    interactions, user_ids, rest_ids = build_interactions(usersorder_df)
+    neighbour_ids, neighbour_scores = build_neighbour_index(interactions, k=k)
+    return {
+        "arrays": {
+            "user_ids": user_ids,
+            "rest_ids": rest_ids,
+            "neighbour_ids": neighbour_ids,
+            "neighbour_scores": neighbour_scores,
+        },
+        "matrices": {"interactions": interactions},
+    }
+
+
+def load_collaborative_model(usersorder_df=None, force=False, precision=None):
+    def build():
+        return build_collaborative_model(
+            usersorder_df if usersorder_df is not None else load_order_details()
+        )
+    return load_at_precision(
+        "collaborative", [artifacts.source(usersorder_df, ORDER_DETAILS_PATH)], build, MODEL_VERSION, force, precision,
+        quantised=("neighbour_scores",),
+    )
+
+
+def similar_users(interactions, norms, user):
+    """Return ``(user positions, cosine similarities)`` of users sharing a restaurant."""
+    dots = (interactions @ interactions[user].T).toarray().ravel()
+    dots[user] = 0  # Exclude the user itself
+    users = np.flatnonzero(dots)
+    return users, dots[users] / (norms[users] * norms[user])
+
+
+def rank_unrated(interactions, user, users, similarities, top_n, allowed=None):
+    """Return ``(item positions, scores)`` of the best restaurants ``user`` has not rated.
+
+    Scores are the similarity-weighted average of the ``users``' ratings;
+    only positive scores are returned. ``allowed`` optionally masks the
+    item positions that may be returned.
+    """
+    keep = similarities > 0
+    users, similarities = users[keep], similarities[keep]
+    if len(users) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    weighted_ratings = interactions[users].T @ similarities / similarities.sum()
+
+    # Only restaurants the target user has not rated
+    weighted_ratings[interactions[user].indices] = 0
+    if allowed is not None:
+        weighted_ratings[~allowed] = 0
+    candidates = np.flatnonzero(weighted_ratings > 0)
+    candidates = candidates[top_k(weighted_ratings[candidates], top_n)]
+    return candidates, weighted_ratings[candidates]
+
+
+class CollaborativeEngine(Engine):
+    """Recommend what similar users rated highly (user-based collaborative filtering).
+
+    Request keys: ``user_id`` and optional ``top_n`` and ``location`` (only
+    recommend restaurants in that area and its neighbours; ``nearby=True``
+    uses the user's usual order location). With
+    ``use_neighbour_table=True`` only the precomputed top-K neighbours of the
+    user are used instead of every user with a shared restaurant. Otherwise
+    users covered by a table from ``python -m recsys.batch`` are answered
+    from it unless ``use_table=False``. Unknown users get popular
+    restaurants (:mod:`recsys.popularity`) unless ``cold_start=False``.
+    """
+
+    name = "collaborative"
+
+    def __init__(self, usersorder_df=None, use_neighbour_table=False, use_table=True, cold_start=True):
+        orders = usersorder_df if usersorder_df is not None else load_order_details()
+        model = load_collaborative_model(usersorder_df)
+        self.interactions = model["interactions"]
+        self.areas = load_area_index(orders=usersorder_df)
+        self.version = (model.fingerprint, self.areas.fingerprint)
+        self.model_fingerprint = model.fingerprint
+        self.table = load_user_table(self.name, model.fingerprint) if use_table else None
+        self.neighbour_ids = model["neighbour_ids"]
+        self.neighbour_scores = rows_of(model, "neighbour_scores")
+        self.use_neighbour_table = use_neighbour_table
+        self.user_index = IdIndex(model["user_ids"])
+        self.norms = np.sqrt(np.asarray(self.interactions.multiply(self.interactions).sum(axis=1)).ravel())
+        self.set_orders(OrderTable(orders, catalogue_for()), model["rest_ids"])
+        if cold_start:
+            self.popularity = load_popularity_index(orders=usersorder_df)
+
+    def set_orders(self, orders, rest_ids):
+        """Use ``orders`` for display, with ``rest_ids`` naming the interaction columns."""
+        # The first order of each restaurant supplies its displayed details
+        first_order = {}
+        for position, rest_id in enumerate(orders['rest_id']):
+            first_order.setdefault(rest_id, position)
+        self.first_order = np.array([first_order[rest_id] for rest_id in rest_ids.tolist()], dtype=np.int32)
+        self.rest_ids = rest_ids
+        self.item_rows = orders.catalogue.rows(rest_ids)
+        self.orders = orders
+
+    def previous_ratings(self, user_id):
+        # Restaurants rated by the user, best rated first
+        return self.orders.frame.iloc[self.orders.best_rated_orders(user_id)]
+
+    def similar_users(self, user):
+        """Return ``(user positions, cosine similarities)`` of users sharing a restaurant."""
+        if self.use_neighbour_table:
+            users, similarities = self.neighbour_ids[user], self.neighbour_scores[user]
+        else:
+            users, similarities = similar_users(self.interactions, self.norms, user)
+        keep = similarities > 0
+        return users[keep], similarities[keep]
+
+    def results(self, request):
+        user_id = require(request, "user_id", "Please enter a User ID.")
+        top_n = parse_top_n(request)
+        if user_id not in self.user_index:
+            if self.popularity is None:
+                raise ValueError(f"User ID {user_id} not found.")
+            count(self.name, "cold_starts")
+            # Catalogue columns standing in for the order columns shown to known users
+            return self.popularity.results(
+                request,
+                {'cost': 'AverageCost', 'Cuisines': 'Cuisines', 'rating': self.popularity.rating_detail()},
+                self.orders,
+                user_id,
+            )
+        user = self.user_index.get(user_id)
+
+        allowed = None
+        shards = request_areas(self.areas, request, self.orders, user_id)
+        if shards is not None:
+            # Restaurants in the area and its neighbours, by interaction column
+            area_mask = self.areas.mask(self.areas.nearby(shards))
+            allowed = (self.item_rows >= 0) & area_mask[self.item_rows]
+
+        precomputed = None
+        if self.table is not None and not self.use_neighbour_table and allowed is None:
+            precomputed = self.table.lookup(user, top_n)
+            count(self.name, "table_hits" if precomputed is not None else "table_misses")
+        if precomputed is not None:
+            items, scores = precomputed
+        else:
+            with stage(self.name, "neighbours") as timer:
+                users, similarities = self.similar_users(user)
+                timer.size(users=self.interactions.shape[0], neighbours=len(users))
+            with stage(self.name, "rank") as timer:
+                items, scores = rank_unrated(self.interactions, user, users, similarities, top_n, allowed)
+                timer.size(items=self.interactions.shape[1])
+
+        return ResultCursor(
+            self.first_order[items], scores, self.orders, {column: column for column in ['cost', 'Cuisines', 'rating']}
+        )
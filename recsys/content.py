@@ -0,0 +1,284 @@
+"""Content-based engines used by the two 2_RecomSystem_*.py scripts.
+
+Both engines also answer batches (``results_many``): the queries of every
+request are vectorised together and scored against the candidate rows in
+one sparse matrix product.
+"""
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from . import artifacts
+from .catalogue import catalogue_for
+from .data import RESTAURANTS_PATH, load_restaurants
+from .engine import Engine, parse_budget, parse_top_n, require
+from .metrics import stage
+from .pipeline import AllRows, BudgetFilter, GroupScoreCandidates, Pipeline, RatedFilter, run_batch
+from .precision import load_at_precision
+from .results import ResultCursor
+
+MODEL_VERSION = 1
+MODES = {"Delivery": "Delivery Ratings", "Dinner": "Dinner Ratings"}
+
+
+def content_text(data):
+    return (
+        data['Cuisines'].fillna('') + " " +
+        data['PopularDishes'].fillna('') + " " +
+        data['KnownFor'].fillna('')
+    )
+
+
+def build_content_model(data):
+    vectorizer = TfidfVectorizer(stop_words='english')
+    content_matrix = vectorizer.fit_transform(content_text(data))
+    return {
+        "arrays": {"idf": vectorizer.idf_},
+        "matrices": {"content_matrix": content_matrix},
+        "meta": {"vocabulary": {term: int(i) for term, i in vectorizer.vocabulary_.items()}},
+    }
+
+
+def load_content_model(data=None, force=False, precision=None):
+    """Load the content model, fitting it on ``data`` (or the catalogue) if stale."""
+    def build():
+        return build_content_model(data if data is not None else load_restaurants())
+    return load_at_precision(
+        "content", [artifacts.source(data, RESTAURANTS_PATH)], build, MODEL_VERSION, force, precision
+    )
+
+
+def preference_text(data):
+    return data['Cuisines'].fillna('') + ' ' + data['PopularDishes'].fillna('')
+
+
+def build_preference_model(data):
+    # Rows are L2-normalised so a dot product with a normalised query is the cosine similarity
+    content_vectorizer = CountVectorizer(stop_words='english')
+    content_matrix = normalize(content_vectorizer.fit_transform(preference_text(data)))
+    area_vectorizer = CountVectorizer(stop_words='english')
+    area_matrix = normalize(area_vectorizer.fit_transform(data['Area'].fillna('')))
+    return {
+        "matrices": {"content_matrix": content_matrix, "area_matrix": area_matrix},
+        "meta": {
+            "content_vocabulary": {term: int(i) for term, i in content_vectorizer.vocabulary_.items()},
+            "area_vocabulary": {term: int(i) for term, i in area_vectorizer.vocabulary_.items()},
+        },
+    }
+
+
+def load_preference_model(data=None, force=False, precision=None):
+    """Load the count vectorizer model for free-text preferences and locations."""
+    def build():
+        return build_preference_model(data if data is not None else load_restaurants())
+    return load_at_precision(
+        "preferences", [artifacts.source(data, RESTAURANTS_PATH)], build, MODEL_VERSION, force, precision
+    )
+
+
+def parse_mode(request):
+    mode = request.get("mode")
+    if mode not in MODES:
+        raise ValueError("Please select a valid mode of service.")
+    return mode
+
+
+def filtered_pipeline(catalogue, scorer, name, generator=None, batch_scorer=None):
+    """Score every restaurant (or those from ``generator``) within budget and rated in the selected mode."""
+    return Pipeline(
+        [(generator if generator is not None else AllRows(catalogue), None)],
+        filters=[BudgetFilter(catalogue), RatedFilter(catalogue, "mode", MODES)],
+        scorer=scorer,
+        candidates=len(catalogue),
+        name=name,
+        batch_scorer=batch_scorer,
+    )
+
+
+def batch_similarity(matrix, rows, queries):
+    """Per request ``i``, the similarity of ``matrix[rows[i]]`` to ``queries[i]``, from one product.
+
+    ``queries`` is sparse or dense, one row per request.
+
+    The product covers the union of the rows; each entry sums the same
+    terms in the same order as ``matrix[rows[i]] @ queries[i].T``.
+    """
+    union, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+    similarity = matrix[union] @ queries.T
+    if sparse.issparse(similarity):
+        similarity = similarity.toarray()
+    ends = np.cumsum([len(request_rows) for request_rows in rows])
+    return [similarity[positions, i] for i, positions in enumerate(np.split(inverse, ends[:-1]))]
+
+
+class PreferenceEngine(Engine):
+    """Match free-text preferences and a location against the catalogue.
+
+    Request keys: ``preferences``, ``budget``, ``mode`` ("Delivery" or
+    "Dinner"), ``location`` and optional ``top_n``.
+
+    Location similarity is the first sort key and depends only on a
+    restaurant's Area, so it is computed once per distinct area and only
+    the restaurants whose area scores at least as high as the ``top_n``-th
+    passing restaurant's are scored for content (ties included, so the
+    result is the same as scoring every restaurant).
+    """
+
+    name = "preferences"
+    batched = True
+
+    def __init__(self, data=None):
+        self.catalogue = catalogue_for(data)
+        self.data = self.catalogue.frame
+        model = load_preference_model(data)
+        self.content_matrix = model["content_matrix"]
+        self.area_matrix = model["area_matrix"]
+        self.content_vectorizer = CountVectorizer(stop_words='english', vocabulary=model["content_vocabulary"])
+        self.area_vectorizer = CountVectorizer(stop_words='english', vocabulary=model["area_vocabulary"])
+
+        # Location similarity depends only on the Area string, so each distinct area is scored once
+        _, first_rows, self.area_of_row = np.unique(
+            self.catalogue['Area'].astype(str), return_index=True, return_inverse=True
+        )
+        self.area_vectors = self.area_matrix[first_rows]
+        self.version = (self.catalogue.version, model.fingerprint)
+        self.pipeline = filtered_pipeline(
+            self.catalogue, self.score, self.name, GroupScoreCandidates(self.area_of_row, "location_scores"),
+            self.score_many,
+        )
+
+    def similarity(self, matrix, vectorizer, text):
+        with stage(self.name, "vectorize"):
+            query = normalize(vectorizer.transform([text]))
+        with stage(self.name, "similarity") as timer:
+            timer.size(rows=matrix.shape[0], features=matrix.shape[1])
+            return (matrix @ query.T).toarray().ravel()
+
+    def score(self, request, rows):
+        # Sort by location similarity, then content similarity and the selected rating
+        return [
+            (request["location_scores"][self.area_of_row[rows]], True),
+            (self.similarity(self.content_matrix[rows], self.content_vectorizer, request["preferences"]), True),
+            (self.catalogue.rank_key(MODES[request["mode"]])[rows], True),
+        ]
+
+    def score_many(self, requests, rows):
+        # One vectorizer call and one product for the whole batch
+        with stage(self.name, "vectorize"):
+            preferences = normalize(self.content_vectorizer.transform([request["preferences"] for request in requests]))
+        with stage(self.name, "similarity") as timer:
+            timer.size(rows=sum(map(len, rows)), features=self.content_matrix.shape[1], requests=len(requests))
+            content_similarity = batch_similarity(self.content_matrix, rows, preferences)
+        return [
+            [
+                (request["location_scores"][self.area_of_row[request_rows]], True),
+                (content_similarity[i], True),
+                (self.catalogue.rank_key(MODES[request["mode"]])[request_rows], True),
+            ]
+            for i, (request, request_rows) in enumerate(zip(requests, rows))
+        ]
+
+    def prepare(self, request):
+        """Validate ``request``; returns the pipeline query and ``top_n``."""
+        preferences = request.get("preferences")
+        if not preferences:
+            raise ValueError("Please enter valid preferences and budget.")
+        budget = parse_budget(request.get("budget"))
+        mode = parse_mode(request)
+        location = require(request, "location", "Please enter a location.").lower()
+        top_n = parse_top_n(request)
+
+        # Budget and rating filters run first; only the remaining rows are scored
+        query = {
+            "preferences": preferences,
+            "budget": budget,
+            "mode": mode,
+            "location": location,
+            "location_scores": self.similarity(self.area_vectors, self.area_vectorizer, location),
+            "top_n": top_n,
+        }
+        return query, top_n
+
+    def finish(self, query, rows, keys):
+        location_similarity, content_similarity, ratings = keys
+        details = {column: column for column in ['Area', 'Cuisines', 'PopularDishes', 'AverageCost']}
+        details['Rating'] = lambda i, row: round(float(ratings[i]), 1)
+        details['LocationSimilarity'] = lambda i, row: float(location_similarity[i])
+        return ResultCursor(rows, content_similarity, self.catalogue, details)
+
+    def results(self, request):
+        query, top_n = self.prepare(request)
+        return self.finish(query, *self.pipeline.run(query, top_n))
+
+    def results_many(self, requests):
+        return run_batch(self.pipeline, requests, self.prepare, self.finish)
+
+
+class SimilarRestaurantEngine(Engine):
+    """Find restaurants whose TF-IDF content is closest to a named restaurant.
+
+    Request keys: ``restaurant_name``, ``budget``, ``mode`` and optional ``top_n``.
+    """
+
+    name = "similar"
+    batched = True
+
+    def __init__(self, data=None):
+        self.catalogue = catalogue_for(data)
+        self.data = self.catalogue.frame
+        model = load_content_model(data)
+        self.content_matrix = model["content_matrix"]
+        self.version = (self.catalogue.version, model.fingerprint)
+        self.pipeline = filtered_pipeline(self.catalogue, self.score, self.name, batch_scorer=self.score_many)
+
+    def score(self, request, rows):
+        # TF-IDF rows are L2-normalised, so the dot product is the cosine similarity
+        similarity = (self.content_matrix[rows] @ self.content_matrix[request["seed"]].T).toarray().ravel()
+        # Sort by similarity and ratings, then the cheaper restaurant
+        return [
+            (similarity, True),
+            (self.catalogue.rank_key(MODES[request["mode"]])[rows], True),
+            (self.catalogue['AverageCost'][rows], False),
+        ]
+
+    def score_many(self, requests, rows):
+        seeds = self.content_matrix[[request["seed"] for request in requests]]
+        similarity = batch_similarity(self.content_matrix, rows, seeds)
+        return [
+            [
+                (similarity[i], True),
+                (self.catalogue.rank_key(MODES[request["mode"]])[request_rows], True),
+                (self.catalogue['AverageCost'][request_rows], False),
+            ]
+            for i, (request, request_rows) in enumerate(zip(requests, rows))
+        ]
+
+    def prepare(self, request):
+        """Validate ``request``; returns the pipeline query and ``top_n``."""
+        restaurant_name = require(request, "restaurant_name", "Please enter a restaurant name or preferences.")
+        budget = parse_budget(request.get("budget"))
+        mode = parse_mode(request)
+        top_n = parse_top_n(request)
+
+        # Check if the restaurant exists in the dataset
+        match = self.catalogue.find_name(restaurant_name)
+        if match < 0:
+            raise ValueError(f"'{restaurant_name}' not found in the dataset.")
+
+        # Only restaurants within budget and rated in the selected mode are scored
+        return {"seed": match, "budget": budget, "mode": mode}, top_n
+
+    def finish(self, query, rows, keys):
+        similarity, ratings, _ = keys
+        details = {column: column for column in ['Cuisines', 'PopularDishes', 'KnownFor', 'AverageCost']}
+        details['Rating'] = lambda i, row: round(float(ratings[i]), 1)
+        return ResultCursor(rows, similarity, self.catalogue, details)
+
+    def results(self, request):
+        query, top_n = self.prepare(request)
+        return self.finish(query, *self.pipeline.run(query, top_n))
+
+    def results_many(self, requests):
+        return run_batch(self.pipeline, requests, self.prepare, self.finish)
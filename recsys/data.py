@@ -0,0 +1,149 @@
+"""Paths, schemas and loaders for the data files.
+
+The files are read from the working directory unless ``RECSYS_DATA_DIR`` points
+elsewhere; ``RECSYS_ORDER_DETAILS`` overrides the order details file, which may
+be an ``.xlsx`` or a ``.csv`` with the same columns.
+
+Each source is parsed once into a typed columnar cache (one ``.npy`` file per
+column, stored with :mod:`recsys.artifacts`) and memory-mapped on later loads.
+The cache is keyed on the source file contents, so editing a file rebuilds it.
+Column types follow ``SCHEMAS``:
+
+* ``category``: int32 codes into a sorted array of distinct strings (-1 = missing)
+* ``flag``: int8 0/1
+* ``int32`` / ``int8``: integers, with non-numeric values as 0
+* ``float32``: decimals, with non-numeric values such as "-" as NaN
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import artifacts
+
+DATA_DIR = os.environ.get("RECSYS_DATA_DIR", ".")
+RESTAURANTS_PATH = os.path.join(DATA_DIR, "BangaloreZomatoData_with_rest_id.csv")
+ORDERS_PATH = os.path.join(DATA_DIR, "UserOrdersData.csv")
+ORDER_DETAILS_PATH = os.environ.get("RECSYS_ORDER_DETAILS", os.path.join(DATA_DIR, "USER AND RESTRAUNT.xlsx"))
+
+SCHEMA_VERSION = 1
+SOURCES = {"restaurants": RESTAURANTS_PATH, "orders": ORDERS_PATH, "order_details": ORDER_DETAILS_PATH}
+SCHEMAS = {
+    "restaurants": {
+        'Name': "category",
+        'URL': "category",
+        'Cuisines': "category",
+        'Area': "category",
+        'Timing': "category",
+        'Full_Address': "category",
+        'PhoneNumber': "category",
+        'IsHomeDelivery': "flag",
+        'isTakeaway': "flag",
+        'isIndoorSeating': "flag",
+        'isVegOnly': "flag",
+        'Dinner Ratings': "float32",
+        'Dinner Reviews': "int32",
+        'Delivery Ratings': "float32",
+        'Delivery Reviews': "int32",
+        'KnownFor': "category",
+        'PopularDishes': "category",
+        'PeopleKnownFor': "category",
+        'AverageCost': "int32",
+        'rest_id': "category",
+    },
+    "orders": {
+        'user_id': "category",
+        'rest_id': "category",
+        'cost': "int32",
+        'rating': "int8",
+        'location': "category",
+    },
+    "order_details": {
+        'rest_id': "category",
+        'Name': "category",
+        'user_id': "category",
+        'cost': "int32",
+        'rating': "int8",
+        'location': "category",
+        'Cuisines': "category",
+    },
+}
+
+
+def read_source(path):
+    if path.endswith(".csv"):
+        return pd.read_csv(path, dtype=str)
+    return pd.read_excel(path, dtype=str)
+
+
+def encode_column(values, kind):
+    """Return ``{suffix: array}`` for one column parsed as ``kind``."""
+    if kind == "category":
+        codes, categories = pd.factorize(values, sort=True)
+        return {"": codes.astype(np.int32), ".categories": np.asarray(categories, dtype=str)}
+    numbers = pd.to_numeric(values, errors='coerce')
+    if kind == "float32":
+        return {"": numbers.to_numpy(dtype=np.float32, na_value=np.nan)}
+    dtype = np.int8 if kind in ("flag", "int8") else np.int32
+    return {"": numbers.fillna(0).to_numpy(dtype=dtype)}
+
+
+def build_columns(dataset, path):
+    schema = SCHEMAS[dataset]
+    raw = read_source(path)
+    missing = [column for column in schema if column not in raw.columns]
+    if missing:
+        raise ValueError(f"{path} is missing columns: {', '.join(missing)}")
+    arrays = {}
+    for column, kind in schema.items():
+        for suffix, array in encode_column(raw[column], kind).items():
+            arrays[column + suffix] = array
+    return {"arrays": arrays, "meta": {"columns": list(schema), "n_rows": len(raw)}}
+
+
+def decode_column(columns, column, kind):
+    values = columns[column]
+    if kind != "category":
+        return values
+    decoded = columns[column + ".categories"].astype(object)[values]
+    decoded[values < 0] = np.nan
+    return decoded
+
+
+def load_columns(dataset, path, force=False):
+    """Typed columns of ``path`` as :class:`recsys.artifacts.Artifacts`, building the cache if needed."""
+    return artifacts.build_or_load(
+        f"data_{dataset}", [path], lambda: build_columns(dataset, path), SCHEMA_VERSION, force, publish=False
+    )
+
+
+def build_data_cache(force=False):
+    """Convert every source file into its typed cache (no-op when up to date)."""
+    for dataset, path in SOURCES.items():
+        load_columns(dataset, path, force)
+
+
+def to_frame(dataset, columns):
+    """DataFrame of the columns returned by :func:`load_columns`."""
+    schema = SCHEMAS[dataset]
+    return pd.DataFrame({column: decode_column(columns, column, schema[column]) for column in columns["columns"]})
+
+
+def load_table(dataset, path, force=False):
+    return to_frame(dataset, load_columns(dataset, path, force))
+
+
+def load_restaurants(force=False):
+    """Restaurant catalogue (one row per restaurant, keyed by ``rest_id``)."""
+    return load_table("restaurants", SOURCES["restaurants"], force)
+
+
+def load_orders(force=False):
+    """User orders: user_id, rest_id, cost, rating, location."""
+    return load_table("orders", SOURCES["orders"], force)
+
+
+def load_order_details(force=False):
+    """User orders joined with the restaurant Name and Cuisines."""
+    return load_table("order_details", SOURCES["order_details"], force)
@@ -0,0 +1,134 @@
+"""Common interface for the recommendation engines.
+
+Every strategy is an :class:`Engine` subclass that loads its data and models
+once in ``__init__`` and then answers ``recommend(request)`` calls, where
+``request`` is a plain dict (the same shape the HTTP server accepts as JSON).
+Engines implement ``results(request)``, which ranks and returns a lazy
+:class:`recsys.results.ResultCursor`; ``recommend`` formats all of it.
+Engines keep no per-request state, so one instance can be shared by any
+number of threads. ``results_many(requests)`` answers several requests at
+once; engines with ``batched = True`` score them together
+(:mod:`recsys.batching`).
+"""
+
+import importlib
+import json
+from dataclasses import asdict, dataclass, field
+
+from .metrics import stage
+
+ENGINES = {
+    "knowledge": "recsys.knowledge:KnowledgeEngine",
+    "preferences": "recsys.content:PreferenceEngine",
+    "similar": "recsys.content:SimilarRestaurantEngine",
+    "matrix": "recsys.matrix:MatrixEngine",
+    "hybrid": "recsys.hybrid:HybridEngine",
+    "fusion": "recsys.fusion:FusionEngine",
+    "collaborative": "recsys.collaborative:CollaborativeEngine",
+    "popular": "recsys.popularity:PopularityEngine",
+}
+
+
+@dataclass
+class Recommendation:
+    rest_id: str
+    name: str
+    score: float = None
+    details: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class Engine:
+    name = None
+    # Fingerprints of the loaded models and data (set by subclasses) and a
+    # counter bumped by in-place updates; together they version the results
+    version = None
+    revision = 0
+    # Cold-start lists for users without history (recsys.popularity.PopularityIndex), if used
+    popularity = None
+    # True if results_many scores a batch of requests together rather than one by one
+    batched = False
+
+    def results(self, request):
+        """Return a :class:`recsys.results.ResultCursor` over the ranked results for ``request``.
+
+        Raises ``ValueError`` when the request is invalid.
+        """
+        raise NotImplementedError
+
+    def results_many(self, requests):
+        """:meth:`results` for each of ``requests``; an invalid request's entry is its ``ValueError``."""
+        results = []
+        for request in requests:
+            try:
+                results.append(self.results(request))
+            except ValueError as e:
+                results.append(e)
+        return results
+
+    def recommend(self, request):
+        """Return a ranked list of :class:`Recommendation` for ``request``.
+
+        Raises ``ValueError`` when the request is invalid.
+        """
+        cursor = self.results(request)
+        with stage(self.name, "format"):
+            return list(cursor)
+
+    def cache_version(self):
+        if self.popularity is None:
+            return (self.version, self.revision)
+        return (self.version, self.revision, self.popularity.fingerprint, self.popularity.revision)
+
+    def cache_key(self, request):
+        """Hashable normalised ``request``: requests with equal keys get equal results.
+
+        Raises ``ValueError`` when the request is invalid.
+        """
+        items = [("top_n", parse_top_n(request))]
+        for key, value in request.items():
+            if key == "top_n":
+                continue
+            if key == "budget":
+                value = parse_budget(value)
+            elif isinstance(value, str):
+                value = value.strip()
+            elif not isinstance(value, (int, float, bool, type(None))):
+                value = json.dumps(value, sort_keys=True, default=str)
+            if value is not None and value != "":
+                items.append((key, value))
+        return tuple(sorted(items, key=lambda item: item[0]))
+
+
+def get_engine_class(name):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine '{name}'. Choose from: {', '.join(ENGINES)}")
+    module_name, class_name = ENGINES[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def load_engine(name, **kwargs):
+    return get_engine_class(name)(**kwargs)
+
+
+def require(request, key, message):
+    value = request.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError(message)
+    return value.strip() if isinstance(value, str) else value
+
+
+def parse_budget(value):
+    budget = str(value).strip() if value is not None else ""
+    if not budget.isdigit() or int(budget) <= 0:
+        raise ValueError("Please enter a valid budget.")
+    return int(budget)
+
+
+def parse_top_n(request, default=5):
+    top_n = request.get("top_n", default)
+    if not isinstance(top_n, int) or isinstance(top_n, bool) or top_n <= 0:
+        raise ValueError("top_n must be a positive integer.")
+    return top_n
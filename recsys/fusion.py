@@ -0,0 +1,318 @@
+"""Score fusion of content similarity and SVD predicted ratings.
+
+The hybrid engine shortlists a seed restaurant's content neighbours and
+only reorders them with SVD, so the collaborative signal never adds a
+candidate. :class:`FusionEngine` builds one candidate pool from both
+sources instead:
+
+* content neighbours of the seed restaurant, or without a seed of the
+  user's best-rated restaurants (at most ``CONTENT_SHARE`` of the pool)
+* the restaurants with the highest predicted rating for the user
+* the most ordered restaurants, if the filters leave too few of either
+
+The seed itself is never recommended. Every candidate is then scored by
+both models: cosine similarity to the seed (or to the user's rating-weighted
+taste profile) and the SVD predicted rating. The two scores are min-max
+normalised over the pool and combined with weights, or by reciprocal rank
+fusion, in one vectorised pass.
+
+For users SVD was not trained on, the Bayesian average rating of
+:mod:`recsys.popularity` stands in for the predicted rating; a new user
+with no seed and no orders gets the popular list. User-only requests with
+no other keys are answered from a table from ``python -m recsys.batch``
+when one matches the models and the engine defaults.
+
+The pool size trades quality for latency. ``latency_budget_ms`` caps it
+using a running estimate of the per-request fixed cost and the cost per
+candidate (:class:`CostModel`). Requests answered in a batch
+(``results_many``) share one content product and one SVD dot product; they
+use the cost model but do not update it, as their latency depends on the
+batch.
+"""
+
+import hashlib
+import threading
+import time
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+from .batch import load_user_table
+from .content import batch_similarity
+from .engine import parse_top_n, require
+from .hybrid import HybridEngine
+from .metrics import count
+from .pipeline import ExcludeFilter, FactorCandidates, NeighbourCandidates, Pipeline, PopularCandidates, run_batch
+from .precision import rows_of
+from .results import ResultCursor
+
+DEFAULT_POOL = 100
+MAX_POOL = 2000
+CONTENT_SHARE = 0.5
+RRF_K = 60
+PROFILE_ORDERS = 5  # best-rated past orders whose neighbours seed a user-only request
+METHODS = ("weighted", "rrf")
+# Request keys a user table answer may have (see recsys.batch)
+TABLE_KEYS = {"user_id", "rest_id", "top_n"}
+
+
+def fuse(signals, weights, method="weighted", rrf_k=RRF_K):
+    """Combine ``signals`` (one row per source, one column per candidate) into one score per candidate.
+
+    ``weighted``: weighted sum of the min-max normalised rows (a constant row
+    contributes 0). ``rrf``: weighted reciprocal rank fusion,
+    ``sum(w / (rrf_k + rank))`` with ranks from 1 and ties in column order.
+    """
+    signals = np.asarray(signals, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)[:, None]
+    if signals.shape[1] == 0:
+        return np.zeros(0)
+    if method == "weighted":
+        low = signals.min(axis=1, keepdims=True)
+        span = signals.max(axis=1, keepdims=True) - low
+        normalised = np.divide(signals - low, span, out=np.zeros_like(signals), where=span > 0)
+        return (weights * normalised).sum(axis=0)
+    if method == "rrf":
+        order = np.argsort(-signals, axis=1, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(1, signals.shape[1] + 1)[None, :], axis=1)
+        return (weights / (rrf_k + ranks)).sum(axis=0)
+    raise ValueError(f"Unknown fusion method '{method}'. Use one of: {', '.join(METHODS)}")
+
+
+class CostModel:
+    """Running estimate of a request's cost as ``fixed + per_candidate * pool`` seconds.
+
+    Requests on different threads observe and read it concurrently, so
+    updates and reads hold ``lock``.
+    """
+
+    def __init__(self, decay=0.1):
+        self.decay = decay
+        self.fixed = None
+        self.per_candidate = None
+        self.lock = threading.Lock()
+
+    def observe(self, total, scoring, pool):
+        """Record a request that took ``total`` seconds, ``scoring`` of them for ``pool`` candidates."""
+        if pool <= 0:
+            return
+        fixed, per_candidate = max(total - scoring, 0.0), scoring / pool
+        with self.lock:
+            if self.fixed is None:
+                self.fixed, self.per_candidate = fixed, per_candidate
+            else:
+                self.fixed += self.decay * (fixed - self.fixed)
+                self.per_candidate += self.decay * (per_candidate - self.per_candidate)
+
+    def pool_for(self, budget, low, high):
+        """Largest pool in ``[low, high]`` expected to finish within ``budget`` seconds."""
+        with self.lock:
+            fixed, per_candidate = self.fixed, self.per_candidate
+        if per_candidate is None or per_candidate <= 0:
+            return high
+        return int(min(max((budget - fixed) / per_candidate, low), high))
+
+
+def parse_weight(value):
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        weight = -1.0
+    if not 0 <= weight <= 1:
+        raise ValueError("content_weight must be a number between 0 and 1.")
+    return weight
+
+
+def parse_pool(value):
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 < value <= MAX_POOL:
+        raise ValueError(f"pool must be an integer between 1 and {MAX_POOL}.")
+    return value
+
+
+class FusionEngine(HybridEngine):
+    """Fuse content similarity and SVD predictions over a shared candidate pool.
+
+    Request keys: ``user_id`` and optional ``rest_id`` (a seed restaurant;
+    without one the user's past orders stand in for it), ``top_n``,
+    ``pool`` (candidates scored), ``method`` ("weighted" or "rrf"),
+    ``content_weight`` (0 to 1; SVD gets the rest), ``latency_budget_ms``
+    and the hybrid engine's filters (``budget``, ``veg_only``,
+    ``service_mode``, ``mode``, ``location``, ``nearby``). The constructor
+    arguments are the defaults for the optional keys. Unless
+    ``use_table=False`` or a default latency budget is set, user-only
+    requests are answered from a matching user table.
+    """
+
+    name = "fusion"
+
+    def __init__(self, restaurant_data=None, user_data=None, pool=DEFAULT_POOL, method="weighted",
+                 content_weight=0.5, latency_budget_ms=None, rrf_k=RRF_K, cold_start=True, use_table=True):
+        super().__init__(restaurant_data, user_data, cold_start=cold_start)
+        self.pool = parse_pool(pool)
+        if method not in METHODS:
+            raise ValueError(f"Unknown fusion method '{method}'. Use one of: {', '.join(METHODS)}")
+        self.method = method
+        self.content_weight = parse_weight(content_weight)
+        self.latency_budget_ms = latency_budget_ms
+        self.rrf_k = rrf_k
+        self.cost = CostModel()
+        # Tabled answers hold for these models at these defaults
+        self.model_fingerprint = hashlib.sha256(
+            repr((self.version, self.pool, self.method, self.content_weight, self.rrf_k)).encode()
+        ).hexdigest()[:16]
+        use_table = use_table and latency_budget_ms is None
+        self.table = load_user_table(self.name, self.model_fingerprint) if use_table else None
+
+        # TF-IDF rows are L2-normalised, so dot products are cosine similarities
+        self.feature_matrix = self.content_model["feature_matrix"]
+        neighbours = NeighbourCandidates(self.neighbour_ids, rows_of(self.content_model, "neighbour_scores"))
+        self.pipeline = Pipeline(
+            [
+                (neighbours, CONTENT_SHARE),
+                (FactorCandidates(self.svd_model, self.item_rows), None),
+                (PopularCandidates(lambda: self.orders), None),
+            ],
+            filters=self.filters + [ExcludeFilter(self.catalogue)],
+            scorer=self.score,
+            candidates=self.pool,
+            name=self.name,
+            batch_scorer=self.score_many,
+        )
+
+    def profile(self, user_id):
+        """``(best-rated past rows, taste vector)``: the rating-weighted mean of the user's restaurants."""
+        orders = self.orders
+        positions = orders.best_rated_orders(user_id)
+        positions = positions[orders.item[positions] >= 0]
+        rows = orders.item[positions]
+        if len(rows) == 0:
+            return rows, None
+        weights = orders['rating'][positions].astype(np.float64)
+        vector = normalize(np.asarray(self.feature_matrix[rows].T @ weights).reshape(1, -1))
+        _, first = np.unique(rows, return_index=True)
+        return rows[np.sort(first)][:PROFILE_ORDERS], vector
+
+    def score(self, request, rows):
+        start = time.perf_counter()
+        if request["taste"] is not None:
+            content = np.asarray(self.feature_matrix[rows] @ request["taste"].T).ravel()
+        else:
+            content = np.zeros(len(rows))
+        svd = self.svd_model
+        if self.new_user(request["user_id"]):
+            predicted = self.popularity.rating[rows]
+        else:
+            predicted = svd.score_positions(svd.user_index.lookup([request["user_id"]]), self.row_items[rows])[0]
+        keys = self.combine(request, content, predicted)
+        request["scoring"] = (time.perf_counter() - start, len(rows))
+        return keys
+
+    def score_many(self, requests, rows):
+        tasted = [i for i, request in enumerate(requests) if request["taste"] is not None]
+        content = [np.zeros(len(request_rows)) for request_rows in rows]
+        if tasted:
+            tastes = np.vstack([requests[i]["taste"] for i in tasted])
+            similarity = batch_similarity(self.feature_matrix, [rows[i] for i in tasted], tastes)
+            for i, values in zip(tasted, similarity):
+                content[i] = values
+        predicted = self.predict_many(requests, rows)
+        return [self.combine(*args) for args in zip(requests, content, predicted)]
+
+    def combine(self, request, content, predicted):
+        weight = request["content_weight"]
+        fused = fuse([content, predicted], [weight, 1 - weight], request["method"], self.rrf_k)
+        # Ties go to the more similar restaurant, then the better predicted one
+        return [(fused, True), (content, True), (predicted, True)]
+
+    def tabled(self, request, user_id, top_n):
+        """The user table's answer to a user-only ``request``, or None."""
+        if any(key not in TABLE_KEYS and value not in (None, "") for key, value in request.items()):
+            return None
+        user = self.svd_model.user_index.get(user_id)
+        precomputed = self.table.lookup(user, top_n) if user >= 0 else None
+        count(self.name, "table_hits" if precomputed is not None else "table_misses")
+        if precomputed is None:
+            return None
+        rows, fused = precomputed
+        content, predicted = (self.table.detail(key, user, len(rows)) for key in ("content", "predicted"))
+        return self.cursor(rows, fused, content, predicted)
+
+    def prepare(self, request):
+        """Validate ``request``; returns the pipeline query and ``top_n``, or the finished results."""
+        start = time.perf_counter()
+        user_id = require(request, "user_id", "Please enter a User ID.")
+        top_n = parse_top_n(request)
+        pool = parse_pool(request.get("pool", self.pool))
+        method = request.get("method") or self.method
+        if method not in METHODS:
+            raise ValueError(f"Unknown fusion method '{method}'. Use one of: {', '.join(METHODS)}")
+        weight = parse_weight(request.get("content_weight", self.content_weight))
+        budget_ms = request.get("latency_budget_ms", self.latency_budget_ms)
+        if budget_ms is not None:
+            if isinstance(budget_ms, bool) or not isinstance(budget_ms, (int, float)) or budget_ms <= 0:
+                raise ValueError("latency_budget_ms must be a positive number.")
+            pool = self.cost.pool_for(budget_ms / 1000, min(top_n, pool), pool)
+
+        rest_id = request.get("rest_id")
+        rest_id = rest_id.strip() if isinstance(rest_id, str) else rest_id
+        if not rest_id and self.table is not None:
+            tabled = self.tabled(request, user_id, top_n)
+            if tabled is not None:
+                return tabled
+        if rest_id:
+            seed = self.catalogue.row(rest_id)
+            if seed < 0:
+                raise ValueError(f"Restaurant ID {rest_id} not found.")
+            seeds, taste = None, self.feature_matrix[seed].toarray()
+        else:
+            # User-only: the user's best-rated restaurants seed the content candidates
+            seed = None
+            seeds, taste = self.profile(user_id)
+            if taste is None and user_id not in self.svd_model.user_index:
+                if self.popularity is None:
+                    raise ValueError(f"User ID {user_id} not found.")
+                count(self.name, "cold_starts")
+                return self.popularity.results(request, {
+                    'price': 'AverageCost',
+                    'cuisines': lambda i, row: self.cuisines[row],
+                    'content_similarity': lambda i, row: None,
+                    'predicted_rating': self.popularity.rating_detail(),
+                }, self.orders, user_id)
+        query = {
+            **request,
+            **self.filter_keys(request, user_id),
+            "user_id": user_id,
+            "seed": seed,
+            "seeds": seeds,
+            "exclude": [seed] if seed is not None else None,
+            "taste": taste,
+            "method": method,
+            "content_weight": weight,
+            "candidates": pool,
+            "started": start,
+        }
+        return query, top_n
+
+    def finish(self, query, rows, keys):
+        return self.cursor(rows, *keys)
+
+    def cursor(self, rows, fused, content, predicted):
+        return ResultCursor(rows, fused, self.catalogue, {
+            'price': 'AverageCost',
+            'cuisines': lambda i, row: self.cuisines[row],
+            'content_similarity': lambda i, row: float(content[i]),
+            'predicted_rating': lambda i, row: float(predicted[i]),
+        })
+
+    def results(self, request):
+        prepared = self.prepare(request)
+        if not isinstance(prepared, tuple):
+            return prepared
+        query, top_n = prepared
+        rows, keys = self.pipeline.run(query, top_n)
+        self.cost.observe(time.perf_counter() - query["started"], *query.get("scoring", (0.0, 0)))
+        return self.finish(query, rows, keys)
+
+    def results_many(self, requests):
+        return run_batch(self.pipeline, requests, self.prepare, self.finish)
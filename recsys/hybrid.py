@@ -0,0 +1,319 @@
+"""Content neighbours and Surprise SVD factors used by 4_RecomSystem_Hybrid.py.
+
+Requests run through a :class:`recsys.pipeline.Pipeline`: optional budget,
+vegetarian, service-mode and rating filters are applied first, the shortlist
+is the seed restaurant's nearest content neighbours that pass them (topped
+up with popular restaurants if too few do), and only the shortlist is
+scored with SVD. A batch of requests (``results_many``) is scored in one
+gathered dot product over every (user, candidate) pair.
+"""
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from . import artifacts
+from .areas import load_area_index, request_areas
+from .catalogue import IdIndex, OrderTable, catalogue_for
+from .content import MODES
+from .data import ORDERS_PATH, RESTAURANTS_PATH, load_orders, load_restaurants
+from .engine import Engine, parse_budget, parse_top_n, require
+from .knowledge import SERVICE_MODES, parse_veg_only
+from .metrics import count
+from .neighbours import build_neighbour_index
+from .pipeline import (
+    AreaFilter, BudgetFilter, CollaborativeCandidates, FlagFilter, NeighbourCandidates, Pipeline, PopularCandidates,
+    RatedFilter, run_batch
+)
+from .popularity import load_popularity_index
+from .precision import load_at_precision, rows_of
+from .results import ResultCursor
+
+MODEL_VERSION = 2
+NEIGHBOURS_PER_RESTAURANT = 50
+RATING_SCALE = (1, 5)
+
+
+def combined_features(restaurant_data):
+    return restaurant_data['Cuisines'].fillna('Unknown') + " " + restaurant_data['KnownFor'].fillna('Unknown')
+
+
+def build_content_model(restaurant_data, k=NEIGHBOURS_PER_RESTAURANT):
+    vectorizer = TfidfVectorizer(stop_words='english')
+    feature_matrix = vectorizer.fit_transform(combined_features(restaurant_data))
+    neighbour_ids, neighbour_scores = build_neighbour_index(feature_matrix, k=k)
+    return {
+        "arrays": {
+            "rest_ids": restaurant_data['rest_id'].to_numpy(dtype=str),
+            "neighbour_ids": neighbour_ids,
+            "neighbour_scores": neighbour_scores,
+            "idf": vectorizer.idf_,
+        },
+        "matrices": {"feature_matrix": feature_matrix},
+        "meta": {"vocabulary": {term: int(i) for term, i in vectorizer.vocabulary_.items()}},
+    }
+
+
+def build_svd_model(user_data):
+    # Surprise is only needed when (re)training, not when serving
+    from surprise import Dataset, Reader, SVD
+
+    # Train on every order; held-out evaluation lives in recsys.benchmark
+    reader = Reader(rating_scale=RATING_SCALE)
+    interaction_data = Dataset.load_from_df(user_data[['user_id', 'rest_id', 'rating']], reader)
+    trainset = interaction_data.build_full_trainset()
+
+    svd_model = SVD()
+    svd_model.fit(trainset)
+    return {
+        "arrays": {
+            "pu": svd_model.pu,
+            "qi": svd_model.qi,
+            "bu": svd_model.bu,
+            "bi": svd_model.bi,
+            "user_ids": np.array([trainset.to_raw_uid(u) for u in range(trainset.n_users)], dtype=str),
+            "item_ids": np.array([trainset.to_raw_iid(i) for i in range(trainset.n_items)], dtype=str),
+        },
+        "meta": {"global_mean": float(trainset.global_mean), "rating_scale": list(RATING_SCALE)},
+    }
+
+
+def load_content_model(restaurant_data=None, force=False, precision=None):
+    def build():
+        data = restaurant_data if restaurant_data is not None else load_restaurants()
+        return build_content_model(data)
+    return load_at_precision(
+        "hybrid_content", [artifacts.source(restaurant_data, RESTAURANTS_PATH)], build, MODEL_VERSION, force, precision,
+        quantised=("neighbour_scores",),
+    )
+
+
+def load_svd_artifacts(user_data=None, force=False, precision=None):
+    def build():
+        return build_svd_model(user_data if user_data is not None else load_orders())
+    return load_at_precision(
+        "hybrid_svd", [artifacts.source(user_data, ORDERS_PATH)], build, MODEL_VERSION, force, precision,
+        quantised=("qi",),
+    )
+
+
+def load_svd_model(user_data=None, force=False, precision=None):
+    return SVDModel(load_svd_artifacts(user_data, force, precision))
+
+
+class SVDModel:
+    """Serving-side view of trained Surprise SVD factors.
+
+    Scores follow ``surprise.SVD.predict``: the global mean, plus the user
+    and item biases when known, plus ``qi . pu`` when both are known, clipped
+    to the rating scale. Unknown ids therefore fall back exactly as Surprise does.
+    """
+
+    def __init__(self, model):
+        self.fingerprint = model.fingerprint
+        self.pu = model["pu"]
+        self.qi = rows_of(model, "qi")
+        self.bu = model["bu"]
+        self.bi = model["bi"]
+        self.global_mean = model["global_mean"]
+        self.rating_scale = tuple(model["rating_scale"])
+        self.item_ids = model["item_ids"]
+        self.user_index = IdIndex(model["user_ids"])
+        self.item_index = IdIndex(self.item_ids)
+
+    def score_many(self, user_ids, rest_ids=None):
+        """Predicted ratings as a ``len(user_ids) x len(rest_ids)`` array.
+
+        ``rest_ids`` defaults to every item seen in training. The dot products
+        for all pairs are one matrix multiplication.
+        """
+        items = np.arange(len(self.item_ids)) if rest_ids is None else self.item_index.lookup(rest_ids)
+        return self.score_positions(self.user_index.lookup(user_ids), items)
+
+    def score_positions(self, users, items):
+        """Like :meth:`score_many` for user and item positions, with -1 for ids the model does not know."""
+        known_users, known_items = users >= 0, items >= 0
+        user_bias = np.where(known_users, self.bu[users], 0.0)
+        item_bias = np.where(known_items, self.bi[items], 0.0)
+        dots = self.pu[users] @ self.qi[items].T
+        dots[~known_users, :] = 0.0
+        dots[:, ~known_items] = 0.0
+
+        low, high = self.rating_scale
+        return np.clip(self.global_mean + user_bias[:, None] + item_bias[None, :] + dots, low, high)
+
+    def score_pairs(self, users, items):
+        """Predicted rating of each ``(users[i], items[i])`` pair of positions (-1 for unknown ids)."""
+        known_users, known_items = users >= 0, items >= 0
+        both = known_users & known_items
+        dots = np.zeros(len(users))
+        dots[both] = np.einsum('ij,ij->i', self.pu[users[both]], self.qi[items[both]])
+        user_bias = np.where(known_users, self.bu[users], 0.0)
+        item_bias = np.where(known_items, self.bi[items], 0.0)
+
+        low, high = self.rating_scale
+        return np.clip(self.global_mean + user_bias + item_bias + dots, low, high)
+
+    def item_scores(self, user_id, items=None):
+        """``bi + qi . pu`` for ``items`` (default every item): the user's unclipped predicted ratings less a per-user constant."""
+        bi = np.asarray(self.bi) if items is None else self.bi[items]
+        user = self.user_index.get(user_id)
+        if user < 0:
+            return bi
+        return bi + (self.qi if items is None else self.qi[items]) @ self.pu[user]
+
+    def score(self, user_id, rest_ids):
+        """Predicted ratings of one user for each of ``rest_ids``."""
+        return self.score_many([user_id], rest_ids)[0]
+
+    def predict(self, user_id, rest_id):
+        return float(self.score(user_id, [rest_id])[0])
+
+
+class HybridEngine(Engine):
+    """Shortlist content neighbours of a seed restaurant, then rank them with SVD.
+
+    Request keys: ``user_id``, ``rest_id`` (the seed restaurant) and optional
+    ``top_n``, ``budget``, ``veg_only``, ``service_mode`` (one of
+    SERVICE_MODES), ``mode`` (keep restaurants rated for "Delivery" or
+    "Dinner") and ``location`` (keep restaurants in that area and its
+    neighbours; ``nearby=True`` uses the user's usual order location). The
+    shortlist holds ``candidates`` restaurants (default
+    ``top_n``). With a ``collaborative`` engine, restaurants rated by
+    similar users also enter the shortlist after the content neighbours.
+    SVD predicts the same for every user it was not trained on, so unless
+    ``cold_start=False`` their shortlist is ranked by Bayesian average
+    rating (:mod:`recsys.popularity`) instead.
+    """
+
+    name = "hybrid"
+    batched = True
+
+    def __init__(self, restaurant_data=None, user_data=None, candidates=None, collaborative=None, cold_start=True):
+        self.catalogue = catalogue_for(restaurant_data)
+        self.orders = OrderTable(user_data if user_data is not None else load_orders(), self.catalogue)
+        self.cuisines = self.catalogue.frame['Cuisines'].fillna('Unknown').to_numpy()
+
+        # Neighbour rows are catalogue rows: the model is fitted on the same frame
+        content_model = self.content_model = load_content_model(restaurant_data)
+        self.neighbour_ids = content_model["neighbour_ids"]
+        self.svd_model = load_svd_model(user_data)
+        self.item_rows = self.catalogue.rows(self.svd_model.item_ids)
+        # Catalogue row -> SVD item position (-1 for restaurants nobody ordered)
+        self.row_items = np.full(len(self.catalogue), -1, dtype=np.int64)
+        self.row_items[self.item_rows[self.item_rows >= 0]] = np.flatnonzero(self.item_rows >= 0)
+        self.areas = load_area_index(restaurant_data, user_data)
+        if cold_start:
+            self.popularity = load_popularity_index(restaurant_data, user_data)
+        self.version = (
+            self.catalogue.version, content_model.fingerprint, self.svd_model.fingerprint, self.areas.fingerprint
+        )
+
+        catalogue = self.catalogue
+        generators = [(NeighbourCandidates(self.neighbour_ids), NEIGHBOURS_PER_RESTAURANT)]
+        if collaborative is not None:
+            generators.append((CollaborativeCandidates(collaborative), None))
+        generators.append((PopularCandidates(lambda: self.orders), None))
+        self.filters = [
+            BudgetFilter(catalogue),
+            FlagFilter(catalogue, "veg_only", {True: 'isVegOnly'}),
+            FlagFilter(catalogue, "service_mode", SERVICE_MODES),
+            RatedFilter(catalogue, "mode", MODES),
+            AreaFilter(self.areas),
+        ]
+        self.pipeline = Pipeline(
+            generators,
+            filters=self.filters,
+            scorer=self.score,
+            candidates=candidates,
+            name=self.name,
+            batch_scorer=self.score_many,
+        )
+
+    def get_similar_restaurants(self, rest_id, top_n=10):
+        # top_n is capped at NEIGHBOURS_PER_RESTAURANT
+        row = self.catalogue.row(rest_id)
+        if row < 0:
+            raise ValueError(f"Restaurant ID {rest_id} not found.")
+        return self.catalogue['rest_id'][self.neighbour_ids[row, :top_n]].tolist()
+
+    def new_user(self, user_id):
+        """True if ``user_id`` is unknown to SVD and popularity should stand in for it."""
+        if self.popularity is None or user_id in self.svd_model.user_index:
+            return False
+        count(self.name, "cold_starts")
+        return True
+
+    def score(self, request, rows):
+        # Predicted ratings; ties keep the shortlist order
+        if self.new_user(request["user_id"]):
+            return [(self.popularity.rating[rows], True)]
+        return [(self.svd_model.score(request["user_id"], self.catalogue['rest_id'][rows]), True)]
+
+    def predict_many(self, requests, rows):
+        """Predicted ratings of each request's user for its ``rows``, from one gathered dot product.
+
+        New users get the Bayesian average rating instead, as in :meth:`score`.
+        """
+        svd = self.svd_model
+        users = svd.user_index.lookup([request["user_id"] for request in requests])
+        lengths = [len(request_rows) for request_rows in rows]
+        flat = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        predicted = svd.score_pairs(np.repeat(users, lengths), self.row_items[flat])
+        predicted = np.split(predicted, np.cumsum(lengths)[:-1])
+        for i, (request, request_rows) in enumerate(zip(requests, rows)):
+            if users[i] < 0 and self.new_user(request["user_id"]):
+                predicted[i] = self.popularity.rating[request_rows]
+        return predicted
+
+    def score_many(self, requests, rows):
+        return [[(predicted, True)] for predicted in self.predict_many(requests, rows)]
+
+    def filter_keys(self, request, user_id):
+        """Parsed ``budget``, ``veg_only`` and ``areas`` for the pipeline filters."""
+        budget = request.get("budget")
+        return {
+            "budget": parse_budget(budget) if budget not in (None, "") else None,
+            "veg_only": parse_veg_only(request.get("veg_only")),
+            "areas": request_areas(self.areas, request, self.orders, user_id),
+        }
+
+    def past_orders(self, user_id, offset=0, limit=None):
+        """Return ``(rest_id, cuisine)`` for past orders ``offset`` to ``offset + limit``; cuisine is None if unknown."""
+        orders = self.orders
+        positions = orders.user_orders(user_id)
+        positions = positions[offset:] if limit is None else positions[offset:offset + limit]
+        return [
+            (orders['rest_id'][i], self.cuisines[orders.item[i]] if orders.item[i] >= 0 else None)
+            for i in positions
+        ]
+
+    def prepare(self, request):
+        """Validate ``request``; returns the pipeline query and ``top_n``."""
+        user_id = require(request, "user_id", "Please enter both User ID and Restaurant ID")
+        rest_id = require(request, "rest_id", "Please enter both User ID and Restaurant ID")
+        top_n = parse_top_n(request)
+        seed = self.catalogue.row(rest_id)
+        if seed < 0:
+            raise ValueError(f"Restaurant ID {rest_id} not found.")
+        query = {
+            **request,
+            **self.filter_keys(request, user_id),
+            "user_id": user_id,
+            "seed": seed,
+            "seeds": None,
+            "candidates": None,
+        }
+        return query, top_n
+
+    def finish(self, query, rows, keys):
+        (scores,) = keys
+        return ResultCursor(
+            rows, scores, self.catalogue, {'price': 'AverageCost', 'cuisines': lambda i, row: self.cuisines[row]}
+        )
+
+    def results(self, request):
+        query, top_n = self.prepare(request)
+        return self.finish(query, *self.pipeline.run(query, top_n))
+
+    def results_many(self, requests):
+        return run_batch(self.pipeline, requests, self.prepare, self.finish)
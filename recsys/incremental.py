@@ -0,0 +1,415 @@
+"""Incremental model updates from a stream of new orders.
+
+New rows appended to ``UserOrdersData.csv`` are picked up by
+:class:`OrderStream` and applied by :class:`IncrementalUpdater`, which keeps
+the loaded engines current without a rebuild:
+
+* the sparse user x restaurant ratings and per-user aggregates
+  (:class:`InteractionState`)
+* the collaborative engine's ratings, norms and top-K neighbour table, touching
+  only the users who ordered and the users who share a restaurant with them
+* fold-in user factors for the matrix-factorisation engine
+  (``ratings @ item_factors``) and for the hybrid and fusion engines' Surprise SVD
+  (a ridge solve for ``bu``/``pu`` against the fixed item factors)
+* the popular and trending lists that new users are answered from
+  (:meth:`recsys.popularity.PopularityIndex.apply`)
+
+Items first seen in the stream have no latent factors until the next full
+retrain, which :class:`BackgroundRetrainer` runs periodically from the order
+log (the starting orders plus every streamed batch), replaying whatever
+arrives while it trains. Usage::
+
+    updater = IncrementalUpdater(collaborative=..., matrix=..., hybrid=..., fusion=...)
+    threading.Thread(target=updater.run, args=(OrderStream(),), daemon=True).start()
+"""
+
+import copy
+import io
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from . import artifacts
+from .catalogue import IdIndex
+from .data import ORDERS_PATH, load_orders, load_restaurants
+from .engine import load_engine
+from .neighbours import build_neighbour_index
+from .popularity import load_popularity_index
+
+ORDER_COLUMNS = ['user_id', 'rest_id', 'cost', 'rating', 'location']
+# Keyword each engine takes its training orders under; "usersorder_df" engines
+# are trained on the order details (see order_details)
+ORDER_DATA = {
+    "collaborative": "usersorder_df",
+    "matrix": "usersorder_df",
+    "hybrid": "user_data",
+    "fusion": "user_data",
+    "popular": "user_data",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def order_details(orders, restaurants):
+    """``orders`` with the Name/Cuisines columns that the XLSX order file carries."""
+    return orders.merge(restaurants[['rest_id', 'Name', 'Cuisines']], on='rest_id', how='left')
+
+
+class OrderStream:
+    """Yield the rows appended to an orders CSV since the last poll."""
+
+    def __init__(self, path=ORDERS_PATH, from_start=False):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.header = f.readline()
+            self.start = f.tell()
+        self.offset = self.start if from_start else os.path.getsize(path)
+
+    def poll(self):
+        if os.path.getsize(self.path) < self.offset:
+            # The file was truncated or replaced: start again after the header
+            self.offset = self.start
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read()
+
+        # Only consume complete lines; a partially written row waits for the next poll
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return pd.DataFrame(columns=ORDER_COLUMNS)
+        self.offset += end
+        return pd.read_csv(io.BytesIO(self.header + chunk[:end]))
+
+    def follow(self, interval=1.0, stop=None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            orders = self.poll()
+            if len(orders):
+                yield orders
+            else:
+                stop.wait(interval)
+
+
+class InteractionState:
+    """Growable sparse ratings with per-user aggregates.
+
+    Repeated orders of the same restaurant are averaged, matching the
+    ``groupby(...).mean()`` / ``pivot_table`` used by the batch builders.
+    """
+
+    def __init__(self):
+        self.users = IdIndex()
+        self.restaurants = IdIndex()
+        self.sums = sparse.csr_matrix((0, 0))
+        self.counts = sparse.csr_matrix((0, 0))
+        self.order_counts = np.zeros(0, dtype=np.int64)
+        self.rating_sums = np.zeros(0)
+
+    @classmethod
+    def from_orders(cls, orders):
+        state = cls()
+        # Sorted ids give the same positions as the batch builders
+        for user_id in sorted(orders['user_id'].unique()):
+            state.users.add(user_id)
+        for rest_id in sorted(orders['rest_id'].unique()):
+            state.restaurants.add(rest_id)
+        state.apply(orders)
+        return state
+
+    def apply(self, orders):
+        """Add ``orders`` and return the positions of the users they touched."""
+        users = np.array([self.users.add(u) for u in orders['user_id']], dtype=np.int64)
+        items = np.array([self.restaurants.add(r) for r in orders['rest_id']], dtype=np.int64)
+        shape = (len(self.users), len(self.restaurants))
+        ratings = orders['rating'].to_numpy(dtype=np.float64)
+
+        self.sums.resize(shape)
+        self.counts.resize(shape)
+        self.sums = (self.sums + sparse.csr_matrix((ratings, (users, items)), shape=shape)).tocsr()
+        self.counts = (self.counts + sparse.csr_matrix((np.ones(len(users)), (users, items)), shape=shape)).tocsr()
+
+        self.order_counts = np.pad(self.order_counts, (0, shape[0] - len(self.order_counts)))
+        self.rating_sums = np.pad(self.rating_sums, (0, shape[0] - len(self.rating_sums)))
+        np.add.at(self.order_counts, users, 1)
+        np.add.at(self.rating_sums, users, ratings)
+        return np.unique(users)
+
+    def ratings(self):
+        """Mean rating per (user, restaurant) as CSR."""
+        return self.sums.multiply(self.counts.power(-1)).tocsr()
+
+    def user_mean(self, user):
+        return self.rating_sums[user] / max(1, self.order_counts[user])
+
+
+def _merge_neighbour(ids, scores, user, score):
+    """Replace ``user``'s entry in one neighbour row, keeping the row's length and order."""
+    keep = ids != user
+    ids = np.append(ids[keep], user)
+    scores = np.append(scores[keep], score)
+    order = np.argsort(-scores, kind='stable')[:len(keep)]
+    return ids[order], scores[order]
+
+
+class IncrementalUpdater:
+    """Apply streamed orders to loaded engines in place.
+
+    ``orders`` is the order log the engines were built from (default:
+    UserOrdersData.csv, which holds the same orders as the XLSX file). Engines
+    can be any of the collaborative, matrix, hybrid and fusion engines, or
+    None (the fusion engine has its own SVD model and orders, so it is folded
+    in like the hybrid one); ``popularity`` is a :class:`recsys.popularity.PopularityIndex` or None.
+    """
+
+    def __init__(self, orders=None, restaurants=None, collaborative=None, matrix=None, hybrid=None, reg=0.02,
+                 popularity=None, fusion=None):
+        self.restaurants = restaurants if restaurants is not None else load_restaurants()
+        self.reg = reg
+        self.lock = threading.Lock()
+        self._start(orders if orders is not None else load_orders(), collaborative, matrix, hybrid, popularity, fusion)
+
+    def _start(self, orders, collaborative, matrix, hybrid, popularity, fusion):
+        self.state = InteractionState.from_orders(orders)
+        self.log = [orders]
+        self.collaborative, self.matrix, self.hybrid, self.fusion = collaborative, matrix, hybrid, fusion
+        self.popularity = popularity
+        if collaborative is not None:
+            self._sync_collaborative()
+
+    def orders(self):
+        """The order log: the starting orders followed by every batch applied since."""
+        with self.lock:
+            if len(self.log) > 1:
+                self.log = [pd.concat(self.log, ignore_index=True)]
+            return self.log[0]
+
+    def reset(self, orders, collaborative=None, matrix=None, hybrid=None, popularity=None, fusion=None):
+        """Move onto engines built from ``orders``, a snapshot taken with :meth:`orders`.
+
+        Batches applied after the snapshot are replayed into the new engines.
+        If that fails the updater keeps its current engines and state.
+        """
+        with self.lock:
+            pending = pd.concat(self.log, ignore_index=True).iloc[len(orders):]
+            updater = copy.copy(self)
+            updater._start(orders, collaborative, matrix, hybrid, popularity, fusion)
+            updater._apply(pending)
+            self.__dict__.update(updater.__dict__)
+
+    def with_details(self, orders):
+        return order_details(orders, self.restaurants)
+
+    def apply(self, orders):
+        """Ingest a batch of orders; returns the ids of the affected users."""
+        with self.lock:
+            return self._apply(orders)
+
+    def _apply(self, orders):
+        if len(orders) == 0:
+            return []
+        self.log.append(orders)
+        affected = self.state.apply(orders)
+        user_ids = [self.state.users[u] for u in affected]
+        if self.collaborative is not None:
+            self._update_collaborative(orders, affected)
+        if self.matrix is not None:
+            self._update_matrix(orders, user_ids)
+        for engine in (self.hybrid, self.fusion):
+            if engine is not None:
+                self._update_hybrid(engine, orders, user_ids)
+        if self.popularity is not None:
+            self.popularity.apply(orders)
+        # Cached results and precomputed user tables no longer match the models
+        for engine in (self.collaborative, self.matrix, self.hybrid, self.fusion):
+            if engine is not None:
+                engine.revision += 1
+                if getattr(engine, "table", None) is not None:
+                    engine.table = None
+        return user_ids
+
+    def run(self, stream, interval=1.0, stop=None):
+        for orders in stream.follow(interval, stop):
+            self.apply(orders)
+
+    def _sync_collaborative(self):
+        # Align the engine with the state, rebuilding the neighbour table if they differ
+        engine = self.collaborative
+        ratings = self.state.ratings().astype(np.float32)
+        same = (
+            engine.user_index.ids == self.state.users.ids
+            and engine.rest_ids.tolist() == self.state.restaurants.ids
+            and engine.interactions.nnz == ratings.nnz
+        )
+        if not same:
+            k = engine.neighbour_ids.shape[1]
+            engine.neighbour_ids, engine.neighbour_scores = build_neighbour_index(ratings, k=k)
+        self._publish_collaborative(ratings)
+
+    def _publish_collaborative(self, ratings, orders=None):
+        # Restaurant columns only ever grow, so the display lookups go first
+        engine = self.collaborative
+        engine.set_orders(orders if orders is not None else engine.orders, self.state.restaurants.to_array())
+        engine.interactions = ratings
+        engine.norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=1)).ravel())
+        engine.user_index = self.state.users.copy()
+
+    def _update_collaborative(self, orders, affected):
+        engine = self.collaborative
+        ratings = self.state.ratings().astype(np.float32)
+        norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=1)).ravel())
+
+        ids = np.array(engine.neighbour_ids)
+        scores = np.array(engine.neighbour_scores)
+        k = ids.shape[1]
+        new_rows = ratings.shape[0] - len(ids)
+        if new_rows:
+            ids = np.vstack([ids, np.full((new_rows, k), -1, dtype=ids.dtype)])
+            scores = np.vstack([scores, np.zeros((new_rows, k), dtype=scores.dtype)])
+
+        # Only similarities involving an affected user can have changed
+        for user in affected:
+            dots = (ratings @ ratings[user].T).toarray().ravel()
+            dots[user] = 0
+            similar = np.flatnonzero(dots)
+            similarities = np.zeros(len(dots), dtype=np.float32)
+            similarities[similar] = dots[similar] / (norms[similar] * norms[user])
+
+            top = np.argsort(-similarities, kind='stable')[:k]
+            ids[user], scores[user] = top, similarities[top]
+            for other in similar:
+                if similarities[other] > scores[other, -1] or user in ids[other]:
+                    ids[other], scores[other] = _merge_neighbour(ids[other], scores[other], user, similarities[other])
+
+        engine.neighbour_ids, engine.neighbour_scores = ids, scores
+        self._publish_collaborative(ratings, engine.orders.append(self.with_details(orders)))
+
+    def _update_matrix(self, orders, user_ids):
+        # TruncatedSVD fold-in: a user's factors are their rating row times the item factors
+        engine = self.matrix
+        columns = {rest_id: i for i, rest_id in enumerate(engine.rest_ids.tolist())}
+        ratings = self.state.ratings()
+        factors = np.array(engine.user_factors)
+        user_index = engine.user_index.copy()
+
+        new_factors = []
+        for user_id in user_ids:
+            row = ratings[self.state.users.get(user_id)]
+            vector = np.zeros(len(columns))
+            for item, rating in zip(row.indices, row.data):
+                column = columns.get(self.state.restaurants[item])
+                if column is not None:
+                    vector[column] = rating
+            factor = vector @ engine.item_factors
+            if user_id in user_index:
+                factors[user_index.get(user_id)] = factor
+            else:
+                user_index.add(user_id)
+                new_factors.append(factor)
+        if new_factors:
+            factors = np.vstack([factors, new_factors])
+
+        # Rebuild the already-rated mask over the model's columns and user rows
+        coo = ratings.tocoo()
+        rows = user_index.lookup(self.state.users.ids)[coo.row]
+        cols = np.array([columns.get(rest_id, -1) for rest_id in self.state.restaurants.ids], dtype=np.int64)[coo.col]
+        keep = (rows >= 0) & (cols >= 0)
+        rated = sparse.csr_matrix(
+            (np.ones(keep.sum(), dtype=np.int8), (rows[keep], cols[keep])), shape=(len(user_index), len(columns))
+        )
+
+        engine.rated, engine.user_factors, engine.user_index = rated, factors, user_index
+        engine.orders = engine.orders.append(self.with_details(orders))
+
+    def _update_hybrid(self, engine, orders, user_ids):
+        # Surprise SVD fold-in: with qi, bi and the global mean fixed, solve the
+        # regularised least squares for [bu, pu] over the user's ratings
+        svd = engine.svd_model
+        ratings = self.state.ratings()
+        pu, bu = np.array(svd.pu), np.array(svd.bu)
+        user_index = svd.user_index.copy()
+        n_factors = pu.shape[1]
+
+        new_pu, new_bu = [], []
+        for user_id in user_ids:
+            row = ratings[self.state.users.get(user_id)]
+            items = svd.item_index.lookup([self.state.restaurants[i] for i in row.indices])
+            known = items >= 0
+            design = np.zeros((len(items), n_factors + 1))
+            design[:, 0] = 1.0
+            design[known, 1:] = svd.qi[items[known]]
+            target = row.data - svd.global_mean - np.where(known, svd.bi[items], 0.0)
+
+            penalty = self.reg * len(items) * np.eye(n_factors + 1)
+            solution = np.linalg.solve(design.T @ design + penalty, design.T @ target)
+            if user_id in user_index:
+                bu[user_index.get(user_id)], pu[user_index.get(user_id)] = solution[0], solution[1:]
+            else:
+                user_index.add(user_id)
+                new_bu.append(solution[0])
+                new_pu.append(solution[1:])
+        if new_bu:
+            pu, bu = np.vstack([pu, new_pu]), np.concatenate([bu, new_bu])
+
+        svd.pu, svd.bu, svd.user_index = pu, bu, user_index
+        engine.orders = engine.orders.append(orders)
+
+
+class BackgroundRetrainer(threading.Thread):
+    """Periodically rebuild engines from the order log and swap them in.
+
+    ``engines`` is a name -> engine dict (for example the one the HTTP server
+    serves from); entries are replaced atomically once the new engines are
+    ready. If ``updater`` is given the engines are trained on its order log,
+    so streamed users and restaurants are kept, and the updater is reset onto
+    them before the swap. Otherwise they are trained on UserOrdersData.csv.
+    Models trained on the order log are kept in memory rather than saved as
+    artifacts, since the next retrain replaces them.
+    A failed retrain is logged and leaves the current engines serving.
+    """
+
+    def __init__(self, engines, interval=3600.0, updater=None):
+        super().__init__(daemon=True)
+        self.engines = engines
+        self.interval = interval
+        self.updater = updater
+        self.stopped = threading.Event()
+
+    def retrain(self):
+        if self.updater is not None:
+            orders, restaurants = self.updater.orders(), self.updater.restaurants
+        else:
+            orders, restaurants = load_orders(), load_restaurants()
+        data = {"usersorder_df": order_details(orders, restaurants), "user_data": orders}
+        fresh = {}
+        with artifacts.in_memory():
+            # One cold-start index for every engine, kept current by the updater
+            popularity = load_popularity_index(orders=orders)
+            for name in list(self.engines):
+                keyword = ORDER_DATA.get(name)
+                engine = fresh[name] = load_engine(name, **({keyword: data[keyword]} if keyword else {}))
+                if engine.popularity is not None:
+                    engine.popularity = popularity
+        if self.updater is not None:
+            self.updater.reset(
+                orders, fresh.get("collaborative"), fresh.get("matrix"), fresh.get("hybrid"), popularity,
+                fresh.get("fusion"),
+            )
+        self.engines.update(fresh)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            start = time.perf_counter()
+            try:
+                self.retrain()
+            except Exception:
+                logger.exception("retraining %s failed; still serving the previous engines", ", ".join(self.engines))
+                continue
+            logger.info("retrained %s in %.1fs", ", ".join(self.engines), time.perf_counter() - start)
+
+    def stop(self):
+        self.stopped.set()
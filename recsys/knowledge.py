@@ -0,0 +1,163 @@
+"""Knowledge-based filtering used by 1_RecomSystem_knowledge_based.py.
+
+Queries are answered from a prebuilt attribute index instead of scanning the
+catalogue. Every attribute maps to packed bitmaps with one bit per
+restaurant row:
+
+* the vegetarian flag and each service-mode flag
+* one cumulative "cost <= threshold" bitmap per distinct AverageCost value,
+  picked with a binary search over the sorted thresholds
+* a cuisine query, matched like the original
+  ``Cuisines.str.contains(cuisine, case=False)`` against each distinct
+  ``Cuisines`` value once and spread to the rows holding a matching value
+
+A query is then a handful of bitmap ANDs followed by taking the first set bits.
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from . import artifacts
+from .catalogue import catalogue_for
+from .data import RESTAURANTS_PATH, load_restaurants
+from .engine import Engine, parse_budget, parse_top_n, require
+from .metrics import stage
+from .results import ResultCursor
+
+MODEL_VERSION = 2
+SERVICE_MODES = {
+    "Delivery": "IsHomeDelivery",
+    "Takeaway": "isTakeaway",
+    "Indoor Seating": "isIndoorSeating",
+}
+
+
+def normalise_cuisine(text):
+    return " ".join(text.lower().split())
+
+
+def build_knowledge_index(data):
+    n_rows = len(data)
+
+    # Each row's position among the distinct Cuisines values (-1 when missing)
+    cuisine_codes, cuisine_values = pd.factorize(data['Cuisines'], sort=True)
+
+    flags = ['isVegOnly'] + list(SERVICE_MODES.values())
+    flag_bits = np.stack([data[column].to_numpy() == 1 for column in flags])
+
+    # Cumulative budget bitmaps, one per distinct cost
+    costs = data['AverageCost'].to_numpy()
+    cost_thresholds = np.unique(costs)
+    budget_bits = costs[None, :] <= cost_thresholds[:, None]
+
+    return {
+        "arrays": {
+            "cuisine_codes": cuisine_codes.astype(np.int32),
+            "cuisine_values": np.asarray(cuisine_values, dtype=str),
+            "flag_bitmaps": np.packbits(flag_bits, axis=1),
+            "cost_thresholds": cost_thresholds,
+            "budget_bitmaps": np.packbits(budget_bits, axis=1),
+        },
+        "meta": {"n_rows": n_rows, "flags": flags},
+    }
+
+
+def load_knowledge_index(data=None, force=False):
+    def build():
+        return build_knowledge_index(data if data is not None else load_restaurants())
+    return artifacts.build_or_load("knowledge", [artifacts.source(data, RESTAURANTS_PATH)], build, MODEL_VERSION, force)
+
+
+class AttributeIndex:
+    """Bitmap lookups over the artifacts written by :func:`build_knowledge_index`."""
+
+    def __init__(self, model):
+        self.n_rows = model["n_rows"]
+        self.cuisine_codes = model["cuisine_codes"]
+        self.cuisine_values = pd.Series(model["cuisine_values"], dtype=object)
+        self.flag_bitmaps = dict(zip(model["flags"], model["flag_bitmaps"]))
+        self.cost_thresholds = model["cost_thresholds"]
+        self.budget_bitmaps = model["budget_bitmaps"]
+        self.empty = np.zeros(self.budget_bitmaps.shape[1], dtype=np.uint8)
+        self.cuisine_bitmap = lru_cache(maxsize=1024)(self._cuisine_bitmap)
+
+    def _cuisine_bitmap(self, query):
+        # The original case-insensitive regular expression search on Cuisines:
+        # "indian" also matches "North Indian", and "indian, chinese" only
+        # matches values with that exact sequence
+        try:
+            matched = self.cuisine_values.str.contains(query, case=False).to_numpy(dtype=bool)
+        except re.error:
+            raise ValueError("Please enter a valid cuisine.")
+        # Missing Cuisines (code -1) pick the appended False
+        return np.packbits(np.append(matched, False)[self.cuisine_codes])
+
+    def budget_bitmap(self, budget):
+        position = np.searchsorted(self.cost_thresholds, budget, side='right') - 1
+        return self.empty if position < 0 else self.budget_bitmaps[position]
+
+    def flag_bitmap(self, flag, value=True):
+        bits = self.flag_bitmaps[flag]
+        return bits if value else ~bits
+
+    def rows(self, *bitmaps, limit=None):
+        """Row positions set in every bitmap, in catalogue order."""
+        result = np.bitwise_and.reduce(bitmaps)
+        rows = np.flatnonzero(np.unpackbits(result, count=self.n_rows))
+        return rows if limit is None else rows[:limit]
+
+
+def parse_veg_only(value):
+    if isinstance(value, bool):
+        return int(value)
+    return 1 if value == "Yes" else 0
+
+
+class KnowledgeEngine(Engine):
+    """Filter restaurants by budget, cuisine, vegetarian flag and service mode.
+
+    Request keys: ``budget``, ``cuisine``, ``veg_only`` (bool or "Yes"/"No"),
+    ``service_mode`` (one of SERVICE_MODES) and optional ``top_n``.
+    """
+
+    name = "knowledge"
+
+    def __init__(self, data=None):
+        self.catalogue = catalogue_for(data)
+        model = load_knowledge_index(data)
+        self.index = AttributeIndex(model)
+        self.version = (self.catalogue.version, model.fingerprint)
+
+    def cache_key(self, request):
+        request = dict(request)
+        request["cuisine"] = str(request.get("cuisine") or "").strip()
+        request["veg_only"] = parse_veg_only(request.get("veg_only"))
+        return super().cache_key(request)
+
+    def results(self, request):
+        budget = parse_budget(request.get("budget"))
+        cuisine = require(request, "cuisine", "Please enter a preferred cuisine.")
+        service_mode = request.get("service_mode")
+        if service_mode not in SERVICE_MODES:
+            raise ValueError("Please select a valid service mode.")
+        veg_only = parse_veg_only(request.get("veg_only"))
+        top_n = parse_top_n(request)
+
+        # Filter data based on user inputs
+        index = self.index
+        with stage(self.name, "filter") as timer:
+            rows = index.rows(
+                index.budget_bitmap(budget),
+                index.cuisine_bitmap(cuisine),
+                index.flag_bitmap('isVegOnly', veg_only == 1),
+                index.flag_bitmap(SERVICE_MODES[service_mode]),
+                limit=top_n,
+            )
+            timer.size(rows=index.n_rows, matches=len(rows))
+
+        details = {column: column for column in ['Cuisines', 'KnownFor', 'AverageCost']}
+        details['ServiceMode'] = lambda i, row: service_mode
+        return ResultCursor(rows, None, self.catalogue, details)
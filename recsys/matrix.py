@@ -0,0 +1,164 @@
+"""TruncatedSVD factorisation used by 3_RecomSystem_Matrix_Multiplication.py."""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+
+from . import artifacts
+from .batch import load_user_table
+from .catalogue import IdIndex, OrderTable, catalogue_for
+from .data import ORDER_DETAILS_PATH, RESTAURANTS_PATH, load_order_details, load_restaurants
+from .engine import Engine, parse_top_n, require
+from .metrics import count, stage
+from .mips import ExactMIPSIndex, IVFMIPSIndex
+from .popularity import load_popularity_index
+from .precision import load_at_precision, rows_of
+from .results import ResultCursor
+
+MODEL_VERSION = 4
+N_COMPONENTS = 20
+
+
+def build_matrix_model(usersorder_df, restaurants_df, n_components=N_COMPONENTS):
+    # Merge the two dataframes on 'rest_id'
+    merged_df = pd.merge(usersorder_df, restaurants_df, on='rest_id')
+    user_rest_matrix = merged_df.pivot_table(index='user_id', columns='rest_id', values='rating', fill_value=0)
+
+    # Apply Singular Value Decomposition (SVD) to decompose the matrix
+    svd = TruncatedSVD(n_components=n_components, random_state=42)
+    matrix_svd = svd.fit_transform(user_rest_matrix)
+
+    # Item factors are stored one row per restaurant (components_ transposed);
+    # rest_ids[column] names each of them and rated marks what each user already rated
+    return {
+        "arrays": {
+            "matrix_svd": matrix_svd,
+            "item_factors": np.ascontiguousarray(svd.components_.T),
+            "user_ids": user_rest_matrix.index.to_numpy(dtype=str),
+            "rest_ids": user_rest_matrix.columns.to_numpy(dtype=str),
+        },
+        "matrices": {"rated": sparse.csr_matrix(user_rest_matrix.to_numpy() > 0, dtype=np.int8)},
+    }
+
+
+def load_matrix_model(usersorder_df=None, restaurants_df=None, force=False, precision=None):
+    def build():
+        orders = usersorder_df if usersorder_df is not None else load_order_details()
+        restaurants = restaurants_df if restaurants_df is not None else load_restaurants()
+        return build_matrix_model(orders, restaurants)
+    sources = [artifacts.source(usersorder_df, ORDER_DETAILS_PATH), artifacts.source(restaurants_df, RESTAURANTS_PATH)]
+    return load_at_precision("matrix", sources, build, MODEL_VERSION, force, precision, quantised=("item_factors",))
+
+
+class MatrixEngine(Engine):
+    """Recommend unrated restaurants from the SVD-reconstructed user x restaurant ratings.
+
+    Request keys: ``user_id`` and optional ``top_n``. Users covered by a
+    table from ``python -m recsys.batch`` are answered from it unless
+    ``use_table=False``. Unknown users get popular restaurants
+    (:mod:`recsys.popularity`) unless ``cold_start=False``. A batch of
+    requests (``results_many``) is answered with one index search.
+    """
+
+    name = "matrix"
+    batched = True
+
+    def __init__(self, usersorder_df=None, restaurants_df=None, index="exact", use_table=True, cold_start=True,
+                 **index_options):
+        self.catalogue = catalogue_for(restaurants_df)
+        self.orders = OrderTable(usersorder_df if usersorder_df is not None else load_order_details(), self.catalogue)
+        model = load_matrix_model(usersorder_df, restaurants_df)
+        self.version = (self.catalogue.version, model.fingerprint)
+        self.model_fingerprint = model.fingerprint
+        self.table = load_user_table(self.name, model.fingerprint) if use_table else None
+
+        # Predicted ratings are user factors . item factors, so retrieval works
+        # on the factor matrices instead of the reconstructed ratings matrix
+        self.user_factors = model["matrix_svd"]
+        self.item_factors = rows_of(model, "item_factors")
+        self.rest_ids = model["rest_ids"]
+        self.rated = model["rated"]
+        # Factor column -> catalogue row, so results join to the catalogue by position
+        self.item_rows = self.catalogue.rows(self.rest_ids)
+        if index == "exact":
+            self.index = ExactMIPSIndex(self.item_factors, **index_options)
+        elif index == "ivf":
+            self.index = IVFMIPSIndex(self.item_factors, **index_options)
+        else:
+            raise ValueError(f"Unknown index type '{index}'. Use 'exact' or 'ivf'.")
+        self.user_index = IdIndex(model["user_ids"])
+        self.details = {'Cuisines': 'Cuisines', 'AverageCost': 'AverageCost'}
+        if cold_start:
+            self.popularity = load_popularity_index(restaurants_df, usersorder_df)
+
+    def previous_ratings(self, user_id):
+        return self.orders.frame.iloc[self.orders.best_rated_orders(user_id)]
+
+    def top_columns(self, user_id, top_n=5):
+        """Return ``(factor columns, scores)`` of the user's best unrated restaurants."""
+        if user_id not in self.user_index:
+            raise ValueError(f"User ID {user_id} not found.")
+        user = self.user_index.get(user_id)
+        if self.table is not None:
+            precomputed = self.table.lookup(user, top_n)
+            count(self.name, "table_hits" if precomputed is not None else "table_misses")
+            if precomputed is not None:
+                return precomputed
+        return self.search([user], top_n)[0]
+
+    def search(self, users, k):
+        """``(columns, scores)`` of the best ``k`` unrated restaurants of each of ``users``, from one search."""
+        with stage(self.name, "search") as timer:
+            rated = [self.rated[user].indices for user in users]
+            ids, scores = self.index.search(self.user_factors[users], k, exclude=rated)
+            timer.size(
+                items=self.item_factors.shape[0], factors=self.item_factors.shape[1],
+                excluded=sum(map(len, rated)), queries=len(users),
+            )
+        found = ids >= 0
+        return [(ids[q][found[q]], scores[q][found[q]]) for q in range(len(users))]
+
+    def recommend_ids(self, user_id, top_n=5):
+        """Return ``(rest_ids, scores)`` arrays, best first."""
+        columns, scores = self.top_columns(user_id, top_n)
+        return self.rest_ids[columns], scores
+
+    def cursor(self, columns, scores):
+        return ResultCursor(self.item_rows[columns], scores, self.catalogue, self.details)
+
+    def results(self, request):
+        user_id = require(request, "user_id", "Please enter a User ID.")
+        top_n = parse_top_n(request)
+        if user_id not in self.user_index and self.popularity is not None:
+            count(self.name, "cold_starts")
+            return self.popularity.results(request, self.details)
+        return self.cursor(*self.top_columns(user_id, top_n))
+
+    def results_many(self, requests):
+        # Table hits, new users and invalid requests are answered one by one;
+        # the others share one search for the largest top_n, which every
+        # smaller top_n is a prefix of
+        results, pending = [None] * len(requests), []
+        for i, request in enumerate(requests):
+            try:
+                user_id = require(request, "user_id", "Please enter a User ID.")
+                top_n = parse_top_n(request)
+                user = self.user_index.get(user_id)
+                precomputed = None
+                if user >= 0 and self.table is not None:
+                    precomputed = self.table.lookup(user, top_n)
+                    count(self.name, "table_hits" if precomputed is not None else "table_misses")
+                if user < 0:
+                    results[i] = self.results(request)
+                elif precomputed is not None:
+                    results[i] = self.cursor(*precomputed)
+                else:
+                    pending.append((i, user, top_n))
+            except ValueError as e:
+                results[i] = e
+        if pending:
+            found = self.search([user for _, user, _ in pending], max(top_n for _, _, top_n in pending))
+            for (i, _, top_n), (columns, scores) in zip(pending, found):
+                results[i] = self.cursor(columns[:top_n], scores[:top_n])
+        return results
@@ -0,0 +1,283 @@
+"""Stage timers, counters and a sampling profiler for the engines.
+
+Engines wrap each step of ``recommend`` in :func:`stage`::
+
+    with stage(self.name, "score") as timer:
+        scores = ...
+        timer.size(candidates=len(rows), features=matrix.shape[1])
+
+Each ``(engine, stage)`` pair records a call count, total and maximum
+seconds and a latency histogram. Sizes passed to ``timer.size`` (candidate
+counts, matrix dimensions) are recorded per stage as count, sum and maximum.
+:func:`count` increments plain event counters such as batch-table hits.
+Stage timings and sizes are also logged at DEBUG level on the
+``recsys.metrics`` logger.
+
+Everything goes to the process-wide :data:`METRICS` registry, which exports
+a JSON snapshot (:meth:`Metrics.snapshot`) or the Prometheus text format
+(:meth:`Metrics.to_prometheus`); the HTTP server serves both at
+``GET /metrics``. Other components, such as the result cache, can add their
+own statistics with :meth:`Metrics.add_collector`.
+
+:class:`SamplingProfiler` samples one thread's Python stack at a fixed
+interval. The server runs it for a single request with
+``POST /recommend/<engine>?profile=1``.
+"""
+
+import bisect
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Histogram upper bounds in seconds, as exported to Prometheus
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sizes = {}  # size name -> [count, sum, max]
+
+    def add(self, seconds, sizes):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        for name, value in sizes.items():
+            stats = self.sizes.setdefault(name, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = max(stats[2], value)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_seconds": self.total,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "sizes": {
+                name: {"count": n, "mean": total / n, "max": largest}
+                for name, (n, total, largest) in self.sizes.items()
+            },
+        }
+
+
+class StageTimer:
+    """Context manager returned by :meth:`Metrics.stage`."""
+
+    __slots__ = ("metrics", "engine", "name", "sizes", "start")
+
+    def __init__(self, metrics, engine, name):
+        self.metrics = metrics
+        self.engine = engine
+        self.name = name
+        self.sizes = {}
+
+    def size(self, **sizes):
+        """Record sizes (candidate counts, matrix dimensions) for this call."""
+        self.sizes.update(sizes)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.engine, self.name, time.perf_counter() - self.start, self.sizes)
+        return False
+
+
+class Metrics:
+    """Thread-safe registry of stage timings, counters and collectors."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.stages = {}  # (engine, stage) -> StageStats
+        self.counters = Counter()  # (engine, event) -> count
+        self.collectors = {}  # name -> callable returning {metric: number}
+
+    def stage(self, engine, name):
+        return StageTimer(self, engine, name)
+
+    def observe(self, engine, name, seconds, sizes=None):
+        if not self.enabled:
+            return
+        sizes = sizes or {}
+        with self.lock:
+            stats = self.stages.get((engine, name))
+            if stats is None:
+                stats = self.stages[(engine, name)] = StageStats()
+            stats.add(seconds, sizes)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s.%s %.3fms %s", engine, name, seconds * 1000, sizes)
+
+    def count(self, engine, event, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[(engine, event)] += n
+
+    def add_collector(self, name, collect):
+        """Export ``collect()`` (a dict of numbers) as ``recsys_<name>_<key>`` gauges."""
+        self.collectors[name] = collect
+
+    def remove_collector(self, name):
+        self.collectors.pop(name, None)
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.counters.clear()
+
+    def _collect(self):
+        return {name: collect() for name, collect in list(self.collectors.items())}
+
+    def snapshot(self):
+        """JSON-serialisable view of every stage, counter and collector."""
+        with self.lock:
+            stages, counters = {}, {}
+            for (engine, name), stats in sorted(self.stages.items()):
+                stages.setdefault(engine, {})[name] = stats.to_dict()
+            for (engine, event), value in sorted(self.counters.items()):
+                counters.setdefault(engine, {})[event] = value
+        return {"stages": stages, "counters": counters, **self._collect()}
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self.lock:
+            stages = sorted(self.stages.items())
+            counters = sorted(self.counters.items())
+            lines += ["# HELP recsys_stage_seconds Time spent in each engine stage.",
+                      "# TYPE recsys_stage_seconds histogram"]
+            for (engine, name), stats in stages:
+                labels = f'engine="{engine}",stage="{name}"'
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), stats.buckets):
+                    cumulative += n
+                    lines.append(f'recsys_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"recsys_stage_seconds_sum{{{labels}}} {stats.total}")
+                lines.append(f"recsys_stage_seconds_count{{{labels}}} {stats.count}")
+            lines += ["# HELP recsys_stage_seconds_max Slowest call of each engine stage.",
+                      "# TYPE recsys_stage_seconds_max gauge"]
+            for (engine, name), stats in stages:
+                lines.append(f'recsys_stage_seconds_max{{engine="{engine}",stage="{name}"}} {stats.max}')
+            lines += ["# HELP recsys_stage_size Candidate counts and matrix sizes seen by each stage.",
+                      "# TYPE recsys_stage_size summary"]
+            for (engine, name), stats in stages:
+                for size, (n, total, _) in sorted(stats.sizes.items()):
+                    labels = f'engine="{engine}",stage="{name}",size="{size}"'
+                    lines.append(f"recsys_stage_size_sum{{{labels}}} {total}")
+                    lines.append(f"recsys_stage_size_count{{{labels}}} {n}")
+            lines += ["# HELP recsys_events_total Engine events such as batch table hits.",
+                      "# TYPE recsys_events_total counter"]
+            for (engine, event), value in counters:
+                lines.append(f'recsys_events_total{{engine="{engine}",event="{event}"}} {value}')
+        for collector, values in sorted(self._collect().items()):
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE recsys_{collector}_{key} gauge")
+                    lines.append(f"recsys_{collector}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def stage(engine, name):
+    """Time a stage of ``engine`` in the default registry."""
+    return METRICS.stage(engine, name)
+
+
+def count(engine, event, n=1):
+    METRICS.count(engine, event, n)
+
+
+class SamplingProfiler:
+    """Sample the Python stack of one thread every ``interval`` seconds.
+
+    Usage::
+
+        with SamplingProfiler() as profiler:   # profiles the calling thread
+            engine.recommend(request)
+        profiler.top(10)
+
+    Sampling runs on a background thread, so the profiled code is not
+    traced; the cost is one stack walk per sample. The sampler needs the
+    GIL to take a sample, so while any profiler runs the interpreter's
+    switch interval is lowered to ``interval``.
+    """
+
+    _active = 0
+    _switch_interval = None
+    _switch_lock = threading.Lock()
+
+    def __init__(self, interval=0.0005, thread_id=None, max_depth=30):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        with SamplingProfiler._switch_lock:
+            if SamplingProfiler._active == 0:
+                SamplingProfiler._switch_interval = sys.getswitchinterval()
+            SamplingProfiler._active += 1
+            sys.setswitchinterval(min(sys.getswitchinterval(), self.interval))
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is None:
+            return self
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        with SamplingProfiler._switch_lock:
+            SamplingProfiler._active -= 1
+            if SamplingProfiler._active == 0:
+                sys.setswitchinterval(SamplingProfiler._switch_interval)
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            # A sample taken once stop() was called shows the profiler, not the workload
+            if stack and not self.stop_event.is_set():
+                self.samples[tuple(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Stacks in the collapsed "root;...;leaf count" format read by flame graph tools."""
+        return [f"{';'.join(stack)} {n}" for stack, n in self.samples.most_common()]
+
+    def top(self, n=20):
+        """The ``n`` innermost frames with the most samples, as ``(frame, samples, share)``."""
+        total = sum(self.samples.values())
+        leaves = Counter()
+        for stack, samples in self.samples.items():
+            leaves[stack[-1]] += samples
+        return [(frame, samples, samples / total) for frame, samples in leaves.most_common(n)]
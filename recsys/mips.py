@@ -0,0 +1,194 @@
+"""Maximum-inner-product search over latent factor matrices.
+
+Both indexes take the item factors (one row per item) and answer
+``search(queries, k)`` with the ``k`` items whose dot product with each query
+row is largest, so recommendations never need the dense users x items
+reconstruction.
+
+* :class:`ExactMIPSIndex` scans the items in fixed-size blocks and keeps a
+  running top-k, so memory is ``queries x block_size`` regardless of catalogue size.
+* :class:`IVFMIPSIndex` clusters the items with k-means and only scores the
+  ``n_probe`` clusters whose centroids have the largest inner product with
+  the query. ``n_probe`` trades recall for latency; :meth:`IVFMIPSIndex.tune`
+  picks it for a target recall@k.
+
+Run ``python -m recsys.mips`` for a recall-vs-latency report on the matrix
+factorisation model.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from .precision import QuantisedRows, rows_of
+from .ranking import top_k_rows
+
+
+def _pad(ids, scores, k):
+    if ids.shape[1] < k:
+        missing = k - ids.shape[1]
+        ids = np.pad(ids, ((0, 0), (0, missing)), constant_values=-1)
+        scores = np.pad(scores, ((0, 0), (0, missing)), constant_values=-np.inf)
+    return ids, scores
+
+
+def _mask_excluded(scores, offset, exclude):
+    # exclude[q] holds item positions that must not be returned for query q
+    if exclude is None:
+        return
+    width = scores.shape[1]
+    for q, items in enumerate(exclude):
+        if items is None or len(items) == 0:
+            continue
+        items = np.asarray(items) - offset
+        scores[q, items[(items >= 0) & (items < width)]] = -np.inf
+
+
+class ExactMIPSIndex:
+    """Brute-force inner-product search, blocked over the items."""
+
+    def __init__(self, item_vectors, block_size=4096):
+        # Quantised factors stay quantised; each block is dequantised when scanned
+        self.item_vectors = item_vectors if isinstance(item_vectors, QuantisedRows) else np.asarray(item_vectors)
+        self.block_size = block_size
+
+    def __len__(self):
+        return len(self.item_vectors)
+
+    def search(self, queries, k, exclude=None):
+        """Return ``(ids, scores)``, each ``len(queries) x k``; missing slots are -1 / -inf."""
+        queries = np.atleast_2d(queries)
+        n_queries = len(queries)
+        best_ids = np.empty((n_queries, 0), dtype=np.int64)
+        best_scores = np.empty((n_queries, 0), dtype=self.item_vectors.dtype)
+
+        for start in range(0, len(self.item_vectors), self.block_size):
+            block = self.item_vectors[start:start + self.block_size]
+            scores = queries @ block.T
+            _mask_excluded(scores, start, exclude)
+            ids = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            best_ids, best_scores = top_k_rows(
+                np.hstack([best_scores, scores]), np.hstack([best_ids, ids]), k
+            )
+
+        best_ids = np.where(np.isneginf(best_scores), -1, best_ids)
+        return _pad(best_ids, best_scores, k)
+
+
+class IVFMIPSIndex:
+    """Inverted-file (cluster-partitioned) approximate inner-product search."""
+
+    def __init__(self, item_vectors, n_lists=None, n_probe=None, n_iter=15, seed=0):
+        item_vectors = np.asarray(item_vectors)
+        n_items = len(item_vectors)
+        self.n_lists = n_lists or max(1, int(np.sqrt(n_items)))
+        self.n_probe = n_probe or max(1, self.n_lists // 8)
+
+        self.centroids, assignment = self._kmeans(item_vectors, self.n_lists, n_iter, seed)
+
+        # Store the items grouped by cluster so each list is a contiguous slice
+        self.order = np.argsort(assignment, kind="stable")
+        self.item_vectors = item_vectors[self.order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.n_lists))])
+
+    def __len__(self):
+        return len(self.item_vectors)
+
+    @staticmethod
+    def _kmeans(vectors, n_clusters, n_iter, seed):
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+        squared_norms = (vectors ** 2).sum(axis=1)
+        for _ in range(n_iter):
+            distances = squared_norms[:, None] - 2 * vectors @ centroids.T + (centroids ** 2).sum(axis=1)
+            assignment = distances.argmin(axis=1)
+            for c in range(n_clusters):
+                members = vectors[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+        return centroids, assignment
+
+    def search(self, queries, k, exclude=None, n_probe=None):
+        queries = np.atleast_2d(queries)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        lists = np.broadcast_to(np.arange(self.n_lists), (len(queries), self.n_lists))
+        probes = top_k_rows(queries @ self.centroids.T, lists, n_probe)[0]
+
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), -np.inf)
+        for q, query in enumerate(queries):
+            candidates = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probes[q]])
+            scores = (self.item_vectors[candidates] @ query)[None, :]
+            item_ids = self.order[candidates][None, :]
+            if exclude is not None and exclude[q] is not None and len(exclude[q]):
+                scores[0, np.isin(item_ids[0], exclude[q])] = -np.inf
+            ids, scores = top_k_rows(scores, item_ids, k)
+            ids = np.where(np.isneginf(scores), -1, ids)
+            all_ids[q, :ids.shape[1]] = ids[0]
+            all_scores[q, :ids.shape[1]] = scores[0]
+        return all_ids, all_scores
+
+    def tune(self, queries, k, target_recall=0.95):
+        """Set ``n_probe`` to the smallest value reaching ``target_recall`` on ``queries``."""
+        exact_ids = ExactMIPSIndex(self.item_vectors[np.argsort(self.order)]).search(queries, k)[0]
+        for n_probe in range(1, self.n_lists + 1):
+            if recall_at_k(self.search(queries, k, n_probe=n_probe)[0], exact_ids) >= target_recall:
+                break
+        self.n_probe = n_probe
+        return n_probe
+
+
+def recall_at_k(approx_ids, exact_ids):
+    hits = sum(len(np.intersect1d(a[a >= 0], e[e >= 0])) for a, e in zip(approx_ids, exact_ids))
+    return hits / max(1, int((exact_ids >= 0).sum()))
+
+
+def _latency(index, queries, k, **kwargs):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1e3
+
+
+def recall_latency_report(user_vectors, item_vectors, k=10, n_probes=None, n_queries=200, seed=0):
+    """Recall@k and per-query latency (ms) of the IVF index for several ``n_probe`` values."""
+    rng = np.random.default_rng(seed)
+    queries = user_vectors[rng.choice(len(user_vectors), min(n_queries, len(user_vectors)), replace=False)]
+    exact = ExactMIPSIndex(item_vectors)
+    exact_ids = exact.search(queries, k)[0]
+    timings = _latency(exact, queries, k)
+    rows = [{"index": "exact", "n_probe": None, "recall": 1.0,
+             "p50_ms": float(np.percentile(timings, 50)), "p95_ms": float(np.percentile(timings, 95))}]
+
+    ivf = IVFMIPSIndex(item_vectors, seed=seed)
+    for n_probe in n_probes or sorted({1, 2, 4, 8, 16, ivf.n_lists // 2, ivf.n_lists}):
+        if n_probe > ivf.n_lists:
+            continue
+        ids = ivf.search(queries, k, n_probe=n_probe)[0]
+        timings = _latency(ivf, queries, k, n_probe=n_probe)
+        rows.append({"index": "ivf", "n_probe": n_probe, "recall": recall_at_k(ids, exact_ids),
+                     "p50_ms": float(np.percentile(timings, 50)), "p95_ms": float(np.percentile(timings, 95))})
+    return rows
+
+
+def main(argv=None):
+    from .matrix import load_matrix_model
+
+    parser = argparse.ArgumentParser(description="Recall vs latency of the MIPS indexes on the matrix model.")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    model = load_matrix_model()
+    rows = recall_latency_report(model["matrix_svd"], rows_of(model, "item_factors"), k=args.k, n_queries=args.queries)
+    print(f"{'index':<6} {'n_probe':>7} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in rows:
+        n_probe = "-" if row["n_probe"] is None else row["n_probe"]
+        print(f"{row['index']:<6} {n_probe:>7} {row['recall']:>9.3f} {row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
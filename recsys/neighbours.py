@@ -0,0 +1,37 @@
+import numpy as np
+from sklearn.preprocessing import normalize
+
+
+def build_neighbour_index(feature_matrix, k=50, block_size=1024):
+    """Return the ``k`` most cosine-similar rows for every row of ``feature_matrix``.
+
+    Similarities are computed one block of rows at a time so only a
+    ``block_size`` x N slice is ever dense in memory. The result is a pair of
+    N x k arrays (neighbour row positions as int32, scores as float32), each
+    row sorted by descending score and never containing the row itself.
+    """
+    features = normalize(feature_matrix, norm="l2", copy=True).astype(np.float32)
+    n_rows = features.shape[0]
+    k = min(k, n_rows - 1)
+
+    neighbour_ids = np.empty((n_rows, k), dtype=np.int32)
+    neighbour_scores = np.empty((n_rows, k), dtype=np.float32)
+    features_t = features.T.tocsr()
+
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        block = features[start:stop] @ features_t
+        block = block.toarray() if hasattr(block, "toarray") else np.asarray(block)
+
+        # A restaurant is never its own neighbour
+        rows = np.arange(stop - start)
+        block[rows, rows + start] = -np.inf
+
+        # Partial selection of the top k, then sort only those k columns
+        top = np.argpartition(block, -k, axis=1)[:, -k:]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        neighbour_ids[start:stop] = np.take_along_axis(top, order, axis=1)
+        neighbour_scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+
+    return neighbour_ids, neighbour_scores
@@ -0,0 +1,374 @@
+"""Candidate generation, filtering and re-ranking as composable stages.
+
+A :class:`Pipeline` answers a request in three steps:
+
+1. Filters turn request keys into boolean masks over catalogue rows (budget,
+   vegetarian, service mode, rated in the selected mode, nearby areas). The masks are ANDed
+   once and pushed down into the generators, so filtered-out restaurants are
+   never generated or scored.
+2. Generators propose catalogue rows cheaply: every row, the restaurants
+   of the requested areas, content neighbours of seed restaurants, what
+   similar users rated, the best predicted ratings of a factor model, or the
+   most ordered restaurants. They run in order, each capped at its own
+   limit, until the pipeline's candidate budget is filled; rows already
+   proposed are skipped.
+3. A scorer computes sort keys for the candidates only, and the best
+   ``top_n`` are picked by partial selection on the first key
+   (:func:`recsys.ranking.top_k_lexicographic`). Ties keep the order the
+   candidates were generated in.
+
+Engines parse and validate the request first and pass the parsed values in
+the request given to the stages (e.g. ``budget`` as an int, ``seed`` as a
+catalogue row).
+
+:meth:`Pipeline.run_many` answers several requests at once. Filtering and
+generation stay per request, but a ``batch_scorer`` scores every request's
+candidates in one call, e.g. one sparse x dense product instead of a
+mat-vec per request (see :mod:`recsys.batching`).
+"""
+
+import numpy as np
+
+from .metrics import stage
+from .ranking import top_k, top_k_lexicographic
+
+
+class BudgetFilter:
+    """Keep restaurants whose AverageCost is within ``request['budget']``."""
+
+    def __init__(self, catalogue):
+        self.costs = catalogue['AverageCost']
+
+    def mask(self, request):
+        budget = request.get("budget")
+        return None if budget is None else self.costs <= budget
+
+
+class FlagFilter:
+    """Keep restaurants with the flag column that ``request[key]`` selects.
+
+    ``columns`` maps request values to flag columns, e.g. service modes to
+    ``IsHomeDelivery`` or ``{True: 'isVegOnly'}``. Missing or false values
+    do not filter.
+    """
+
+    def __init__(self, catalogue, key, columns):
+        self.key = key
+        self.columns = columns
+        self.flags = {column: catalogue[column] == 1 for column in columns.values()}
+
+    def mask(self, request):
+        value = request.get(self.key)
+        if not value:
+            return None
+        if value not in self.columns:
+            raise ValueError(f"Please select a valid {self.key.replace('_', ' ')}.")
+        return self.flags[self.columns[value]]
+
+
+class RatedFilter:
+    """Keep restaurants rated in the mode ``request[key]`` selects (``columns``: mode -> rating column)."""
+
+    def __init__(self, catalogue, key, columns):
+        self.key = key
+        self.columns = columns
+        self.rated = {mode: ~np.isnan(catalogue[column]) for mode, column in columns.items()}
+
+    def mask(self, request):
+        mode = request.get(self.key)
+        if mode is None:
+            return None
+        if mode not in self.rated:
+            raise ValueError("Please select a valid mode of service.")
+        return self.rated[mode]
+
+
+class AreaFilter:
+    """Keep restaurants in ``request['areas']`` (area shards) or within ``hops`` of them."""
+
+    def __init__(self, areas, hops=1):
+        self.areas = areas
+        self.hops = hops
+
+    def mask(self, request):
+        shards = request.get("areas")
+        return None if shards is None else self.areas.mask(self.areas.nearby(shards, self.hops))
+
+
+class ExcludeFilter:
+    """Drop the catalogue rows in ``request['exclude']`` (e.g. the seed restaurant)."""
+
+    def __init__(self, catalogue):
+        self.n_rows = len(catalogue)
+
+    def mask(self, request):
+        rows = request.get("exclude")
+        if rows is None or len(rows) == 0:
+            return None
+        mask = np.ones(self.n_rows, dtype=bool)
+        mask[rows] = False
+        return mask
+
+
+class AllRows:
+    """Every catalogue row that passes the filters, in catalogue order."""
+
+    def __init__(self, catalogue):
+        self.n_rows = len(catalogue)
+
+    def generate(self, request, mask, limit):
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(self.n_rows)
+        return rows[:limit]
+
+
+class GroupScoreCandidates:
+    """Rows of the groups with the highest ``request[key]`` (one score per group), in catalogue order.
+
+    ``group_of_row`` maps each catalogue row to its group, e.g. its area.
+    Groups are taken in descending score, a whole tie level at a time, until
+    ``request['top_n']`` rows pass the filters. Every row that could tie or
+    beat the ``top_n``-th row on the score is therefore generated, and a
+    ranking that sorts by that score first matches scanning every row.
+    """
+
+    def __init__(self, group_of_row, key):
+        self.key = key
+        self.order = np.argsort(group_of_row, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(group_of_row))])
+
+    def generate(self, request, mask, limit):
+        scores = request[self.key]
+        found, n_found = [], 0
+        for level in np.unique(scores)[::-1]:
+            groups = np.flatnonzero(scores == level)
+            rows = np.concatenate([self.order[self.offsets[group]:self.offsets[group + 1]] for group in groups])
+            if mask is not None:
+                rows = rows[mask[rows]]
+            found.append(rows)
+            n_found += len(rows)
+            if n_found >= request["top_n"]:
+                break
+        return np.sort(np.concatenate(found))[:limit]
+
+
+class NeighbourCandidates:
+    """Precomputed content neighbours of ``request['seed']`` (a catalogue row), nearest first.
+
+    With ``request['seeds']`` (several rows) instead, their neighbour lists
+    are merged by similarity; this needs ``neighbour_scores``.
+    """
+
+    def __init__(self, neighbour_ids, neighbour_scores=None):
+        self.neighbour_ids = neighbour_ids
+        self.neighbour_scores = neighbour_scores
+
+    def generate(self, request, mask, limit):
+        seeds = request.get("seeds")
+        if seeds is None:
+            rows = self.neighbour_ids[request["seed"]]
+        else:
+            rows = self.neighbour_ids[seeds].ravel()
+            rows = rows[np.argsort(-self.neighbour_scores[seeds].ravel(), kind='stable')]
+            # Keep each row's first (most similar) occurrence
+            _, first = np.unique(rows, return_index=True)
+            rows = rows[np.sort(first)]
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return rows[:limit]
+
+
+class CollaborativeCandidates:
+    """Restaurants that users similar to ``request['user_id']`` rated, best first.
+
+    ``engine`` is a :class:`recsys.collaborative.CollaborativeEngine` on the
+    same catalogue.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def generate(self, request, mask, limit):
+        from .collaborative import rank_unrated
+
+        engine = self.engine
+        user = engine.user_index.get(request.get("user_id"))
+        if user < 0:
+            return np.zeros(0, dtype=np.int64)
+        item_rows = engine.item_rows
+        allowed = item_rows >= 0
+        if mask is not None:
+            allowed &= mask[item_rows]
+        items, _ = rank_unrated(engine.interactions, user, *engine.similar_users(user), limit, allowed)
+        return item_rows[items]
+
+
+class FactorCandidates:
+    """Restaurants with the highest predicted rating for ``request['user_id']``.
+
+    ``svd`` is a :class:`recsys.hybrid.SVDModel` and ``item_rows`` maps its
+    items to catalogue rows. Unknown users get the items with the highest
+    bias, as Surprise would predict for them.
+    """
+
+    def __init__(self, svd, item_rows):
+        self.svd = svd
+        self.item_rows = item_rows
+
+    def generate(self, request, mask, limit):
+        allowed = self.item_rows >= 0
+        if mask is not None:
+            allowed &= mask[self.item_rows]
+        # Only the items that pass the filters (e.g. those in the requested areas) are scored
+        items = np.flatnonzero(allowed)
+        scores = self.svd.item_scores(request.get("user_id"), items)
+        return self.item_rows[items[top_k(scores, limit)]]
+
+
+class PopularCandidates:
+    """Most ordered restaurants first (ties in catalogue order).
+
+    ``orders`` is a callable returning the current
+    :class:`recsys.catalogue.OrderTable`; the ranking is recomputed when it
+    returns a new table.
+    """
+
+    def __init__(self, orders):
+        self.orders = orders
+        self.table = None
+
+    def generate(self, request, mask, limit):
+        orders = self.orders()
+        if orders is not self.table:
+            items = orders.item[orders.item >= 0]
+            counts = np.bincount(items, minlength=len(orders.catalogue))
+            self.ranked = np.lexsort((np.arange(len(counts)), -counts))
+            self.table = orders
+        rows = self.ranked
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return rows[:limit]
+
+
+class Pipeline:
+    """Filters -> generators -> scorer.
+
+    ``generators`` is a list of ``(generator, limit)`` pairs; a limit of
+    None means no limit of its own and a float is a share of the candidate
+    budget. ``candidates`` caps the total number of candidates scored;
+    ``request['candidates']`` overrides it and None uses the request's
+    ``top_n``. ``scorer(request,
+    rows)`` returns a list of ``(values, descending)`` sort keys, most
+    significant first; missing values must already be ``ranking.MISSING``.
+    ``batch_scorer(requests, rows)`` optionally does the same for lists of
+    requests and their candidates, returning one list of keys per request.
+    Each step is timed as a stage of the engine called ``name``.
+    """
+
+    def __init__(self, generators, filters=(), scorer=None, candidates=None, name=None, batch_scorer=None):
+        self.generators = list(generators)
+        self.filters = list(filters)
+        self.scorer = scorer
+        self.batch_scorer = batch_scorer
+        self.candidates = candidates
+        self.name = name
+
+    def mask(self, request):
+        """AND of the filters that apply to ``request``, or None if none do."""
+        result = None
+        for row_filter in self.filters:
+            mask = row_filter.mask(request)
+            if mask is not None:
+                result = mask if result is None else result & mask
+        return result
+
+    def generate(self, request, top_n):
+        """Candidate catalogue rows, in generation order."""
+        with stage(self.name, "filter") as timer:
+            mask = self.mask(request)
+            if mask is not None:
+                timer.size(passed=int(mask.sum()))
+        with stage(self.name, "generate") as timer:
+            rows = self._generate(request, mask, top_n)
+            timer.size(candidates=len(rows))
+        return rows
+
+    def _generate(self, request, mask, top_n):
+        budget = request.get("candidates") or self.candidates or top_n
+        rows = np.zeros(0, dtype=np.int64)
+        for generator, limit in self.generators:
+            remaining = budget - len(rows)
+            if remaining <= 0:
+                break
+            if isinstance(limit, float):
+                limit = max(1, int(budget * limit))
+            # Ask for the whole budget so it is filled even if some rows repeat earlier ones
+            new = np.asarray(generator.generate(request, mask, budget if limit is None else min(limit, budget)))
+            if len(rows):
+                new = new[~np.isin(new, rows)]
+            new = new[:remaining]
+            rows = np.concatenate([rows, new.astype(np.int64)])
+        return rows
+
+    def run(self, request, top_n):
+        """Return ``(rows, keys)``: the best ``top_n`` candidate rows and their sort keys."""
+        rows = self.generate(request, top_n)
+        if self.scorer is None:
+            return rows[:top_n], []
+        with stage(self.name, "score") as timer:
+            keys = self.scorer(request, rows)
+            timer.size(candidates=len(rows), keys=len(keys))
+        return self.rank(rows, keys, top_n)
+
+    def rank(self, rows, keys, top_n):
+        with stage(self.name, "rank"):
+            order = top_k_lexicographic([values if descending else -values for values, descending in keys], top_n)
+        return rows[order], [values[order] for values, _ in keys]
+
+    def run_many(self, requests, top_ns):
+        """:meth:`run` for each request, scoring them all in one ``batch_scorer`` call when there is one.
+
+        Returns ``(rows, keys)`` per request, or the ``ValueError`` it raised.
+        """
+        if self.batch_scorer is None:
+            return [self._try(self.run, request, top_n) for request, top_n in zip(requests, top_ns)]
+        results = [self._try(self.generate, request, top_n) for request, top_n in zip(requests, top_ns)]
+        live = [i for i, rows in enumerate(results) if not isinstance(rows, ValueError)]
+        if not live:
+            return results
+        with stage(self.name, "score") as timer:
+            keys = self.batch_scorer([requests[i] for i in live], [results[i] for i in live])
+            timer.size(candidates=sum(len(results[i]) for i in live), requests=len(live))
+        for i, request_keys in zip(live, keys):
+            results[i] = self.rank(results[i], request_keys, top_ns[i])
+        return results
+
+    @staticmethod
+    def _try(step, request, top_n):
+        try:
+            return step(request, top_n)
+        except ValueError as e:
+            return e
+
+
+def run_batch(pipeline, requests, prepare, finish):
+    """Answer ``requests`` through ``pipeline.run_many``; returns a result or ``ValueError`` per request.
+
+    ``prepare(request)`` validates a request and returns ``(query, top_n)``
+    for the pipeline, or a finished result that skips it (e.g. a cold-start
+    fallback); ``finish(query, rows, keys)`` builds the result of a query.
+    """
+    results, pending = [None] * len(requests), []
+    for i, request in enumerate(requests):
+        try:
+            prepared = prepare(request)
+        except ValueError as e:
+            results[i] = e
+            continue
+        if isinstance(prepared, tuple):
+            pending.append((i, *prepared))
+        else:
+            results[i] = prepared
+    ranked = pipeline.run_many([query for _, query, _ in pending], [top_n for _, _, top_n in pending])
+    for (i, query, _), answer in zip(pending, ranked):
+        results[i] = answer if isinstance(answer, ValueError) else finish(query, *answer)
+    return results
@@ -0,0 +1,344 @@
+"""Popular and trending restaurants, precomputed for users without history.
+
+Engines that rank by a user's past orders have nothing to go on for a new
+user. :class:`PopularityIndex` answers them from lists ranked once, from two
+signals:
+
+* ``popular``: a Bayesian average of the Dinner and Delivery ratings
+  (weighted by their review counts) and the ratings in the order log, shrunk
+  towards the catalogue mean by ``PRIOR_VOTES`` pseudo-votes, so a 5.0 from
+  three reviews does not outrank a 4.4 from three thousand
+* ``trending``: order counts with exponential decay. The order log has no
+  timestamps, so age is measured in orders: an order's weight halves with
+  every ``HALF_LIFE_ORDERS`` orders placed after it
+
+The catalogue is split into overlapping segments: every restaurant, each
+area (:mod:`recsys.areas`), each cuisine, budget bands (cost at most each of
+``BUDGET_BANDS``), each service mode and vegetarian-only. The best
+``LIST_SIZE`` restaurants of every segment are stored for both signals, so a
+request with one filter is a dict lookup and a slice. With several filters
+the smallest segment's list is filtered by the others; only if too few pass
+is the full catalogue ranked.
+
+:meth:`PopularityIndex.apply` folds newly streamed orders in
+(:class:`recsys.incremental.IncrementalUpdater`): it decays the trending
+counts, adds the ratings and re-ranks only the segments of the restaurants
+that were ordered. Each update is published as a new :class:`Snapshot`, so a
+request reads the lists and the keys they were ranked by from one state.
+"""
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+from scipy import sparse
+
+from . import artifacts
+from .areas import load_area_index, request_areas
+from .catalogue import IdIndex, OrderTable, catalogue_for
+from .data import ORDERS_PATH, RESTAURANTS_PATH, load_orders
+from .engine import Engine, parse_budget, parse_top_n
+from .knowledge import SERVICE_MODES, normalise_cuisine, parse_veg_only
+from .metrics import count
+from .ranking import top_k_lexicographic
+from .results import ResultCursor
+
+MODEL_VERSION = 1
+PRIOR_VOTES = 100
+HALF_LIFE_ORDERS = 1000
+LIST_SIZE = 100
+BUDGET_BANDS = (200, 400, 700, 1000)
+KINDS = ("popular", "trending")
+REVIEW_COLUMNS = [('Dinner Ratings', 'Dinner Reviews'), ('Delivery Ratings', 'Delivery Reviews')]
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+# One published state of the index; never modified once published
+Snapshot = namedtuple("Snapshot", ["rating_sums", "votes", "trend", "rating", "keys", "lists"])
+
+
+def decay_weights(n):
+    """Trending weight of each of ``n`` orders in log order (the newest weighs 1)."""
+    return 0.5 ** (np.arange(n)[::-1] / HALF_LIFE_ORDERS)
+
+
+def bayesian_average(rating_sums, votes, prior_mean):
+    return (PRIOR_VOTES * prior_mean + rating_sums) / (PRIOR_VOTES + votes)
+
+
+def ranking_keys(rating, votes, trend):
+    """Sort keys per kind: ties in rating go to more votes, ties in trend to the better rated."""
+    return {"popular": [rating, votes], "trending": [trend, rating]}
+
+
+def rank_rows(keys, rows, k):
+    """The best ``k`` of ``rows`` by ``keys``, ties in row order."""
+    return rows[top_k_lexicographic([key[rows] for key in keys], k)]
+
+
+def build_segments(catalogue, areas):
+    """``(keys, member rows)``: the catalogue segments that lists are kept for."""
+    n_rows = len(catalogue)
+    segments = {"all": np.arange(n_rows)}
+    for shard, key in enumerate(areas.keys.ids):
+        segments[f"area:{key}"] = np.sort(areas.shard_rows(shard))
+    by_cuisine = {}
+    for row, cuisines in enumerate(catalogue['Cuisines']):
+        for cuisine in str(cuisines).split(',') if isinstance(cuisines, str) else ():
+            cuisine = normalise_cuisine(cuisine)
+            if cuisine:
+                by_cuisine.setdefault(cuisine, []).append(row)
+    for cuisine in sorted(by_cuisine):
+        segments[f"cuisine:{cuisine}"] = np.array(by_cuisine[cuisine])
+    for band in BUDGET_BANDS:
+        segments[f"budget:{band}"] = np.flatnonzero(catalogue['AverageCost'] <= band)
+    for mode, column in SERVICE_MODES.items():
+        segments[f"service:{mode}"] = np.flatnonzero(catalogue[column] == 1)
+    segments["veg"] = np.flatnonzero(catalogue['isVegOnly'] == 1)
+    return list(segments), list(segments.values())
+
+
+def build_popularity_model(restaurants, orders, areas):
+    catalogue = catalogue_for(restaurants)
+    n_rows = len(catalogue)
+
+    # Review-weighted catalogue ratings plus one vote per rated order
+    rating_sums = np.zeros(n_rows)
+    votes = np.zeros(n_rows)
+    for rating_column, review_column in REVIEW_COLUMNS:
+        ratings = np.asarray(catalogue[rating_column], dtype=np.float64)
+        reviews = np.where(np.isnan(ratings), 0, catalogue[review_column]).astype(np.float64)
+        rating_sums += np.nan_to_num(ratings) * reviews
+        votes += reviews
+    rows = catalogue.rows(orders['rest_id'].to_numpy())
+    known = rows >= 0
+    np.add.at(rating_sums, rows[known], orders['rating'].to_numpy(dtype=np.float64)[known])
+    np.add.at(votes, rows[known], 1)
+    prior_mean = float(rating_sums.sum() / max(votes.sum(), 1))
+
+    trend = np.zeros(n_rows)
+    np.add.at(trend, rows[known], decay_weights(len(rows))[known])
+
+    keys, members = build_segments(catalogue, areas)
+    ranking = ranking_keys(bayesian_average(rating_sums, votes, prior_mean), votes, trend)
+    lists = {kind: [rank_rows(ranking[kind], rows, LIST_SIZE) for rows in members] for kind in KINDS}
+    sizes = np.array([len(rows) for rows in members], dtype=np.int64)
+    return {
+        "arrays": {
+            "rating_sums": rating_sums,
+            "votes": votes,
+            "trend": trend,
+            "members": np.concatenate(members).astype(np.int32),
+            "member_offsets": np.concatenate([[0], np.cumsum(sizes)]),
+            "list_offsets": np.concatenate([[0], np.cumsum(np.minimum(sizes, LIST_SIZE))]),
+            **{f"{kind}_lists": np.concatenate(lists[kind]).astype(np.int32) for kind in KINDS},
+        },
+        "meta": {"segments": keys, "prior_mean": prior_mean},
+    }
+
+
+def load_popularity_index(restaurants=None, orders=None, force=False):
+    """The popularity index; shared per model version when built from the data files."""
+    def build():
+        data = restaurants if restaurants is not None else catalogue_for().frame
+        order_data = orders if orders is not None else load_orders()
+        return build_popularity_model(data, order_data, load_area_index(restaurants, orders))
+    sources = [artifacts.source(restaurants, RESTAURANTS_PATH), artifacts.source(orders, ORDERS_PATH)]
+    model = artifacts.build_or_load("popularity", sources, build, MODEL_VERSION, force)
+    if restaurants is not None or orders is not None:
+        return PopularityIndex(model, catalogue_for(restaurants), load_area_index(restaurants, orders))
+    with _index_lock:
+        index = _indexes.get(model.fingerprint)
+        if index is None or force:
+            index = _indexes[model.fingerprint] = PopularityIndex(model, catalogue_for(), load_area_index())
+        return index
+
+
+class PopularityIndex:
+    """Per-segment popular and trending lists over one catalogue."""
+
+    def __init__(self, model, catalogue, areas):
+        self.fingerprint = model.fingerprint
+        self.revision = 0
+        self.catalogue = catalogue
+        self.areas = areas
+        self.lock = threading.Lock()
+        self.prior_mean = model["prior_mean"]
+        self.segments = IdIndex(model["segments"])
+        members, offsets = model["members"], model["member_offsets"]
+        self.members = [members[offsets[i]:offsets[i + 1]] for i in range(len(self.segments))]
+        self.sizes = np.diff(offsets)
+        # Restaurant row -> the segments it belongs to
+        membership = sparse.csr_matrix(
+            (np.ones(len(members), dtype=np.int8), members, offsets), shape=(len(self.segments), len(catalogue))
+        )
+        self.row_segments = membership.T.tocsr()
+        self.cuisines = [key[len("cuisine:"):] for key in self.segments.ids if key.startswith("cuisine:")]
+        self.costs = catalogue['AverageCost']
+
+        offsets = model["list_offsets"]
+        lists = {
+            kind: [model[f"{kind}_lists"][offsets[i]:offsets[i + 1]] for i in range(len(self.segments))]
+            for kind in KINDS
+        }
+        rating = bayesian_average(model["rating_sums"], model["votes"], self.prior_mean)
+        keys = ranking_keys(rating, model["votes"], model["trend"])
+        self.snapshot = Snapshot(model["rating_sums"], model["votes"], model["trend"], rating, keys, lists)
+
+    @property
+    def rating(self):
+        return self.snapshot.rating
+
+    @property
+    def trend(self):
+        return self.snapshot.trend
+
+    def apply(self, orders):
+        """Add newly placed ``orders`` (rest_id, rating), oldest first.
+
+        The prior mean that ratings are shrunk towards is kept as built
+        until the next rebuild.
+        """
+        if len(orders) == 0:
+            return
+        with self.lock:
+            snapshot = self.snapshot
+            rows = self.catalogue.rows(orders['rest_id'].to_numpy())
+            known = rows >= 0
+            trend = snapshot.trend * 0.5 ** (len(rows) / HALF_LIFE_ORDERS)
+            np.add.at(trend, rows[known], decay_weights(len(rows))[known])
+            rating_sums, votes = np.array(snapshot.rating_sums), np.array(snapshot.votes)
+            np.add.at(rating_sums, rows[known], orders['rating'].to_numpy(dtype=np.float64)[known])
+            np.add.at(votes, rows[known], 1)
+
+            # Decay scales every trend alike, so only segments of ordered restaurants reorder
+            rating = bayesian_average(rating_sums, votes, self.prior_mean)
+            keys = ranking_keys(rating, votes, trend)
+            lists = {kind: list(snapshot.lists[kind]) for kind in KINDS}
+            for segment in np.unique(self.row_segments[np.unique(rows[known])].indices):
+                for kind in KINDS:
+                    lists[kind][segment] = rank_rows(keys[kind], self.members[segment], LIST_SIZE)
+            # One assignment: readers see the old state or the new one, never a mix
+            self.snapshot = Snapshot(rating_sums, votes, trend, rating, keys, lists)
+            self.revision += 1
+
+    def segment_mask(self, segments):
+        mask = np.zeros(len(self.catalogue), dtype=bool)
+        for segment in segments:
+            mask[self.members[segment]] = True
+        return mask
+
+    def constraints(self, request, orders=None, user_id=None):
+        """Segment positions per filter in ``request``; a row must be in one segment of each."""
+        constraints = []
+        shards = request_areas(self.areas, request, orders, user_id)
+        if shards is not None:
+            keys = self.areas.keys
+            constraints.append([self.segments.get(f"area:{keys[shard]}") for shard in self.areas.nearby(shards)])
+        cuisine = request.get("cuisine")
+        for part in cuisine.split(',') if isinstance(cuisine, str) else ():
+            part = normalise_cuisine(part)
+            if part:
+                # Like the knowledge engine, "indian" also matches "north indian"
+                matches = [self.segments.get(f"cuisine:{name}") for name in self.cuisines if part in name]
+                if not matches:
+                    raise ValueError(f"Unknown cuisine '{part}'.")
+                constraints.append(matches)
+        if parse_veg_only(request.get("veg_only")):
+            constraints.append([self.segments.get("veg")])
+        service_mode = request.get("service_mode")
+        if service_mode:
+            if service_mode not in SERVICE_MODES:
+                raise ValueError("Please select a valid service mode.")
+            constraints.append([self.segments.get(f"service:{service_mode}")])
+        budget = request.get("budget")
+        budget = parse_budget(budget) if budget not in (None, "") else None
+        if budget is not None:
+            # The smallest band covering the budget; the exact cost is checked below
+            bands = [band for band in BUDGET_BANDS if band >= budget]
+            constraints.append([self.segments.get(f"budget:{bands[0]}")] if bands else [self.segments.get("all")])
+        return constraints, budget
+
+    def top(self, request, top_n, orders=None, user_id=None, snapshot=None):
+        """``(rows, scores)`` of the best ``top_n`` restaurants passing the request's filters.
+
+        ``snapshot`` defaults to the current one.
+        """
+        kind = request.get("kind") or "popular"
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind '{kind}'. Use one of: {', '.join(KINDS)}")
+        snapshot = snapshot if snapshot is not None else self.snapshot
+        keys, lists = snapshot.keys[kind], snapshot.lists[kind]
+        constraints, budget = self.constraints(request, orders, user_id)
+        if not constraints:
+            constraints = [[self.segments.get("all")]]
+
+        # Start from the smallest segment's list; it is exact for its first LIST_SIZE rows
+        driver = min(constraints, key=lambda segments: self.sizes[segments].sum())
+        complete = all(len(lists[segment]) == self.sizes[segment] for segment in driver)
+        if len(driver) == 1:
+            rows = lists[driver[0]]
+        else:
+            # The merged lists are exact for their best LIST_SIZE rows, or for all of them if each is complete
+            rows = np.unique(np.concatenate([lists[segment] for segment in driver]))
+            rows = rank_rows(keys, rows, len(rows) if complete else LIST_SIZE)
+        for segments in constraints:
+            if segments is not driver:
+                rows = rows[self.segment_mask(segments)[rows]]
+        if budget is not None:
+            rows = rows[self.costs[rows] <= budget]
+
+        if len(rows) >= top_n or complete:
+            count("popular", "list_hits")
+            rows = rows[:top_n]
+        else:
+            count("popular", "list_misses")
+            mask = self.costs <= budget if budget is not None else np.ones(len(self.catalogue), dtype=bool)
+            for segments in constraints:
+                mask &= self.segment_mask(segments)
+            rows = rank_rows(keys, np.flatnonzero(mask), top_n)
+        return rows, keys[0][rows]
+
+    def results(self, request, details=None, orders=None, user_id=None):
+        """A :class:`ResultCursor` over the catalogue; ``details`` defaults to price, cuisines, rating and orders."""
+        top_n = parse_top_n(request)
+        snapshot = self.snapshot
+        rows, scores = self.top(request, top_n, orders, user_id, snapshot)
+        if details is None:
+            trend = snapshot.trend
+            details = {
+                'price': 'AverageCost',
+                'cuisines': 'Cuisines',
+                'rating': self.rating_detail(snapshot),
+                'recent_orders': lambda i, row: round(float(trend[row]), 2),
+            }
+        return ResultCursor(rows, scores, self.catalogue, details)
+
+    def rating_detail(self, snapshot=None):
+        """Detail function ``(i, row)`` giving the row's Bayesian average rating."""
+        rating = (snapshot if snapshot is not None else self.snapshot).rating
+        return lambda i, row: round(float(rating[row]), 2)
+
+
+class PopularityEngine(Engine):
+    """Most popular or trending restaurants, for users with no order history.
+
+    Request keys: optional ``kind`` ("popular" or "trending"), ``top_n``,
+    ``location`` (that area and its neighbours; ``nearby=True`` with a
+    ``user_id`` uses the user's usual order location), ``cuisine``,
+    ``budget``, ``veg_only`` and ``service_mode`` (one of SERVICE_MODES).
+    """
+
+    name = "popular"
+
+    def __init__(self, restaurant_data=None, user_data=None):
+        self.catalogue = catalogue_for(restaurant_data)
+        self.orders = OrderTable(user_data if user_data is not None else load_orders(), self.catalogue)
+        self.popularity = load_popularity_index(restaurant_data, user_data)
+        self.version = (self.catalogue.version, self.popularity.fingerprint)
+
+    def results(self, request):
+        user_id = request.get("user_id")
+        user_id = user_id.strip() if isinstance(user_id, str) else user_id
+        return self.popularity.results(request, orders=self.orders, user_id=user_id)
@@ -0,0 +1,245 @@
+"""Compact storage of model artifacts: float32, float16 or int8.
+
+Trained models are stored in float64. Another precision is selected with
+``RECSYS_PRECISION`` (or ``--precision`` on ``python -m recsys.build`` and
+``python -m recsys.server``):
+
+* ``float32``: 2-D float arrays and sparse matrix values are stored as float32
+* ``float16`` / ``int8``: as float32, except that the item factors and
+  neighbour similarity scores are quantised per row. Each row is divided by
+  its largest absolute value (its scale) and stored as float16 or as integers
+  in [-127, 127], with the float32 scales alongside.
+
+1-D arrays (biases, IDF weights) stay float64; they grow with one dimension
+only. A compact model is converted from the float64 build of the same data,
+so every precision serves the same trained model, and it is stored and
+memory-mapped as its own artifact. Engines read the quantised arrays through
+:class:`QuantisedRows`, which dequantises only the rows a request touches.
+
+Run ``python -m recsys.precision`` for each model's size at every precision
+and how far its scores and rankings drift from float64.
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from . import artifacts
+
+PRECISIONS = ("float64", "float32", "float16", "int8")
+QUANTISED = ("float16", "int8")
+INT8_LEVELS = 127
+
+
+def parse_precision(value=None):
+    """``value``, or ``RECSYS_PRECISION``, or float64; raises ``ValueError`` if unknown."""
+    value = value or os.environ.get("RECSYS_PRECISION") or "float64"
+    if value not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{value}'. Use one of: {', '.join(PRECISIONS)}")
+    return value
+
+
+def quantise(array, precision):
+    """``(codes, scales)`` with ``codes[i] * scales[i]`` approximating row ``array[i]``.
+
+    Each value is rounded to within half a step of its row's largest absolute
+    value ``peak``: ``peak / 254`` at int8 and ``peak * 2 ** -12`` at float16
+    (codes in [-1, 1] keep 11 significant bits), plus the float32 rounding of
+    the scale.
+    """
+    array = np.asarray(array, dtype=np.float64)
+    peaks = np.abs(array).max(axis=1, initial=0.0)
+    scales = np.where(peaks > 0, peaks, 1.0)
+    if precision == "int8":
+        scales = scales / INT8_LEVELS
+        codes = np.rint(array / scales[:, None]).astype(np.int8)
+    elif precision == "float16":
+        codes = (array / scales[:, None]).astype(np.float16)
+    else:
+        raise ValueError(f"Cannot quantise to {precision}. Use one of: {', '.join(QUANTISED)}")
+    return codes, scales.astype(np.float32)
+
+
+class QuantisedRows:
+    """Read-only 2-D float32 array held as per-row scaled codes (see :func:`quantise`).
+
+    Indexing rows dequantises just those rows; ``rows @ x`` and ``x @ rows``
+    multiply the codes and apply the scales to the product.
+    """
+
+    ndim = 2
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        codes, scales = self.codes[rows], self.scales[rows]
+        if codes.ndim == 2:
+            scales = scales[:, None]
+        return codes.astype(np.float32) * scales
+
+    def __matmul__(self, other):
+        product = self.codes.astype(np.float32) @ other
+        return product * (self.scales if product.ndim == 1 else self.scales[:, None])
+
+    def __rmatmul__(self, other):
+        return (other * self.scales) @ self.codes.astype(np.float32)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[:]
+        return array if dtype is None else array.astype(dtype)
+
+
+def rows_of(model, key):
+    """``model[key]``, as :class:`QuantisedRows` if the model stores it quantised."""
+    if f"{key}.scale" in model:
+        return QuantisedRows(model[key], model[f"{key}.scale"])
+    return model[key]
+
+
+def compact_model(model, precision, quantised=()):
+    """Build output (see :func:`recsys.artifacts.build_or_load`) storing ``model`` at ``precision``.
+
+    ``quantised`` names the 2-D arrays to quantise at float16 or int8.
+    """
+    arrays = {}
+    for key, array in model.arrays.items():
+        if key in quantised and precision in QUANTISED:
+            arrays[key], arrays[f"{key}.scale"] = quantise(array, precision)
+        elif array.dtype.kind == "f" and array.ndim == 2:
+            arrays[key] = array.astype(np.float32)
+        else:
+            arrays[key] = array
+    matrices = {
+        key: matrix.astype(np.float32) if matrix.dtype.kind == "f" else matrix
+        for key, matrix in model.matrices.items()
+    }
+    return {"arrays": arrays, "matrices": matrices, "meta": {**model.meta, "precision": precision}}
+
+
+def load_at_precision(name, sources, build, version=0, force=False, precision=None, quantised=()):
+    """:func:`recsys.artifacts.build_or_load` at ``precision`` (see :func:`parse_precision`).
+
+    Below float64 the model is converted from the float64 artifacts, which
+    are built first if needed; a retrained float64 model is converted again.
+    """
+    precision = parse_precision(precision)
+    model = artifacts.build_or_load(name, sources, build, version, force)
+    if precision == "float64":
+        return model
+    return artifacts.build_or_load(
+        name, sources, lambda: compact_model(model, precision, quantised),
+        f"{version}:{precision}:{model.created}", force,
+    )
+
+
+def model_bytes(model):
+    """Bytes of the arrays and sparse matrices of ``model``."""
+    sizes = [array.nbytes for array in model.arrays.values()]
+    sizes += [m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for m in model.matrices.values()]
+    return sum(sizes)
+
+
+def max_error(baseline, model):
+    """Largest absolute difference between the float values of ``model`` and the float64 ``baseline``."""
+    errors = [0.0]
+    for key, array in baseline.arrays.items():
+        if array.dtype.kind == "f":
+            errors.append(np.abs(np.asarray(rows_of(model, key), dtype=np.float64) - array).max(initial=0.0))
+    for key, matrix in baseline.matrices.items():
+        if matrix.dtype.kind == "f":
+            errors.append(np.abs(model[key].data - matrix.data).max(initial=0.0))
+    return float(max(errors))
+
+
+def matrix_drift(baseline, model, users, k):
+    """Top-``k`` overlap of the matrix engine's exact search for ``users``."""
+    from .mips import ExactMIPSIndex, recall_at_k
+
+    results = []
+    for factors in (baseline, model):
+        rated = [factors["rated"][user].indices for user in users]
+        index = ExactMIPSIndex(rows_of(factors, "item_factors"))
+        results.append(index.search(factors["matrix_svd"][users], k, exclude=rated)[0])
+    return {"overlap": recall_at_k(results[1], results[0])}
+
+
+def svd_drift(baseline, model, users, k):
+    """Predicted-rating error and top-``k`` overlap of the hybrid SVD for ``users`` over every item."""
+    from .hybrid import SVDModel
+    from .mips import recall_at_k
+
+    scores, best = [], []
+    for factors in (SVDModel(baseline), SVDModel(model)):
+        scores.append(factors.score_positions(users, np.arange(len(factors.item_ids))))
+        # The ranking item_scores gives: bi + qi . pu for each user
+        ranked = factors.bi[:, None] + factors.qi @ factors.pu[users].T
+        best.append(np.argsort(-ranked.T, axis=1, kind="stable")[:, :k])
+    difference = scores[1] - scores[0]
+    return {"rating_rmse": float(np.sqrt((difference ** 2).mean())), "overlap": recall_at_k(best[1], best[0])}
+
+
+def drift_report(precisions=PRECISIONS[1:], k=10, n_users=200, seed=0):
+    """Size and accuracy drift from float64 of each model at each of ``precisions``."""
+    from . import collaborative, content, hybrid, matrix
+
+    loaders = {
+        "content": (content.load_content_model, None),
+        "preferences": (content.load_preference_model, None),
+        "hybrid_content": (hybrid.load_content_model, None),
+        "svd": (hybrid.load_svd_artifacts, svd_drift),
+        "matrix": (matrix.load_matrix_model, matrix_drift),
+        "collaborative": (collaborative.load_collaborative_model, None),
+    }
+    rng = np.random.default_rng(seed)
+    report = []
+    for name, (load, drift) in loaders.items():
+        baseline = load(precision="float64")
+        n_rows = len(baseline["user_ids"]) if "user_ids" in baseline else 0
+        users = np.sort(rng.choice(n_rows, min(n_users, n_rows), replace=False)) if n_rows else None
+        for precision in ("float64", *precisions):
+            model = load(precision=precision)
+            row = {"model": name, "precision": precision, "mb": model_bytes(model) / 2 ** 20,
+                   "max_error": max_error(baseline, model), "rating_rmse": None, "overlap": None}
+            if drift is not None:
+                row.update(drift(baseline, model, users, k))
+            report.append(row)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Model sizes and accuracy drift at reduced precision.")
+    parser.add_argument("--precisions", default=",".join(PRECISIONS[1:]), help="comma-separated precisions to compare")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--users", type=int, default=200, help="users sampled for the ranking comparisons")
+    args = parser.parse_args(argv)
+    try:
+        precisions = [parse_precision(value) for value in args.precisions.split(",")]
+    except ValueError as e:
+        parser.error(str(e))
+
+    overlap_at = f"overlap@{args.k}"
+    print(f"{'model':<15} {'precision':<9} {'MB':>8} {'max error':>10} {'rating RMSE':>11} {overlap_at:>10}")
+    for row in drift_report(precisions, args.k, args.users):
+        rmse = "-" if row["rating_rmse"] is None else f"{row['rating_rmse']:.2e}"
+        overlap = "-" if row["overlap"] is None else f"{row['overlap']:.3f}"
+        print(f"{row['model']:<15} {row['precision']:<9} {row['mb']:>8.2f} {row['max_error']:>10.2e} "
+              f"{rmse:>11} {overlap:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Deterministic top-k selection.
+
+Results are ordered by descending score, with ties going to the lower
+position (or id). Selection uses ``argpartition``, so it costs O(n) plus a
+sort of the ``k`` winners. Ties that straddle the k-th place are resolved
+exactly, so the top ``k`` is always a prefix of the top ``k + 1``. This is
+what lets a precomputed top-N list answer any smaller ``top_n``.
+
+Keys must not contain NaN; :func:`sort_key` maps missing values to
+``MISSING``, which ranks after every real value.
+"""
+
+import numpy as np
+
+MISSING = -np.inf
+
+
+def sort_key(values):
+    """``values`` as floats with NaN replaced by ``MISSING``."""
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(values), MISSING, values)
+
+
+def top_k(scores, k):
+    """Positions of the ``k`` highest ``scores``, best first."""
+    return top_k_lexicographic([scores], k)
+
+
+def top_k_lexicographic(keys, k):
+    """Positions of the ``k`` best rows by ``keys``, best first.
+
+    ``keys`` are equal-length arrays, most significant first, where higher
+    is better (negate a key to rank it ascending). Only the rows tied with
+    or above the k-th best primary key are sorted.
+    """
+    primary = keys[0]
+    n = len(primary)
+    if k <= 0:
+        return np.zeros(0, dtype=np.intp)
+    if n > k:
+        threshold = np.partition(primary, n - k)[n - k]
+        candidates = np.flatnonzero(primary >= threshold)
+    else:
+        candidates = np.arange(n)
+    # lexsort sorts by its last key first; the position breaks remaining ties
+    order = np.lexsort([candidates] + [-key[candidates] for key in reversed(keys)])
+    return candidates[order[:k]]
+
+
+def top_k_rows(scores, ids, k):
+    """Row-wise top ``k`` of ``scores``; returns ``(ids, scores)`` sorted best first, ties by lower id."""
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, part, axis=1)
+        best_ids = np.take_along_axis(ids, part, axis=1)
+
+        # Rows with more than k scores at or above their k-th best have a tie
+        # at the boundary; argpartition picked among those arbitrarily
+        threshold = best_scores.min(axis=1, keepdims=True)
+        for row in np.flatnonzero((scores >= threshold).sum(axis=1) > k):
+            candidates = np.flatnonzero(scores[row] >= threshold[row])
+            chosen = candidates[np.lexsort((ids[row, candidates], -scores[row, candidates]))[:k]]
+            best_ids[row], best_scores[row] = ids[row, chosen], scores[row, chosen]
+        scores, ids = best_scores, best_ids
+    order = np.lexsort((ids, -scores), axis=1)
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
@@ -0,0 +1,123 @@
+"""Lazy, paginated recommendation results.
+
+Engines rank first and format later. ``Engine.results(request)`` returns a
+:class:`ResultCursor` over the ranked catalogue rows; a
+:class:`recsys.engine.Recommendation` is only built when a caller reads
+that position, so a client showing the first page of a long list never
+pays for the rest. ``Engine.recommend`` is ``list(engine.results(request))``.
+
+Usage::
+
+    cursor = engine.results({"user_id": "U0350", "top_n": 100})
+    first = cursor.page(0, 10)                         # builds 10 records
+    names = cursor.project([]).page(10, 10)            # no details at all
+    for rec in cursor:                                 # or stream them
+        ...
+
+Pages of a request are slices of one ranking (its ``top_n``), so they never
+overlap or skip a result. Stateless clients such as the HTTP server pass a
+continuation token between pages: :func:`encode_token` binds an offset to
+the request and the model version, and :func:`decode_token` rejects a token
+used with another request or after the engine changed.
+"""
+
+import base64
+import hashlib
+import json
+
+from .engine import Recommendation
+
+
+class ResultCursor:
+    """Ranked results whose records are built on demand.
+
+    ``rows`` index the columns of ``source`` (a catalogue or order table)
+    and ``scores`` is aligned with ``rows`` (None for unscored engines).
+    ``details`` maps each detail key to a ``source`` column name or to a
+    function ``(i, row)`` of the result position and its row. ``fields``
+    projects the details onto the listed keys; ``rest_id``, ``name`` and
+    ``score`` are always included.
+    """
+
+    def __init__(self, rows, scores, source, details, fields=None, id_column='rest_id', name_column='Name'):
+        self.rows = rows
+        self.scores = scores
+        self.source = source
+        self.details = details
+        self.id_column = id_column
+        self.name_column = name_column
+        self.fields = None
+        self.wanted = details
+        if fields is not None:
+            unknown = [field for field in fields if field not in details]
+            if unknown:
+                raise ValueError(f"Unknown field(s): {', '.join(map(str, unknown))}. Choose from: {', '.join(details)}")
+            self.fields = list(fields)
+            self.wanted = {field: details[field] for field in self.fields}
+        self.built = [None] * len(rows)  # records built so far, shared by every reader
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        for i in range(len(self.rows)):
+            yield self.record(i)
+
+    def __getitem__(self, i):
+        return self.record(i)
+
+    def record(self, i):
+        """The ``i``-th result as a :class:`Recommendation`."""
+        built = self.built[i]
+        if built is None:
+            row = self.rows[i]
+            source = self.source
+            built = self.built[i] = Recommendation(
+                rest_id=str(source[self.id_column][row]),
+                name=source[self.name_column][row],
+                score=float(self.scores[i]) if self.scores is not None else None,
+                details={
+                    key: source[spec][row] if isinstance(spec, str) else spec(i, row)
+                    for key, spec in self.wanted.items()
+                },
+            )
+        return built
+
+    def page(self, offset=0, limit=None):
+        """Records ``offset`` to ``offset + limit`` (to the end when ``limit`` is None)."""
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit must not be negative.")
+        stop = len(self.rows) if limit is None else min(offset + limit, len(self.rows))
+        return [self.record(i) for i in range(offset, stop)]
+
+    def project(self, fields):
+        """The same results with details restricted to ``fields`` (None for all)."""
+        if fields is None or fields == self.fields:
+            return self
+        return ResultCursor(
+            self.rows, self.scores, self.source, self.details, fields, self.id_column, self.name_column
+        )
+
+
+def request_digest(engine, request):
+    """Digest of ``engine``'s normalised ``request`` and model version."""
+    key = repr((engine.name, engine.cache_key(request), engine.cache_version()))
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def encode_token(engine, request, offset):
+    """Continuation token for the page of ``request`` starting at ``offset``."""
+    payload = json.dumps({"offset": offset, "digest": request_digest(engine, request)}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_token(engine, request, token):
+    """The offset stored in ``token``; raises ``ValueError`` if it belongs to another request or model."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        offset, digest = int(payload["offset"]), payload["digest"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor.")
+    if offset < 0 or digest != request_digest(engine, request):
+        raise ValueError("The cursor does not match this request, or the model has changed.")
+    return offset
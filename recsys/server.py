@@ -0,0 +1,375 @@
+"""Local asyncio HTTP front end for the recommendation engines.
+
+Usage::
+
+    python -m recsys.server --engines knowledge,hybrid --port 8000
+
+Endpoints:
+
+* ``GET /health`` and ``GET /engines``
+* ``GET /cache``: result cache hit/miss/eviction counters
+* ``GET /metrics``: per-stage timings, candidate counts and cache statistics
+  in the Prometheus text format, or as JSON with ``?format=json``
+* ``POST /recommend/<engine>`` with the engine's request as a JSON object;
+  responds with ``{"engine": ..., "results": [...]}``. With ``?profile=1``
+  the request bypasses the cache and runs under a sampling profiler, whose
+  hottest frames and collapsed stacks are added to the response.
+  ``?limit=N`` returns one page of the ranking (the request's ``top_n``)
+  with its ``total`` and a ``next_cursor`` token; pass ``?cursor=<token>``
+  with the same request body for the next page (``?offset=N`` also works).
+  ``?fields=a,b`` keeps only those detail keys of each result (an empty
+  ``?fields=`` keeps none); a blank ``?limit=`` or ``?offset=`` is ignored.
+
+Engines are loaded once at startup and shared read-only by every request.
+Repeated requests are answered from a :class:`recsys.cache.ResultCache`.
+The event loop only parses HTTP; ``recommend`` runs on a thread pool so
+concurrent requests overlap wherever NumPy/SciPy release the GIL. With
+``--batch-window-ms W``, requests to the batched engines (matrix,
+preferences, similar, hybrid, fusion) arriving within W ms of each other
+are scored together, up to ``--max-batch`` at a time
+(:mod:`recsys.batching`). ``--precision`` serves float32 or quantised
+models (:mod:`recsys.precision`). With
+``--processes N`` a :class:`recsys.workers.WorkerPool` runs N such servers
+on one listening socket to use every core (see :mod:`recsys.workers`).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .batching import MicroBatcher
+from .cache import ResultCache
+from .engine import ENGINES, load_engine
+from .incremental import BackgroundRetrainer, IncrementalUpdater, OrderStream
+from .metrics import METRICS, SamplingProfiler
+from .popularity import load_popularity_index
+from .precision import PRECISIONS
+from .results import decode_token, encode_token
+from .workers import WorkerPool
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+MAX_BODY = 1 << 20
+
+
+def jsonable(value):
+    if isinstance(value, dict):
+        return {str(k): jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def parse_paging(engine, request, query):
+    """``(offset, limit, fields)`` from the ``offset``/``cursor``, ``limit`` and ``fields`` query parameters."""
+    def integer(name):
+        value = query.get(name, [""])[0]
+        if not value:
+            return None
+        if not value.isdigit():
+            raise ValueError(f"{name} must be a non-negative integer.")
+        return int(value)
+
+    offset = integer("offset") or 0
+    if "cursor" in query:
+        offset = decode_token(engine, request, query["cursor"][0])
+    fields = query.get("fields", [None])[0]
+    if fields is not None:
+        fields = [field for field in fields.split(",") if field]
+    return offset, integer("limit"), fields
+
+
+class RecommendationServer:
+    def __init__(self, engines, max_workers=None, cache=None, batch_window=0.0, max_batch=64):
+        self.engines = engines
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.cache = cache
+        self.batch_window = batch_window  # seconds; 0 answers every request on its own
+        self.max_batch = max_batch
+        self.batchers = {}  # engine name -> MicroBatcher
+        self.server = None
+        self.stopped = None
+        self.closing = False
+        self.connections = set()  # open stream writers
+        self.in_flight = 0  # requests read but not yet answered
+        if cache is not None:
+            METRICS.add_collector("cache", cache.stats)
+
+    def recommend(self, engine, request, profile=False, offset=0, limit=None, fields=None):
+        """Answer one request on a worker thread; returns ``(page, total, profiler or None)``.
+
+        Only the records on the requested page are built.
+        """
+        profiler = SamplingProfiler().start() if profile else None
+        try:
+            with METRICS.stage(engine.name, "request"):
+                if self.cache is not None and not profile:
+                    cursor = self.cache.results(engine, request)
+                else:
+                    cursor = engine.results(request)
+                with METRICS.stage(engine.name, "format"):
+                    page = cursor.project(fields).page(offset, limit)
+                return page, len(cursor), profiler
+        except ValueError:
+            METRICS.count(engine.name, "invalid_requests")
+            raise
+        finally:
+            if profiler is not None:
+                profiler.stop()
+
+    def recommend_many(self, name, items):
+        """Answer ``(request, offset, limit, fields)`` items with one ``results_many`` call of engine ``name``.
+
+        Returns ``(page, total, None)`` or the ``ValueError`` per item.
+        """
+        engine = self.engines[name]
+        requests = [request for request, _, _, _ in items]
+        if self.cache is not None:
+            cursors = self.cache.results_many(engine, requests)
+        else:
+            cursors = engine.results_many(requests)
+        answers = []
+        for cursor, (_, offset, limit, fields) in zip(cursors, items):
+            try:
+                if isinstance(cursor, ValueError):
+                    raise cursor
+                with METRICS.stage(engine.name, "format"):
+                    page = cursor.project(fields).page(offset, limit)
+                answers.append((page, len(cursor), None))
+            except ValueError as e:
+                METRICS.count(engine.name, "invalid_requests")
+                answers.append(e)
+        return answers
+
+    def batcher(self, name):
+        batcher = self.batchers.get(name)
+        if batcher is None:
+            batcher = self.batchers[name] = MicroBatcher(
+                lambda items: self.recommend_many(name, items), self.max_batch, self.batch_window, self.executor, name
+            )
+        return batcher
+
+    async def dispatch(self, method, path, body):
+        url = urlsplit(path)
+        path, query = url.path, parse_qs(url.query, keep_blank_values=True)
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/engines":
+            return 200, {"engines": sorted(self.engines)}
+        if path == "/cache":
+            return 200, self.cache.stats() if self.cache is not None else {"enabled": False}
+        if path == "/metrics":
+            if query.get("format") == ["json"]:
+                return 200, METRICS.snapshot()
+            return 200, METRICS.to_prometheus()
+        if not path.startswith("/recommend/"):
+            return 404, {"error": f"No route for {path}"}
+        if method != "POST":
+            return 405, {"error": "Use POST for recommendations"}
+
+        name = path[len("/recommend/"):]
+        engine = self.engines.get(name)
+        if engine is None:
+            return 404, {"error": f"Engine not loaded: {path[len('/recommend/'):]}"}
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError as e:
+            # JSONDecodeError, or UnicodeDecodeError for a body that is not UTF-8/16/32
+            return 400, {"error": f"Invalid JSON: {e}"}
+        if not isinstance(request, dict):
+            return 400, {"error": "Request body must be a JSON object"}
+
+        loop = asyncio.get_running_loop()
+        profile = query.get("profile", ["0"])[0] not in ("0", "false", "")
+        try:
+            offset, limit, fields = parse_paging(engine, request, query)
+            if self.batch_window > 0 and engine.batched and not profile:
+                page, total, profiler = await self.batcher(name).submit((request, offset, limit, fields))
+            else:
+                page, total, profiler = await loop.run_in_executor(
+                    self.executor, self.recommend, engine, request, profile, offset, limit, fields
+                )
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        response = {"engine": engine.name, "results": [r.to_dict() for r in page]}
+        if limit is not None:
+            following = offset + len(page)
+            response.update(
+                offset=offset,
+                total=total,
+                next_cursor=encode_token(engine, request, following) if following < total else None,
+            )
+        if profiler is not None:
+            response["profile"] = {
+                "samples": sum(profiler.samples.values()),
+                "interval": profiler.interval,
+                "top": profiler.top(),
+                "collapsed": profiler.collapsed(),
+            }
+        return 200, response
+
+    async def handle(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                self.in_flight += 1
+                try:
+                    keep_alive = await self.respond(reader, writer, request_line)
+                finally:
+                    self.in_flight -= 1
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def respond(self, reader, writer, request_line):
+        """Read the rest of one request, answer it and return whether to keep the connection open."""
+        method, path, version = request_line.decode("latin-1").split(maxsplit=2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY:
+            status, payload = 400, {"error": "Request body too large"}
+            body = b""
+        else:
+            body = await reader.readexactly(length) if length else b""
+            try:
+                status, payload = await self.dispatch(method, path, body)
+            except Exception as e:
+                status, payload = 500, {"error": str(e)}
+
+        keep_alive = (
+            version.strip() == "HTTP/1.1" and headers.get("connection", "").lower() != "close" and not self.closing
+        )
+        if isinstance(payload, str):
+            data, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            data, content_type = json.dumps(jsonable(payload)).encode(), "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+        return keep_alive
+
+    async def serve(self, host="127.0.0.1", port=8000, sock=None, ready=None):
+        """Serve until :meth:`shutdown`.
+
+        ``sock`` is an already listening socket to accept on instead of
+        binding ``host:port`` (worker processes share one); ``ready()`` is
+        called once connections are being accepted.
+        """
+        self.stopped = asyncio.Event()
+        if sock is not None:
+            self.server = await asyncio.start_server(self.handle, sock=sock)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready()
+        await self.stopped.wait()
+
+    async def shutdown(self, timeout=30.0):
+        """Stop accepting connections, let in-flight requests finish, then close every connection.
+
+        Requests still running after ``timeout`` seconds are cut off.
+        """
+        self.closing = True
+        self.server.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.in_flight and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        # Idle keep-alive connections are waiting for a request line; closing them ends their handlers
+        for writer in list(self.connections):
+            writer.close()
+        self.executor.shutdown(wait=False)
+        self.stopped.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve restaurant recommendations over HTTP.")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma-separated engines to load")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="recommendation threads")
+    parser.add_argument("--follow-orders", action="store_true",
+                        help="apply orders appended to UserOrdersData.csv while serving")
+    parser.add_argument("--retrain-interval", type=float, default=0,
+                        help="seconds between full background retrains (default: never)")
+    parser.add_argument("--cache-size", type=int, default=10000, help="cached results (0 disables the cache)")
+    parser.add_argument("--cache-ttl", type=float, default=300, help="seconds a cached result stays valid (0: no expiry)")
+    parser.add_argument("--batch-window-ms", type=float, default=0,
+                        help="collect concurrent requests to batched engines for this long (default: 0, no batching)")
+    parser.add_argument("--max-batch", type=int, default=64, help="largest batch of requests scored together")
+    parser.add_argument("--precision", choices=PRECISIONS,
+                        help="precision of the served models (default: RECSYS_PRECISION, else float64)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="server processes sharing the memory-mapped models (default: 1, in this process)")
+    parser.add_argument("--reload-check", type=float, default=2.0,
+                        help="with --processes: seconds between checks for newly published artifacts")
+    args = parser.parse_args(argv)
+    if args.batch_window_ms < 0 or args.max_batch <= 0:
+        parser.error("--batch-window-ms must not be negative and --max-batch must be positive")
+    if args.precision:
+        # Worker processes and background retrains read it from the environment too
+        os.environ["RECSYS_PRECISION"] = args.precision
+
+    if args.processes > 1:
+        if args.follow_orders:
+            parser.error("--follow-orders updates models in place and needs --processes 1")
+        WorkerPool(
+            args.engines.split(","), args.processes, args.host, args.port, args.workers, args.cache_size,
+            args.cache_ttl, args.retrain_interval, args.reload_check,
+            batch_window=args.batch_window_ms / 1000, max_batch=args.max_batch,
+        ).run()
+        return
+
+    engines = {}
+    for name in args.engines.split(","):
+        engines[name] = load_engine(name)
+        print(f"loaded {name}")
+
+    updater = None
+    if args.follow_orders:
+        updater = IncrementalUpdater(
+            collaborative=engines.get("collaborative"), matrix=engines.get("matrix"), hybrid=engines.get("hybrid"),
+            popularity=load_popularity_index(), fusion=engines.get("fusion"),
+        )
+        threading.Thread(target=updater.run, args=(OrderStream(),), daemon=True).start()
+    if args.retrain_interval > 0:
+        # The retrainer reports each retrain (and any failure) through logging
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        BackgroundRetrainer(engines, args.retrain_interval, updater).start()
+    print(f"serving on http://{args.host}:{args.port}")
+    cache = ResultCache(args.cache_size, args.cache_ttl) if args.cache_size > 0 else None
+    server = RecommendationServer(engines, args.workers, cache, args.batch_window_ms / 1000, args.max_batch)
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Synthetic inflation of the bundled data for load testing.
+
+Restaurants are replicated ``restaurant_scale`` times (replicas get new
+rest_ids and a jittered AverageCost). Users are replicated ``user_scale``
+times; each synthetic user repeats a real user's orders against random
+replicas of the same restaurants, with some ratings nudged by one star.
+The result keeps the shape of the real data (cuisine mix, orders per user,
+rating distribution) at 10-100x the size.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from .incremental import order_details
+
+
+def _ids(prefix, count):
+    width = max(4, len(str(count)))
+    return np.array([f"{prefix}{i + 1:0{width}d}" for i in range(count)])
+
+
+def scale_data(restaurants, orders, restaurant_scale=1, user_scale=1, seed=0):
+    """Return ``(restaurants, orders)`` inflated by the given integer factors."""
+    rng = np.random.default_rng(seed)
+    n_restaurants = len(restaurants)
+    row_of = {rest_id: row for row, rest_id in enumerate(restaurants['rest_id'])}
+
+    replicas = []
+    for replica in range(restaurant_scale):
+        copy = restaurants.copy()
+        if replica:
+            jitter = rng.uniform(0.8, 1.25, n_restaurants)
+            copy['AverageCost'] = (copy['AverageCost'] * jitter).round(-1).astype(int)
+        replicas.append(copy)
+    scaled_restaurants = pd.concat(replicas, ignore_index=True)
+    new_rest_ids = _ids("R", len(scaled_restaurants))
+    scaled_restaurants['rest_id'] = new_rest_ids
+
+    user_ids = sorted(orders['user_id'].unique())
+    user_of = {user_id: i for i, user_id in enumerate(user_ids)}
+    new_user_ids = _ids("U", len(user_ids) * user_scale)
+    base_users = orders['user_id'].map(user_of).to_numpy()
+    base_rows = orders['rest_id'].map(row_of).to_numpy()
+
+    copies = []
+    for replica in range(user_scale):
+        copy = orders.copy()
+        copy['user_id'] = new_user_ids[replica * len(user_ids) + base_users]
+        rows = base_rows + n_restaurants * rng.integers(0, restaurant_scale, len(copy))
+        copy['rest_id'] = new_rest_ids[rows]
+        if replica:
+            nudged = rng.random(len(copy)) < 0.3
+            copy.loc[nudged, 'rating'] = np.clip(
+                copy.loc[nudged, 'rating'] + rng.choice([-1, 1], nudged.sum()), 1, 5
+            )
+        copies.append(copy)
+    return scaled_restaurants, pd.concat(copies, ignore_index=True)
+
+
+def write_dataset(directory, restaurants, orders):
+    """Write the data files under ``directory``; returns the env vars that select them."""
+    os.makedirs(directory, exist_ok=True)
+    restaurants.to_csv(os.path.join(directory, "BangaloreZomatoData_with_rest_id.csv"), index=False)
+    orders.to_csv(os.path.join(directory, "UserOrdersData.csv"), index=False)
+    details_path = os.path.join(directory, "order_details.csv")
+    order_details(orders, restaurants).to_csv(details_path, index=False)
+    return {
+        "RECSYS_DATA_DIR": directory,
+        "RECSYS_ORDER_DETAILS": details_path,
+        "RECSYS_ARTIFACT_DIR": os.path.join(directory, "artifacts"),
+    }
@@ -0,0 +1,189 @@
+"""Multi-process serving over shared, memory-mapped models.
+
+Usage::
+
+    python -m recsys.server --processes 4 --engines knowledge,hybrid
+
+The parent process builds or loads every model artifact once, binds the
+listening socket and starts the workers with the ``spawn`` start method.
+Each worker loads its engines from the published artifacts, which are
+memory-mapped read-only (:mod:`recsys.artifacts`), so the large arrays (the
+TF-IDF matrices, SVD factors, neighbour and user-similarity tables) are held
+once in the page cache however many workers map them. All workers accept on
+the one socket, so the kernel spreads connections across them.
+
+Reloads are rolling: a new worker must report ready before an old one is
+sent SIGTERM, after which the old worker stops accepting, finishes its
+in-flight requests (:meth:`recsys.server.RecommendationServer.shutdown`) and
+exits. The pool reloads when
+
+* new artifacts are published, e.g. by ``python -m recsys.build`` or
+  ``python -m recsys.batch`` (it polls :func:`recsys.artifacts.generation`)
+* it receives SIGHUP, or every ``retrain_interval`` seconds; artifacts whose
+  source files changed are rebuilt first
+
+A worker that dies is replaced. Result caches and metrics stay per worker,
+so ``GET /cache`` and ``GET /metrics`` describe the worker that answered.
+"""
+
+import asyncio
+import multiprocessing
+import signal
+import socket
+import time
+
+from . import artifacts
+from .build import build_models
+
+READY_TIMEOUT = 600.0
+
+
+def _worker_main(sock, engine_names, options, conn):
+    # Ctrl+C reaches the whole process group; the parent decides how to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from .cache import ResultCache
+    from .engine import load_engine
+    from .server import RecommendationServer
+
+    try:
+        engines = {name: load_engine(name) for name in engine_names}
+    except Exception as e:
+        conn.send(f"{type(e).__name__}: {e}")
+        return
+    cache = ResultCache(options["cache_size"], options["cache_ttl"]) if options["cache_size"] > 0 else None
+    server = RecommendationServer(engines, options["threads"], cache, options["batch_window"], options["max_batch"])
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, lambda: loop.create_task(server.shutdown(options["drain_timeout"])))
+        await server.serve(sock=sock, ready=lambda: conn.send("ready"))
+
+    asyncio.run(run())
+
+
+class WorkerPool:
+    """Parent of ``processes`` server workers sharing one socket and the mapped models."""
+
+    def __init__(self, engine_names, processes, host="127.0.0.1", port=8000, threads=None, cache_size=10000,
+                 cache_ttl=300.0, retrain_interval=0, watch_interval=2.0, drain_timeout=30.0, batch_window=0.0,
+                 max_batch=64):
+        if processes <= 0:
+            raise ValueError("processes must be positive.")
+        self.engine_names = list(engine_names)
+        self.processes = processes
+        self.address = (host, port)
+        self.options = {
+            "threads": threads, "cache_size": cache_size, "cache_ttl": cache_ttl, "drain_timeout": drain_timeout,
+            "batch_window": batch_window, "max_batch": max_batch,
+        }
+        self.retrain_interval = retrain_interval
+        self.watch_interval = watch_interval
+        self.drain_timeout = drain_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = []
+        self.sock = None
+        self.generation = None
+        self.rebuild_requested = False
+        self.stopping = False
+
+    def start(self):
+        build_models(log=lambda message: print(f"build {message}", flush=True))
+        self.generation = artifacts.generation()
+        self.sock = socket.create_server(self.address)
+        self.workers = [self.spawn() for _ in range(self.processes)]
+        print(f"{self.processes} workers serving on http://{self.address[0]}:{self.address[1]}", flush=True)
+
+    def spawn(self):
+        """Start a worker and wait until it accepts connections; raises ``RuntimeError`` if it fails."""
+        receiver, sender = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=_worker_main, args=(self.sock, self.engine_names, self.options, sender), daemon=True
+        )
+        process.start()
+        sender.close()
+        try:
+            message = receiver.recv() if receiver.poll(READY_TIMEOUT) else "timed out"
+        except EOFError:
+            message = f"exited with code {process.exitcode}"
+        finally:
+            receiver.close()
+        if message != "ready":
+            process.kill()
+            process.join()
+            raise RuntimeError(f"Worker failed to start: {message}")
+        return process
+
+    def stop_worker(self, process):
+        process.terminate()  # SIGTERM: drain in-flight requests, then exit
+        process.join(self.drain_timeout + 5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def reload(self, rebuild=False):
+        """Replace the workers one at a time; keeps the old ones if a new worker fails to start."""
+        start = time.perf_counter()
+        if rebuild:
+            build_models(log=lambda message: print(f"build {message}", flush=True))
+        self.generation = artifacts.generation()
+        for i, old in enumerate(list(self.workers)):
+            try:
+                self.workers[i] = self.spawn()
+            except RuntimeError as e:
+                print(f"reload aborted: {e}", flush=True)
+                return False
+            self.stop_worker(old)
+        print(f"reloaded {len(self.workers)} workers in {time.perf_counter() - start:.1f}s", flush=True)
+        return True
+
+    def replace_dead(self):
+        for i, process in enumerate(self.workers):
+            if not process.is_alive():
+                print(f"worker {process.pid} exited with code {process.exitcode}; restarting", flush=True)
+                try:
+                    self.workers[i] = self.spawn()
+                except RuntimeError as e:
+                    print(e, flush=True)
+
+    def request_rebuild(self, *_):
+        self.rebuild_requested = True
+
+    def request_stop(self, *_):
+        self.stopping = True
+
+    def run(self):
+        """Start the workers and supervise them until SIGINT or SIGTERM."""
+        signal.signal(signal.SIGHUP, self.request_rebuild)
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        self.start()
+        next_retrain = time.monotonic() + self.retrain_interval if self.retrain_interval > 0 else None
+        next_check = time.monotonic() + self.watch_interval
+        try:
+            while not self.stopping:
+                time.sleep(0.1)
+                now = time.monotonic()
+                if next_retrain is not None and now >= next_retrain:
+                    self.rebuild_requested = True
+                    next_retrain = now + self.retrain_interval
+                if self.rebuild_requested:
+                    self.rebuild_requested = False
+                    self.reload(rebuild=True)
+                elif now >= next_check:
+                    next_check = now + self.watch_interval
+                    self.replace_dead()
+                    if artifacts.generation() != self.generation:
+                        self.reload()
+        finally:
+            self.stop()
+
+    def stop(self):
+        for process in self.workers:
+            process.terminate()
+        for process in self.workers:
+            process.join(self.drain_timeout + 5)
+            if process.is_alive():
+                process.kill()
+        self.workers = []
+        if self.sock is not None:
+            self.sock.close()
@@ -0,0 +1,27 @@
+"""Test setup: a private copy of the data files and an empty artifact directory.
+
+recsys reads its paths from the environment when it is first imported, so
+they are set here, before any test module imports it. Tests that append
+orders therefore never touch the files in the repository.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILES = ["BangaloreZomatoData_with_rest_id.csv", "UserOrdersData.csv", "USER AND RESTRAUNT.xlsx"]
+WORKDIR = tempfile.mkdtemp(prefix="recsys-tests-")
+
+for name in DATA_FILES:
+    shutil.copy(os.path.join(ROOT, name), WORKDIR)
+os.environ["RECSYS_DATA_DIR"] = WORKDIR
+os.environ["RECSYS_ARTIFACT_DIR"] = os.path.join(WORKDIR, "artifacts")
+os.environ.pop("RECSYS_ORDER_DETAILS", None)
+os.environ.pop("RECSYS_PRECISION", None)
+sys.path.insert(0, ROOT)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
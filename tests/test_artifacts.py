@@ -0,0 +1,36 @@
+import os
+
+from recsys import artifacts
+from recsys.data import RESTAURANTS_PATH, load_restaurants
+from recsys.knowledge import load_knowledge_index
+
+
+def test_fingerprint_follows_passed_frames():
+    restaurants = load_restaurants()
+    subset = restaurants.head(100)
+    assert artifacts.fingerprint([subset]) == artifacts.fingerprint([subset.copy()])
+    assert artifacts.fingerprint([subset]) != artifacts.fingerprint([restaurants.head(101)])
+    assert artifacts.fingerprint([subset]) != artifacts.fingerprint([RESTAURANTS_PATH])
+
+
+def test_model_built_from_passed_data_is_not_the_cached_file_model():
+    full = load_knowledge_index()
+    subset = load_knowledge_index(load_restaurants().head(100))
+    assert full["n_rows"] == len(load_restaurants())
+    assert subset["n_rows"] == 100
+    assert load_knowledge_index()["n_rows"] == full["n_rows"]
+
+
+def test_only_model_saves_touch_published():
+    before = artifacts.generation()
+    artifacts.save_artifacts("test_cache", "cache", arrays={"x": [1, 2]}, publish=False)
+    assert artifacts.generation() == before
+    artifacts.save_artifacts("test_model", "model", arrays={"x": [1, 2]})
+    assert artifacts.generation() != before
+
+
+def test_saving_over_a_model_replaces_it_and_leaves_nothing_behind():
+    artifacts.save_artifacts("test_replace", "fp", arrays={"x": [1, 2]})
+    artifacts.save_artifacts("test_replace", "fp", arrays={"x": [3, 4, 5]})
+    assert artifacts.load_artifacts("test_replace", "fp")["x"].tolist() == [3, 4, 5]
+    assert os.listdir(os.path.join(artifacts.ARTIFACT_DIR, "test_replace")) == ["fp"]
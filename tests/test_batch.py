@@ -0,0 +1,45 @@
+import pytest
+
+from recsys.batch import build_user_table
+from recsys.fusion import FusionEngine
+
+USERS = ["U0350", "U0825", "U0001", "U0500"]
+
+
+def recommended(engine, request):
+    return [item.rest_id for item in engine.recommend(request)]
+
+
+def details(engine, request):
+    return [(item.score, item.details["content_similarity"], item.details["predicted_rating"])
+            for item in engine.recommend(request)]
+
+
+@pytest.fixture(scope="module")
+def engines():
+    build_user_table("fusion", top_n=20, workers=2, chunk_size=256)
+    return FusionEngine(), FusionEngine(use_table=False)
+
+
+def test_fusion_table_answers_user_only_requests_like_online_scoring(engines):
+    tabled, online = engines
+    assert tabled.table is not None
+    for user_id in USERS:
+        for top_n in (1, 5, 20):
+            request = {"user_id": user_id, "top_n": top_n, "rest_id": ""}
+            assert not isinstance(tabled.prepare(request), tuple)
+            assert recommended(tabled, request) == recommended(online, request)
+            for answer, expected in zip(details(tabled, request), details(online, request)):
+                assert answer == pytest.approx(expected, rel=1e-5)
+
+
+def test_fusion_table_is_not_used_for_seeded_or_filtered_requests(engines):
+    tabled, online = engines
+    for request in [
+        {"user_id": "U0350", "rest_id": "R0001"},
+        {"user_id": "U0350", "budget": 300},
+        {"user_id": "U0350", "content_weight": 0.8},
+        {"user_id": "U0350", "top_n": 25},
+    ]:
+        assert isinstance(tabled.prepare(request), tuple)
+        assert recommended(tabled, request) == recommended(online, request)
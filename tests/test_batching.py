@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+from recsys.batching import MicroBatcher
+from recsys.engine import load_engine
+from recsys.server import RecommendationServer
+
+USERS = ["U0350", "U0825", "U0001", "U9999", "U0350"]
+PATHS = ["/recommend/matrix", "/recommend/matrix?limit=4", "/recommend/matrix?offset=3&limit=5&fields=Cuisines"]
+
+
+class Recorder:
+    """Processes a batch by doubling it and keeps the batches it saw."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        return [ValueError(item) if item < 0 else item * 2 for item in items]
+
+
+async def submit_all(batcher, items):
+    return await asyncio.gather(*(batcher.submit(item) for item in items), return_exceptions=True)
+
+
+def test_max_batch_flushes_without_waiting_for_the_window():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch=3, max_wait=60)
+
+    async def main():
+        # Six items with a minute-long window: only full batches may leave at once
+        return await asyncio.wait_for(submit_all(batcher, range(6)), timeout=5)
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8, 10]
+    assert recorder.batches == [[0, 1, 2], [3, 4, 5]]
+    assert batcher.timer is None and not batcher.pending
+
+
+def test_window_flushes_a_partial_batch():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch=64, max_wait=0.01)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await submit_all(batcher, [1, -1, 2])
+        return results, loop.time() - start
+
+    results, elapsed = asyncio.run(main())
+    assert recorder.batches == [[1, -1, 2]]
+    assert results[0] == 2 and results[2] == 4
+    # A failed item raises to its own caller only
+    assert isinstance(results[1], ValueError)
+    assert elapsed >= 0.01
+    assert batcher.timer is None and not batcher.pending
+
+
+def test_invalid_settings_are_rejected():
+    with pytest.raises(ValueError):
+        MicroBatcher(Recorder(), max_batch=0)
+    with pytest.raises(ValueError):
+        MicroBatcher(Recorder(), max_wait=-1)
+
+
+@pytest.fixture(scope="module")
+def engines():
+    return {"matrix": load_engine("matrix")}
+
+
+def answers(server):
+    async def main():
+        return await asyncio.gather(*(
+            server.dispatch("POST", path, json.dumps({"user_id": user, "top_n": 10}).encode())
+            for user in USERS for path in PATHS
+        ))
+    return asyncio.run(main())
+
+
+def without_scores(answers):
+    # One factor matmul for many users rounds differently from one per user
+    scores = [[r.pop("score") for r in response.get("results", [])] for _, response in answers]
+    return answers, scores
+
+
+def test_batched_requests_return_the_same_pages_as_unbatched(engines):
+    batched = RecommendationServer(engines, batch_window=0.005, max_batch=4)
+    unbatched = RecommendationServer(engines)
+    assert engines["matrix"].batched
+    sizes, recommend_many = [], batched.recommend_many
+    batched.recommend_many = lambda name, items: sizes.append(len(items)) or recommend_many(name, items)
+
+    expected, expected_scores = without_scores(answers(unbatched))
+    assert [status for status, _ in expected] == [200] * len(expected)
+    pages, scores = without_scores(answers(batched))
+    assert pages == expected
+    for score, expected_score in zip(scores, expected_scores):
+        assert score == pytest.approx(expected_score, rel=1e-6)
+    assert sum(sizes) == len(expected) and max(sizes) == 4
+    assert not unbatched.batchers
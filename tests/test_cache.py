@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from recsys.cache import ResultCache
+from recsys.engine import Engine, load_engine
+from recsys.incremental import IncrementalUpdater
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingEngine(Engine):
+    """Answers every request with its own call number."""
+
+    name = "counting"
+    version = "v1"
+
+    def __init__(self):
+        self.calls = 0
+
+    def results(self, request):
+        self.calls += 1
+        return [self.calls]
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache, engine = ResultCache(ttl=10, clock=clock), CountingEngine()
+    first = cache.results(engine, {"user_id": "U0001"})
+    clock.now = 9.9
+    assert cache.results(engine, {"user_id": "U0001"}) is first
+    clock.now = 10.0
+    assert cache.results(engine, {"user_id": "U0001"}) == [2]
+    assert cache.stats()["expirations"] == 1
+    assert cache.results(engine, {"user_id": "U0001"}) == [2]
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache, engine = ResultCache(max_entries=2, ttl=None, clock=clock), CountingEngine()
+    cache.results(engine, {"user_id": "U0001"})
+    cache.results(engine, {"user_id": "U0002"})
+    cache.results(engine, {"user_id": "U0001"})  # U0002 is now the least recently used
+    cache.results(engine, {"user_id": "U0003"})
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+
+    calls = engine.calls
+    cache.results(engine, {"user_id": "U0001"})
+    assert engine.calls == calls
+    cache.results(engine, {"user_id": "U0002"})
+    assert engine.calls == calls + 1
+
+
+def test_version_change_invalidates_the_engine_entries(clock):
+    cache, engine = ResultCache(ttl=None, clock=clock), CountingEngine()
+    cache.results(engine, {"user_id": "U0001"})
+    cache.results(engine, {"user_id": "U0002"})
+    engine.revision += 1
+    assert cache.results(engine, {"user_id": "U0001"}) == [3]
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_incremental_update_invalidates_cached_recommendations():
+    cache, engine = ResultCache(ttl=None), load_engine("matrix")
+    request = {"user_id": "U0350", "top_n": 10}
+    before = cache.recommend(engine, request)
+    assert cache.recommend(engine, request) == before
+    version = engine.cache_version()
+
+    rated = [item.rest_id for item in before[:3]]
+    IncrementalUpdater(matrix=engine).apply(pd.DataFrame({
+        "user_id": ["U0350"] * 3, "rest_id": rated, "cost": [400] * 3,
+        "rating": [1] * 3, "location": ["Koramangala, Bangalore"] * 3,
+    }))
+    assert engine.cache_version() != version
+
+    after = cache.recommend(engine, request)
+    assert cache.stats()["invalidations"] == 1
+    assert after == engine.recommend(request)
+    assert not set(rated) & {item.rest_id for item in after}
@@ -0,0 +1,39 @@
+import pytest
+
+from recsys.content import PreferenceEngine, filtered_pipeline
+
+LOCATIONS = ["Koramangala", "Indiranagar", "Whitefield", "JP Nagar", "Electronic City", "Church Street"]
+PREFERENCES = ["pizza pasta", "biryani", "north indian chinese", "cafe coffee desserts"]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return PreferenceEngine()
+
+
+def request_for(location, preferences, top_n, budget=800):
+    return {"preferences": preferences, "budget": budget, "mode": "Delivery", "location": location, "top_n": top_n}
+
+
+@pytest.mark.parametrize("location", LOCATIONS)
+def test_preferences_match_full_catalogue_scan(engine, location):
+    full_scan = filtered_pipeline(engine.catalogue, engine.score, "full_scan")
+    for preferences in PREFERENCES:
+        for top_n in (1, 3, 5, 10, 25):
+            query, _ = engine.prepare(request_for(location, preferences, top_n))
+            rows, _ = engine.pipeline.run(query, top_n)
+            expected, _ = full_scan.run(query, top_n)
+            assert rows.tolist() == expected.tolist(), (location, preferences, top_n)
+
+
+def test_shorter_ranking_is_a_prefix_of_a_longer_one(engine):
+    short = engine.results(request_for("Koramangala", "pizza pasta", 3))
+    long = engine.results(request_for("Koramangala", "pizza pasta", 10))
+    assert [item.rest_id for item in short] == [item.rest_id for item in long][:3]
+
+
+def test_batched_results_match_single_results(engine):
+    requests = [request_for(location, "pizza pasta", 5) for location in LOCATIONS]
+    batched = engine.results_many(requests)
+    for request, results in zip(requests, batched):
+        assert [item.rest_id for item in results] == [item.rest_id for item in engine.results(request)]
@@ -0,0 +1,164 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from recsys import artifacts
+from recsys.collaborative import build_collaborative_model
+from recsys.data import load_orders, load_restaurants
+from recsys.engine import load_engine
+from recsys.incremental import BackgroundRetrainer, IncrementalUpdater, order_details
+from recsys.popularity import load_popularity_index
+
+STREAMED = pd.DataFrame({
+    "user_id": ["U9999", "U9999", "U9999", "U0350"],
+    "rest_id": ["R0001", "R6892", "R7304", "R0001"],
+    "cost": [400, 1000, 800, 400],
+    "rating": [5, 4, 3, 5],
+    "location": ["Koramangala, Bangalore"] * 4,
+})
+USERS = ["U9999", "U0350", "U0825"]
+
+
+def recommended(engine, request):
+    return [item.rest_id for item in engine.recommend(request)]
+
+
+def artifact_dirs():
+    return {
+        os.path.join(name, fp)
+        for name in os.listdir(artifacts.ARTIFACT_DIR)
+        if os.path.isdir(os.path.join(artifacts.ARTIFACT_DIR, name))
+        for fp in os.listdir(os.path.join(artifacts.ARTIFACT_DIR, name))
+    }
+
+
+def orders_of(user, **changes):
+    orders = load_orders()
+    return orders[orders['user_id'] == user].assign(**changes).reset_index(drop=True)
+
+
+@pytest.fixture
+def engines():
+    return {name: load_engine(name) for name in ("collaborative", "matrix", "hybrid")}
+
+
+@pytest.fixture
+def updater(engines):
+    return IncrementalUpdater(
+        collaborative=engines["collaborative"], matrix=engines["matrix"], hybrid=engines["hybrid"]
+    )
+
+
+def test_streamed_order_changes_collaborative_recommendations(engines, updater):
+    engine = engines["collaborative"]
+    request = {"user_id": "U0350", "top_n": 10}
+    before = recommended(engine, request)
+    streamed = pd.DataFrame({
+        "user_id": ["U0350", "U0825"], "rest_id": [before[0], before[0]], "cost": [400, 400],
+        "rating": [5, 1], "location": ["Koramangala, Bangalore"] * 2,
+    })
+    updater.apply(streamed)
+
+    after = recommended(engine, request)
+    assert after != before
+    # The streamed restaurant is now rated, so it is excluded like the others
+    rated = set(orders_of("U0350")['rest_id']) | {before[0]}
+    assert not rated & set(after)
+
+    # Ratings and neighbour scores match a full rebuild on the concatenated orders
+    orders = pd.concat([load_orders(), streamed], ignore_index=True)
+    rebuilt = build_collaborative_model(updater.with_details(orders))
+    assert (engine.interactions != rebuilt["matrices"]["interactions"]).nnz == 0
+    assert np.allclose(np.asarray(engine.neighbour_scores), rebuilt["arrays"]["neighbour_scores"], atol=1e-6)
+
+
+def test_fold_in_gives_users_with_the_same_ratings_the_same_recommendations(engines, updater):
+    # Streaming a repeat of an existing order leaves U0825's ratings unchanged but
+    # folds the user in again, so a new user with a copy of the orders matches it
+    repeat = orders_of("U0825").head(1)
+    updater.apply(pd.concat([repeat, orders_of("U0825", user_id="U9999")], ignore_index=True))
+
+    request = {"top_n": 10}
+    assert recommended(engines["matrix"], {**request, "user_id": "U9999"}) == \
+        recommended(engines["matrix"], {**request, "user_id": "U0825"})
+    seed = repeat['rest_id'].iloc[0]
+    assert recommended(engines["hybrid"], {**request, "user_id": "U9999", "rest_id": seed}) == \
+        recommended(engines["hybrid"], {**request, "user_id": "U0825", "rest_id": seed})
+
+
+def test_hybrid_fold_in_follows_the_streamed_ratings(engines, updater):
+    svd = engines["hybrid"].svd_model
+    liked, disliked = svd.item_ids[:2].tolist()
+    before = svd.predict("U0350", liked) - svd.predict("U0350", disliked)
+    updater.apply(pd.DataFrame({
+        "user_id": ["U0350"] * 6, "rest_id": [liked, disliked] * 3, "cost": [400] * 6,
+        "rating": [5, 1] * 3, "location": ["Koramangala, Bangalore"] * 6,
+    }))
+    assert svd.predict("U0350", liked) - svd.predict("U0350", disliked) > max(before, 0)
+
+
+@pytest.fixture
+def served():
+    engines = {name: load_engine(name) for name in ("collaborative", "matrix")}
+    updater = IncrementalUpdater(
+        collaborative=engines["collaborative"], matrix=engines["matrix"],
+        popularity=load_popularity_index(orders=load_orders()),
+    )
+    updater.apply(STREAMED)
+    return engines, updater
+
+
+def test_retrain_keeps_streamed_orders(served):
+    engines, updater = served
+    stored, generation = artifact_dirs(), artifacts.generation()
+    BackgroundRetrainer(engines, updater=updater).retrain()
+    # The retrained models live in memory only, so retraining does not fill the disk
+    assert artifact_dirs() == stored
+    assert artifacts.generation() == generation
+    assert updater.collaborative is engines["collaborative"]
+    assert updater.matrix is engines["matrix"]
+    assert "U9999" in engines["matrix"].user_index
+
+    # Engines built directly from the full order log are the baseline
+    log = pd.concat([load_orders(), STREAMED], ignore_index=True)
+    details = order_details(log, load_restaurants())
+    for name in ("collaborative", "matrix"):
+        baseline = load_engine(name, usersorder_df=details)
+        for user_id in USERS:
+            request = {"user_id": user_id, "top_n": 10}
+            assert recommended(engines[name], request) == recommended(baseline, request), (name, user_id)
+
+
+def test_reset_replays_orders_applied_after_the_snapshot(served):
+    engines, updater = served
+    snapshot = updater.orders()
+    late = STREAMED.assign(user_id="U9998")
+    updater.apply(late)
+
+    fresh = load_engine("collaborative", usersorder_df=order_details(snapshot, load_restaurants()))
+    updater.reset(snapshot, collaborative=fresh)
+    assert "U9998" in fresh.user_index
+    assert len(updater.orders()) == len(snapshot) + len(late)
+
+
+def test_failed_reset_keeps_the_current_engines(served):
+    engines, updater = served
+    with pytest.raises(AttributeError):
+        updater.reset(updater.orders(), collaborative=object())
+    assert updater.collaborative is engines["collaborative"]
+    assert updater.apply(STREAMED.assign(user_id="U9997")) == ["U9997"]
+
+
+def test_fusion_engine_is_folded_in_like_the_hybrid_engine():
+    engines = {name: load_engine(name) for name in ("hybrid", "fusion")}
+    updater = IncrementalUpdater(hybrid=engines["hybrid"], fusion=engines["fusion"])
+    revision = engines["fusion"].revision
+    updater.apply(STREAMED)
+
+    hybrid, fusion = engines["hybrid"].svd_model, engines["fusion"].svd_model
+    assert engines["fusion"].revision > revision
+    assert "U9999" in fusion.user_index
+    assert (fusion.pu[fusion.user_index.get("U9999")] == hybrid.pu[hybrid.user_index.get("U9999")]).all()
+    assert len(engines["fusion"].orders) == len(engines["hybrid"].orders)
@@ -0,0 +1,50 @@
+import itertools
+
+import pandas as pd
+import pytest
+
+from recsys.data import RESTAURANTS_PATH
+from recsys.knowledge import SERVICE_MODES, KnowledgeEngine
+
+BUDGETS = [50, 149, 300, 800, 5000]
+CUISINES = ["Biryani", "north indian", "Indian, Chinese", "CAFE", "Pizza|Burger", "Mongolian"]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return KnowledgeEngine()
+
+
+@pytest.fixture(scope="module")
+def data():
+    # Loaded and prepared like the original Tkinter script
+    data = pd.read_csv(RESTAURANTS_PATH)
+    data['AverageCost'] = pd.to_numeric(data['AverageCost'], errors='coerce').fillna(0)
+    for column in ['isVegOnly', 'isIndoorSeating', 'isTakeaway', 'IsHomeDelivery']:
+        data[column] = data[column].astype(int)
+    return data
+
+
+def pandas_filter(data, budget, cuisine, veg_only, service_mode, top_n):
+    filtered_data = data[data['AverageCost'] <= budget]
+    filtered_data = filtered_data[filtered_data['Cuisines'].str.contains(cuisine, case=False, na=False)]
+    filtered_data = filtered_data[filtered_data['isVegOnly'] == veg_only]
+    filtered_data = filtered_data[filtered_data[SERVICE_MODES[service_mode]] == 1]
+    return filtered_data['rest_id'].head(top_n).tolist()
+
+
+def test_bitmap_answers_match_the_pandas_filter(engine, data):
+    combinations = itertools.product(BUDGETS, CUISINES, ["Yes", "No"], SERVICE_MODES)
+    for budget, cuisine, veg_only, service_mode in combinations:
+        request = {
+            "budget": str(budget), "cuisine": cuisine, "veg_only": veg_only,
+            "service_mode": service_mode, "top_n": 20,
+        }
+        expected = pandas_filter(data, budget, cuisine, int(veg_only == "Yes"), service_mode, 20)
+        assert [item.rest_id for item in engine.recommend(request)] == expected, request
+
+
+def test_invalid_cuisine_pattern_is_an_input_error(engine):
+    request = {"budget": "500", "cuisine": "(", "veg_only": "No", "service_mode": "Delivery"}
+    with pytest.raises(ValueError):
+        engine.recommend(request)
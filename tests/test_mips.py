@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from recsys.mips import ExactMIPSIndex, IVFMIPSIndex, recall_at_k
+
+
+@pytest.fixture(scope="module")
+def tied():
+    # Small integer factors give exact dot products with many ties
+    rng = np.random.default_rng(0)
+    items = rng.integers(-2, 3, size=(500, 4)).astype(np.float64)
+    queries = rng.integers(-2, 3, size=(40, 4)).astype(np.float64)
+    return items, queries
+
+
+@pytest.fixture(scope="module")
+def gaussian():
+    rng = np.random.default_rng(1)
+    return rng.normal(size=(2000, 16)), rng.normal(size=(50, 16))
+
+
+def brute_force(items, queries, k):
+    ids = np.array([np.argsort(-(items @ query), kind="stable")[:k] for query in queries])
+    return ids, np.take_along_axis(queries @ items.T, ids, axis=1)
+
+
+@pytest.mark.parametrize("block_size", [4096, 64, 7])
+def test_exact_search_matches_brute_force_including_ties(tied, block_size):
+    items, queries = tied
+    for k in (1, 5, 37):
+        ids, scores = ExactMIPSIndex(items, block_size=block_size).search(queries, k)
+        expected_ids, expected_scores = brute_force(items, queries, k)
+        assert (ids == expected_ids).all()
+        assert (scores == expected_scores).all()
+
+
+def test_ivf_probing_every_list_is_exact(tied):
+    items, queries = tied
+    ivf = IVFMIPSIndex(items, n_lists=12, seed=0)
+    for k in (1, 5, 37):
+        ids, scores = ivf.search(queries, k, n_probe=ivf.n_lists)
+        expected_ids, expected_scores = ExactMIPSIndex(items).search(queries, k)
+        assert (ids == expected_ids).all()
+        assert (scores == expected_scores).all()
+
+
+@pytest.mark.parametrize("target", [0.5, 0.9, 0.99])
+def test_tune_picks_the_smallest_n_probe_reaching_the_target_recall(gaussian, target):
+    items, queries = gaussian
+    ivf = IVFMIPSIndex(items, n_lists=32, n_probe=1, seed=0)
+    n_probe = ivf.tune(queries, 10, target_recall=target)
+    assert ivf.n_probe == n_probe
+
+    exact_ids = brute_force(items, queries, 10)[0]
+    assert recall_at_k(ivf.search(queries, 10)[0], exact_ids) >= target
+    if n_probe > 1:
+        assert recall_at_k(ivf.search(queries, 10, n_probe=n_probe - 1)[0], exact_ids) < target
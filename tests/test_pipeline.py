@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from recsys.engine import load_engine
+from recsys.pipeline import FactorCandidates
+
+
+@pytest.fixture(scope="module")
+def hybrid():
+    return load_engine("hybrid")
+
+
+@pytest.mark.parametrize("location", ["Koramangala", "Whitefield", "Indiranagar"])
+def test_factor_candidates_score_only_the_area_rows(hybrid, location):
+    areas, svd = hybrid.areas, hybrid.svd_model
+    mask = areas.mask(areas.nearby(areas.match(location)))
+    generator = FactorCandidates(svd, hybrid.item_rows)
+    for user_id in ["U0350", "U0825", "U9999"]:
+        rows = generator.generate({"user_id": user_id}, mask, 30)
+        assert mask[rows].all()
+
+        # Same as scoring every item and dropping those outside the areas
+        allowed = (hybrid.item_rows >= 0) & mask[hybrid.item_rows]
+        scores = np.where(allowed, svd.item_scores(user_id), -np.inf)
+        expected = np.lexsort((np.arange(len(scores)), -scores))[:min(30, allowed.sum())]
+        assert rows.tolist() == hybrid.item_rows[expected].tolist()
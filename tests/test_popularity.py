@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recsys.popularity import LIST_SIZE, load_popularity_index, normalise_cuisine, rank_rows
+
+CUISINES = ["north indian", "chinese", "biryani", "south indian", "desserts", "indian", "cafe"]
+BUDGETS = [None, 200, 300, 800]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return load_popularity_index()
+
+
+@pytest.fixture(scope="module")
+def cuisine_masks(index):
+    row_cuisines = [
+        {normalise_cuisine(part) for part in value.split(',')} if isinstance(value, str) else set()
+        for value in index.catalogue['Cuisines']
+    ]
+    return {cuisine: np.array([any(cuisine in name for name in names) for names in row_cuisines])
+            for cuisine in CUISINES}
+
+
+def brute_force(index, cuisine_masks, kind, location, cuisine, budget, top_n):
+    """Rank every restaurant that passes the filters, without the precomputed lists."""
+    catalogue = index.catalogue
+    mask = np.ones(len(catalogue), dtype=bool)
+    if location is not None:
+        mask &= index.areas.mask(index.areas.nearby(index.areas.match(location)))
+    if cuisine is not None:
+        mask &= cuisine_masks[cuisine]
+    if budget is not None:
+        mask &= np.asarray(catalogue['AverageCost']) <= budget
+    return rank_rows(index.snapshot.keys[kind], np.flatnonzero(mask), top_n)
+
+
+@pytest.mark.parametrize("kind", ["popular", "trending"])
+def test_lists_match_brute_force(index, cuisine_masks, kind):
+    locations = [None] + index.areas.keys.ids[:40]
+    for location in locations:
+        for cuisine in [None] + CUISINES:
+            for budget in BUDGETS:
+                request = {"kind": kind, "location": location, "cuisine": cuisine, "budget": budget}
+                rows, _ = index.top(request, LIST_SIZE)
+                expected = brute_force(index, cuisine_masks, kind, location, cuisine, budget, LIST_SIZE)
+                assert rows.tolist() == expected.tolist(), request
+
+
+def test_merged_driver_lists_are_not_cut_short(index, cuisine_masks):
+    rows, _ = index.top({"location": "chairman's resort", "cuisine": "north indian", "budget": 300}, LIST_SIZE)
+    expected = brute_force(index, cuisine_masks, "popular", "chairman's resort", "north indian", 300, LIST_SIZE)
+    assert len(rows) == len(expected) > 0
+
+
+def test_lists_stay_exact_after_streamed_orders(cuisine_masks):
+    from recsys.data import load_orders
+
+    # Passing the orders gives a private index, so the shared one is not modified
+    index = load_popularity_index(orders=load_orders())
+    rng = np.random.default_rng(0)
+    rest_ids = np.asarray(index.catalogue['rest_id'])
+    orders = pd.DataFrame({
+        "rest_id": rest_ids[rng.integers(0, len(rest_ids), 500)],
+        "rating": rng.integers(1, 6, 500),
+    })
+    index.apply(orders)
+    for location in [None] + index.areas.keys.ids[:10]:
+        for cuisine in [None, "north indian", "chinese"]:
+            for budget in BUDGETS:
+                for kind in ("popular", "trending"):
+                    request = {"kind": kind, "location": location, "cuisine": cuisine, "budget": budget}
+                    rows, _ = index.top(request, 20)
+                    expected = brute_force(index, cuisine_masks, kind, location, cuisine, budget, 20)
+                    assert rows.tolist() == expected.tolist(), request
+
+
+def test_apply_publishes_a_new_snapshot_and_leaves_the_old_one_intact():
+    from recsys.data import load_orders
+
+    index = load_popularity_index(orders=load_orders())
+    request = {"kind": "trending", "cuisine": "chinese"}
+    before = index.snapshot
+    rows, scores = index.top(request, 20)
+    trend = before.trend.copy()
+
+    rest_ids = np.asarray(index.catalogue['rest_id'])
+    index.apply(pd.DataFrame({"rest_id": rest_ids[rows[-1:]].repeat(50), "rating": [5] * 50}))
+    assert index.snapshot is not before
+    assert (before.trend == trend).all()
+    assert index.top(request, 20)[0][0] == rows[-1]
+    # A request that took the old snapshot still ranks by it
+    old_rows, old_scores = index.top(request, 20, snapshot=before)
+    assert old_rows.tolist() == rows.tolist()
+    assert (old_scores == scores).all()
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from recsys import precision
+from recsys.matrix import load_matrix_model
+from recsys.precision import QuantisedRows, drift_report, quantise
+
+# Largest round-trip error as a fraction of the row's peak (see quantise),
+# with room for the float32 scale and product
+BOUNDS = {"int8": 1 / 254, "float16": 2 ** -12}
+SLACK = 2 ** -20
+
+
+@pytest.fixture(scope="module")
+def rows():
+    # Rows of very different magnitudes, a zero row and a row with one value
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(300, 24)) * 10.0 ** rng.uniform(-4, 3, size=(300, 1))
+    rows[7] = 0.0
+    rows[8, 1:] = 0.0
+    return rows
+
+
+@pytest.fixture(scope="module")
+def report():
+    return drift_report(k=10, n_users=200)
+
+
+@pytest.mark.parametrize("name", sorted(BOUNDS))
+def test_round_trip_error_is_within_the_documented_bound(rows, name):
+    codes, scales = quantise(rows, name)
+    assert codes.dtype == np.dtype(name)
+    assert scales.dtype == np.float32
+    if name == "int8":
+        assert np.abs(codes.astype(int)).max() <= precision.INT8_LEVELS
+
+    restored = QuantisedRows(codes, scales)[:]
+    peaks = np.abs(rows).max(axis=1)
+    errors = np.abs(restored - rows).max(axis=1)
+    assert (errors <= peaks * (BOUNDS[name] + SLACK)).all()
+    assert (restored[7] == 0).all() and restored[8, 0] == pytest.approx(rows[8, 0], rel=SLACK)
+
+
+@pytest.mark.parametrize("name", sorted(BOUNDS))
+def test_products_match_the_dequantised_rows(rows, name):
+    quantised = QuantisedRows(*quantise(rows, name))
+    dense = quantised[:]
+    vector = np.random.default_rng(1).normal(size=rows.shape[1]).astype(np.float32)
+    weights = np.random.default_rng(2).normal(size=(3, rows.shape[0])).astype(np.float32)
+    assert np.allclose(quantised @ vector, dense @ vector, rtol=1e-4, atol=1e-6 * np.abs(dense).max())
+    assert np.allclose(weights @ quantised, weights @ dense, rtol=1e-4, atol=1e-4 * np.abs(dense).max())
+    assert np.array_equal(quantised[[3, 5]], dense[[3, 5]])
+
+
+def test_stored_model_errors_are_within_the_documented_bound(report):
+    for row in report:
+        if row["precision"] == "float64":
+            assert row["max_error"] == 0.0, row
+        elif row["precision"] == "float32":
+            assert row["max_error"] < 1e-6, row
+    # Quantised factors stay within the bound of the largest stored value
+    baseline = load_matrix_model(precision="float64")["item_factors"]
+    peak = np.abs(baseline).max()
+    for name, bound in BOUNDS.items():
+        item_factors = precision.rows_of(load_matrix_model(precision=name), "item_factors")
+        assert np.abs(item_factors[:] - baseline).max() <= peak * (bound + SLACK)
+
+
+def test_top_k_overlap_stays_close_to_float64(report):
+    floors = {"float64": 1.0, "float32": 0.999, "float16": 0.99, "int8": 0.98}
+    rows = [row for row in report if row["overlap"] is not None]
+    assert {row["model"] for row in rows} == {"svd", "matrix"}
+    for row in rows:
+        assert floors[row["precision"]] <= row["overlap"] <= 1.0, row
+    svd = {row["precision"]: row["rating_rmse"] for row in rows if row["model"] == "svd"}
+    assert svd["float64"] == 0.0
+    assert svd["float32"] <= svd["float16"] <= svd["int8"] < 1e-2
+
+
+def test_printed_overlap_is_the_reported_one(report, capsys):
+    precision.main(["--precisions", "float32,float16,int8", "-k", "10", "--users", "200"])
+    printed = {}
+    for line in capsys.readouterr().out.splitlines()[1:]:
+        model, name, *_, overlap = line.split()
+        printed[model, name] = overlap
+    for row in report:
+        expected = "-" if row["overlap"] is None else f"{row['overlap']:.3f}"
+        assert printed[row["model"], row["precision"]] == expected
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from recsys.ranking import top_k_lexicographic
+
+
+def lexsort_order(keys):
+    """Every position sorted by ``keys`` (higher first), ties by lower position."""
+    return np.lexsort([np.arange(len(keys[0]))] + [-key for key in reversed(keys)])
+
+
+def tied_keys(rng, n, n_keys):
+    # Few distinct values, some -inf, so ties straddle the k-th place
+    keys = []
+    for _ in range(n_keys):
+        key = rng.integers(0, 4, n).astype(np.float64)
+        key[rng.random(n) < 0.2] = -np.inf
+        keys.append(key)
+    return keys
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_top_k_lexicographic_matches_lexsort(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 200))
+    keys = tied_keys(rng, n, int(rng.integers(1, 4)))
+    expected = lexsort_order(keys)
+
+    top_20 = top_k_lexicographic(keys, 20)
+    top_5 = top_k_lexicographic(keys, 5)
+    assert top_20.tolist() == expected[:20].tolist()
+    assert top_5.tolist() == top_20[:5].tolist()
+    for k in range(0, n + 2):
+        assert top_k_lexicographic(keys, k).tolist() == expected[:k].tolist()
+
+
+def test_all_missing_keys_keep_position_order():
+    keys = [np.full(10, -np.inf), np.full(10, -np.inf)]
+    assert top_k_lexicographic(keys, 4).tolist() == [0, 1, 2, 3]
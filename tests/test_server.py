@@ -0,0 +1,32 @@
+import asyncio
+import json
+
+import pytest
+
+from recsys.knowledge import KnowledgeEngine
+from recsys.server import RecommendationServer
+
+REQUEST = {"budget": "500", "cuisine": "Biryani", "veg_only": "No", "service_mode": "Delivery"}
+
+
+@pytest.fixture(scope="module")
+def server():
+    return RecommendationServer({"knowledge": KnowledgeEngine()})
+
+
+def dispatch(server, body, path="/recommend/knowledge"):
+    return asyncio.run(server.dispatch("POST", path, body))
+
+
+@pytest.mark.parametrize("body", [b"{", b"\xff\xfe\xff", b"\x80{}", "{}".encode("utf-16")[:3]])
+def test_undecodable_body_is_a_bad_request(server, body):
+    status, response = dispatch(server, body)
+    assert status == 400
+    assert response["error"].startswith("Invalid JSON")
+
+
+def test_valid_body_is_answered(server):
+    status, response = dispatch(server, json.dumps(REQUEST).encode())
+    assert status == 200
+    assert len(response["results"]) == 5
+    assert dispatch(server, json.dumps(REQUEST).encode("utf-16"))[0] == 200